@@ -7,7 +7,7 @@ import logging
 from datetime import datetime, timezone
 
 from config import ADMIN_CHAT_ID
-from database import count_active_users, get_connection
+from async_db import count_active_users, count_availability_logs, count_subscribers_by_model
 
 logger = logging.getLogger(__name__)
 
@@ -60,14 +60,10 @@ async def send_admin_notification(bot, message: str, error_type: str = "general"
         return False
 
 
-def count_logs_for_stats():
+async def count_logs_for_stats():
     """Compte le nombre total de logs disponibles"""
     try:
-        conn = get_connection()
-        cursor = conn.execute("SELECT COUNT(*) FROM run_availability_log")
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
+        return await count_availability_logs()
     except:
         return 0
 
@@ -82,8 +78,8 @@ async def admin_stats_command(update, context):
         await update.message.reply_text("Commande réservée à l'admin.")
         return
     
-    total_users = count_active_users()
-    logs_count = count_logs_for_stats()
+    total_users = await count_active_users()
+    logs_count = await count_logs_for_stats()
     
     stats_text = f"""
 📈 **Stats Admin**
@@ -92,6 +88,47 @@ async def admin_stats_command(update, context):
 📊 Logs disponibilité : {logs_count}
     """
     
+    subscribers = await count_subscribers_by_model()
+    stats_text += "\n📡 **Abonnés par modèle :**\n"
+    for model, count in subscribers.items():
+        stats_text += f"• {model} : {count}\n"
+    
+    # Abonnés du bus d'événements : appels, échecs, temps moyen/max
+    from events import bus
+    if bus.stats:
+        stats_text += "\n⚡ **Abonnés RunDetected :**\n"
+        for name, st in bus.stats.items():
+            avg_ms = st["total_ms"] / st["calls"] if st["calls"] else 0
+            stats_text += (
+                f"• `{name}` : {st['calls']} appels, {st['failures']} échecs, "
+                f"moy {avg_ms:.0f} ms, max {st['max_ms']:.0f} ms\n"
+            )
+    
+    # File de livraison (tous workers) et dernier fan-out du worker in-process
+    import delivery
+    from async_db import count_pending_run_events
+    pending_events = await count_pending_run_events()
+    if pending_events:
+        stats_text += f"\n📬 **File de livraison :** {pending_events} run(s) en attente d'envoi\n"
+    report = delivery.fanout_engine.last_report
+    if report:
+        stats_text += (
+            f"\n📤 **Dernier fan-out :** {report['sent']} envoyés, {report['failed']} échecs "
+            f"en {report['elapsed']:.1f} s ({report['rate']:.1f} msg/s)\n"
+        )
+    if delivery.pruned_chats:
+        stats_text += f"🧹 **Chats injoignables désactivés :** {delivery.pruned_chats} (depuis le démarrage)\n"
+    if delivery.migrated_chats:
+        stats_text += f"🔀 **Groupes migrés en supergroupe :** {delivery.migrated_chats} (depuis le démarrage)\n"
+    
+    from reminders import reminder_service
+    if len(reminder_service):
+        st = reminder_service.stats
+        stats_text += (
+            f"⏰ **Rappels :** {len(reminder_service)} programmés, {st['sent']} envoyés, "
+            f"{st['skipped']} sans objet, {st['failed']} échecs\n"
+        )
+    
     await update.message.reply_text(stats_text, parse_mode="Markdown")
 
 
@@ -102,7 +139,7 @@ async def testnotif_command(update, context):
     if chat_id != ADMIN_CHAT_ID:
         return
     
-    from scheduler import send_notification
+    from delivery import send_notification
     
     # Simuler une notification pour le run 12h d'aujourd'hui
     fake_run = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0)
@@ -113,15 +150,318 @@ async def testnotif_command(update, context):
 
 
 async def forcecheck_command(update, context):
-    """Commande /forcecheck - Force une vérification immédiate (admin only)"""
+    """
+    Commande /forcecheck [MODÈLE] - Force une vérification (admin only)
+    
+    La vérification est soumise au scheduler en arrière-plan : elle est
+    fusionnée avec un cycle déjà en cours, et le message de progression
+    est édité à chaque modèle vérifié.
+    """
+    chat_id = update.message.chat.id
+    
+    if chat_id != ADMIN_CHAT_ID:
+        return
+    
+    from config import MODELS
+    from scheduler import submit_check
+    
+    models = None
+    if context.args:
+        models = [arg.upper() for arg in context.args]
+        unknown = [m for m in models if m not in MODELS]
+        if unknown:
+            await update.message.reply_text(
+                f"❌ Modèle inconnu : {', '.join(unknown)}\n"
+                f"Modèles : {', '.join(MODELS.keys())}"
+            )
+            return
+    
+    targets = models or list(MODELS.keys())
+    progress_msg = await update.message.reply_text(
+        f"🔍 Vérification en cours : {', '.join(targets)}..."
+    )
+    done_models = []
+    
+    async def on_progress(model, done, total):
+        done_models.append(model)
+        text = f"🔍 Vérification en cours ({done}/{total})\n\n"
+        text += "\n".join(f"✅ {m}" for m in done_models)
+        if done == total:
+            text = f"✅ Vérification terminée ({total} modèles)\n\n"
+            text += "\n".join(f"✅ {m}" for m in done_models)
+            text += "\n\nRegarde les logs pour les détails."
+        await progress_msg.edit_text(text)
+    
+    _, coalesced, already_done = submit_check(context.bot, models, on_progress=on_progress)
+    # Cycle déjà en cours : les modèles vérifiés avant l'abonnement comptent aussi
+    done_models.extend(already_done)
+    
+    if coalesced:
+        text = "🔁 Un cycle couvrant ces modèles est déjà prévu ou en cours, suivi de sa progression..."
+        if already_done:
+            text += "\n\n" + "\n".join(f"✅ {m}" for m in already_done)
+        await progress_msg.edit_text(text)
+
+
+async def checkindex_command(update, context):
+    """
+    Commande /checkindex [fix] - Vérifie la cohérence de l'index mémoire
+    des abonnements avec la base (admin only). "fix" recharge l'index.
+    """
+    chat_id = update.message.chat.id
+    
+    if chat_id != ADMIN_CHAT_ID:
+        return
+    
+    from async_db import check_subscription_index, load_subscription_index
+    
+    if context.args and context.args[0].lower() == "fix":
+        await load_subscription_index()
+    
+    report = await check_subscription_index()
+    missing, extra = report["missing"], report["extra"]
+    
+    text = "🗂️ **Index abonnements**\n\n"
+    if not report["loaded"]:
+        text += "⚠️ Index non chargé (requêtes SQL utilisées)\n"
+    text += (
+        f"👥 Utilisateurs indexés : {report['users']}\n"
+        f"🔑 Clés (modèle, run) : {report['keys']}\n"
+        f"📌 Entrées : {report['entries']}\n\n"
+    )
+    
+    if not missing and not extra:
+        text += "✅ Index cohérent avec la base"
+    else:
+        text += f"❌ {len(missing)} manquantes, {len(extra)} en trop\n"
+        for row in (missing + extra)[:10]:
+            text += f"• `{row}`\n"
+        text += "\nUtilise /checkindex fix pour recharger l'index."
+    
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+
+async def rebuildstats_command(update, context):
+    """
+    Commande /rebuildstats - Reconstruit delay_stats depuis les logs bruts
+    et les agrégats journaliers (admin only)
+    """
+    chat_id = update.message.chat.id
+    
+    if chat_id != ADMIN_CHAT_ID:
+        return
+    
+    from async_db import rebuild_delay_stats
+    
+    count = await rebuild_delay_stats()
+    await update.message.reply_text(f"📊 delay_stats reconstruite : {count} couples (modèle, run)")
+
+
+def _format_minutes(minutes: float) -> str:
+    """Délai en minutes → '3h21'"""
+    hours, mins = divmod(round(minutes), 60)
+    return f"{hours}h{mins:02d}"
+
+
+async def analyse_command(update, context):
+    """
+    Commande /analyse [jours] - Percentiles, médiane glissante, tendance,
+    effet jour de la semaine et aberrants par modèle/run (admin only)
+    """
+    chat_id = update.message.chat.id
+    
+    if chat_id != ADMIN_CHAT_ID:
+        return
+    
+    from config import MODELS
+    from async_db import run
+    from analytics import analyse, ANALYSIS_DAYS, WEEKDAYS
+    
+    try:
+        days = int(context.args[0]) if context.args else ANALYSIS_DAYS
+    except ValueError:
+        await update.message.reply_text("Usage : /analyse [jours]")
+        return
+    if days > ANALYSIS_DAYS:
+        await update.message.reply_text(
+            f"ℹ️ Logs bruts conservés {ANALYSIS_DAYS} j : analyse limitée à {ANALYSIS_DAYS} j"
+        )
+    
+    result = await run(analyse, days)
+    
+    text = (
+        f"🔬 **Analyse des délais** ({result['days']} j, {result['samples']} logs, "
+        f"{result['elapsed_ms']:.1f} ms)\n"
+    )
+    if not result["stats"]:
+        text += "\n_Aucun log sur la période._"
+    
+    current_model = None
+    for (model, run_hour), st in sorted(result["stats"].items()):
+        if model != current_model:
+            current_model = model
+            text += f"\n{MODELS.get(model, {}).get('emoji', '🌐')} **{model}**\n"
+        
+        text += (
+            f"`{run_hour:02d}h` n={st['count']} · méd {_format_minutes(st['p50'])} "
+            f"(p10 {_format_minutes(st['p10'])} – p90 {_format_minutes(st['p90'])})\n"
+            f"    glissante {_format_minutes(st['rolling_median'])} · "
+            f"tendance {st['trend_per_week']:+.1f} min/sem · {st['outliers']} aberrant(s)"
+        )
+        if st["last_is_outlier"]:
+            text += f" ⚠️ dernier +{_format_minutes(st['last_delay'])}"
+        text += "\n"
+        
+        # Jour de la semaine le plus marqué
+        effects = [(abs(e), day, e) for day, e in enumerate(st["dow_effect"]) if e is not None]
+        if effects:
+            _, day, effect = max(effects)
+            text += f"    jour : {WEEKDAYS[day]} {effect:+.0f} min\n"
+    
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+
+# Limites de l'API Bot : envoi 50 Mo, téléchargement 20 Mo
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+
+
+async def export_command(update, context):
+    """
+    Commande /export [logs|daily|users] [csv|ndjson] - Envoie la table
+    en document gzip (admin only)
+    """
+    chat_id = update.message.chat.id
+    
+    if chat_id != ADMIN_CHAT_ID:
+        return
+    
+    import tempfile
+    from async_db import run_in_thread
+    from export import EXPORTS, FORMATS, export_table
+    
+    args = [arg.lower() for arg in context.args or []]
+    name = args[0] if args else "logs"
+    fmt = args[1] if len(args) > 1 else "csv"
+    if name not in EXPORTS or fmt not in FORMATS:
+        await update.message.reply_text(
+            f"Usage : /export [{'|'.join(EXPORTS)}] [{'|'.join(FORMATS)}]"
+        )
+        return
+    
+    # Fichier temporaire sur disque : la table ne passe jamais entière en mémoire
+    with tempfile.TemporaryFile() as tmp:
+        count = await run_in_thread(export_table, name, tmp, fmt)
+        size = tmp.tell()
+        
+        if size > TELEGRAM_UPLOAD_LIMIT:
+            await update.message.reply_text(
+                f"⚠️ Export trop gros pour Telegram ({size / 1024 / 1024:.0f} Mo).\n"
+                f"Sur le serveur : `python export.py export {name} /data/{name}.{fmt}.gz`",
+                parse_mode="Markdown"
+            )
+            return
+        
+        tmp.seek(0)
+        date = datetime.now(timezone.utc).strftime("%Y%m%d")
+        await context.bot.send_document(
+            chat_id=chat_id,
+            document=tmp,
+            filename=f"{name}-{date}.{fmt}.gz",
+            caption=f"📦 {name} : {count} lignes ({size / 1024:.0f} Ko)"
+        )
+
+
+async def import_command(update, context):
+    """
+    Commande /import [logs|daily] - En réponse à un document envoyé par
+    /export, restaure les lignes absentes de la base (admin only)
+    """
     chat_id = update.message.chat.id
     
     if chat_id != ADMIN_CHAT_ID:
         return
     
-    await update.message.reply_text("🔍 Vérification des modèles en cours...")
+    import os
+    import tempfile
+    from async_db import run_in_thread
+    from export import IMPORTS, detect_format, import_table
+    
+    replied = update.message.reply_to_message
+    document = replied.document if replied else None
+    if document is None:
+        await update.message.reply_text(
+            "Usage : réponds /import [logs|daily] à un fichier .csv.gz ou .ndjson.gz"
+        )
+        return
+    
+    # Table : argument, sinon préfixe du nom de fichier (logs-20250101.csv.gz)
+    filename = document.file_name or ""
+    name = context.args[0].lower() if context.args else filename.split("-")[0].split(".")[0]
+    try:
+        fmt = detect_format(filename)
+        if name not in IMPORTS:
+            raise ValueError(f"Table non restaurable : {name} ({', '.join(IMPORTS)})")
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "import.gz")
+        tg_file = await document.get_file()
+        await tg_file.download_to_drive(path)
+        
+        try:
+            inserted = await run_in_thread(import_table, name, path, fmt)
+        except (ValueError, OSError) as e:
+            logger.error(f"❌ Import {filename} échoué : {e}")
+            await update.message.reply_text(f"❌ Import échoué : {e}")
+            return
     
-    from scheduler import check_all_models
-    await check_all_models(context.bot)
+    await update.message.reply_text(f"📥 {name} : {inserted} lignes importées, delay_stats reconstruite")
+
+
+async def dbstats_command(update, context):
+    """
+    Commande /dbstats [calls|queries|slow|reset] - Fonctions de la base
+    les plus coûteuses : appels, latences, requêtes, lignes, attente verrou (admin only)
+    """
+    chat_id = update.message.chat.id
+    
+    if chat_id != ADMIN_CHAT_ID:
+        return
+    
+    import db_metrics
+    
+    sort_keys = {"temps": "total_ms", "calls": "calls", "queries": "queries", "slow": "slow"}
+    arg = context.args[0].lower() if context.args else "temps"
+    
+    if arg == "reset":
+        db_metrics.reset()
+        await update.message.reply_text("🗄️ Compteurs de la base remis à zéro")
+        return
+    if arg not in sort_keys:
+        await update.message.reply_text(f"Usage : /dbstats [{'|'.join(sort_keys)}|reset]")
+        return
+    
+    calls, queries = db_metrics.totals()
+    text = (
+        f"🗄️ **Accès base** (tri : {arg})\n"
+        f"Total : {calls} appels, {queries} requêtes SQL\n"
+    )
+    
+    bounds = [f"≤{bound}" for bound in db_metrics.LATENCY_BUCKETS_MS]
+    bounds.append(f">{db_metrics.LATENCY_BUCKETS_MS[-1]}")
+    
+    for name, st in db_metrics.top(10, sort_keys[arg]):
+        n = st["calls"]
+        histogram = " ".join(
+            f"{bound}:{count}" for bound, count in zip(bounds, st["histogram"]) if count
+        )
+        text += (
+            f"\n`{name}` {n}× · moy {st['total_ms'] / n:.1f} ms · max {st['max_ms']:.0f} ms\n"
+            f"    {st['queries'] / n:.1f} req/appel · {st['rows'] / n:.1f} lignes/appel · "
+            f"verrou {st['lock_wait_ms']:.0f} ms · {st['slow']} lente(s)\n"
+            f"    ms {histogram}\n"
+        )
     
-    await update.message.reply_text("✅ Vérification terminée. Regarde les logs pour les détails.")
+    await update.message.reply_text(text, parse_mode="Markdown")
@@ -0,0 +1,257 @@
+"""
+Analyse des délais de disponibilité (NumPy)
+La tranche utile de run_availability_log est chargée en une seule requête
+dans des tableaux NumPy, puis percentiles, médiane glissante, effet du jour
+de la semaine, tendance et valeurs aberrantes sont calculés en vectoriel
+pour tous les couples (modèle, run) à la fois.
+Utilisé par /analyse (admin) et par la prédiction d'ETA.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+
+import database
+from database import DAY_SECONDS, RAW_LOG_RETENTION_DAYS, days_ago_epoch
+from db_metrics import instrumented
+
+logger = logging.getLogger(__name__)
+
+# Au-delà de RAW_LOG_RETENTION_DAYS, les logs bruts sont agrégés par jour
+# (run_availability_daily) puis supprimés : percentiles, médiane glissante et
+# aberrants ne sont calculables que sur la fenêtre brute
+ANALYSIS_DAYS = RAW_LOG_RETENTION_DAYS
+PERCENTILES = (10, 50, 90)
+ROLLING_WINDOW = 7       # observations de la médiane glissante
+OUTLIER_Z = 3.5          # seuil du z-score robuste (écart à la médiane / MAD)
+MIN_SAMPLES = 3          # même seuil que get_average_delay
+MIN_DOW_SAMPLES = 3      # observations minimum pour un effet jour de la semaine
+
+WEEKDAYS = ("lun", "mar", "mer", "jeu", "ven", "sam", "dim")
+
+# Analyses calculées {days: (log_generation, monotonic, analyse)}
+# Rechargées après une écriture dans les logs, ou au bout du TTL si un autre
+# process (worker) a écrit
+ANALYSIS_TTL_SECONDS = 600
+_cache: dict = {}
+_cache_lock = threading.Lock()
+
+
+# ============ CHARGEMENT ============
+
+@instrumented
+def load_delays(days: int = ANALYSIS_DAYS) -> dict:
+    """
+    Charge les logs des `days` derniers jours, triés par (modèle, run, run_ts).
+    Requête servie par l'index couvrant idx_log_stats.
+
+    Returns:
+        {
+            'keys': [(model, run_hour), ...],   # un élément par groupe
+            'starts': np.ndarray,               # début de chaque groupe
+            'counts': np.ndarray,               # taille de chaque groupe
+            'group': np.ndarray,                # groupe de chaque log
+            'run_ts': np.ndarray,               # epoch du run
+            'delay': np.ndarray,                # délai (minutes, float)
+        }
+    """
+    with database.reader() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(
+            """
+            SELECT model, run_hour, run_ts, delay_minutes
+            FROM run_availability_log
+            WHERE run_ts >= ?
+            ORDER BY model, run_hour, run_ts
+            """,
+            (days_ago_epoch(days),)
+        ).fetchall()
+
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return {"keys": [], "starts": empty, "counts": empty, "group": empty,
+                "run_ts": empty, "delay": np.empty(0)}
+
+    models, hours, run_ts, delays = zip(*rows)
+    models = np.array(models)
+    hours = np.array(hours, dtype=np.int64)
+
+    # Nouveau groupe à chaque changement de (modèle, run)
+    new_group = np.empty(len(rows), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = (models[1:] != models[:-1]) | (hours[1:] != hours[:-1])
+    starts = np.flatnonzero(new_group)
+
+    return {
+        "keys": [(str(models[i]), int(hours[i])) for i in starts],
+        "starts": starts,
+        "counts": np.diff(np.append(starts, len(rows))),
+        "group": np.cumsum(new_group) - 1,
+        "run_ts": np.array(run_ts, dtype=np.int64),
+        "delay": np.array(delays, dtype=np.float64),
+    }
+
+
+# ============ CALCULS VECTORISÉS ============
+
+def _group_percentiles(values: np.ndarray, group: np.ndarray, starts: np.ndarray,
+                       counts: np.ndarray, percentiles) -> np.ndarray:
+    """
+    Percentiles de chaque groupe (interpolation linéaire, comme np.percentile).
+    Un seul tri pour tous les groupes.
+
+    Returns:
+        Tableau (nb_groupes, len(percentiles))
+    """
+    sorted_values = values[np.lexsort((values, group))]
+    position = starts[:, None] + (counts[:, None] - 1) * (np.asarray(percentiles) / 100)
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def _rolling_median(values: np.ndarray, group: np.ndarray, starts: np.ndarray,
+                    window: int = ROLLING_WINDOW) -> np.ndarray:
+    """Médiane des `window` dernières observations de chaque log, sans déborder sur le groupe précédent."""
+    index = np.arange(len(values))[:, None] - (window - 1) + np.arange(window)
+    in_group = index >= starts[group][:, None]
+    # Tri par ligne, les NaN (hors groupe) en fin : médiane des k premières valeurs
+    windows = np.sort(np.where(in_group, values[np.clip(index, 0, None)], np.nan), axis=1)
+    valid = in_group.sum(axis=1)
+    rows = np.arange(len(values))
+    return (windows[rows, (valid - 1) // 2] + windows[rows, valid // 2]) / 2
+
+
+def analyse_delays(data: dict) -> dict:
+    """
+    Statistiques de tous les couples (modèle, run) d'un chargement load_delays.
+
+    Returns:
+        {(model, run_hour): {
+            'count': int,
+            'mean': float,
+            'p10': float, 'p50': float, 'p90': float,
+            'rolling_median': float,      # des ROLLING_WINDOW dernières observations
+            'trend_per_week': float,      # pente des délais (minutes par semaine)
+            'dow_effect': [float | None] * 7,  # écart à la moyenne, lundi → dimanche
+            'outliers': int,              # logs aberrants (z-score robuste > OUTLIER_Z)
+            'last_delay': int,
+            'last_run_ts': int,
+            'last_is_outlier': bool,
+        }}
+    """
+    keys = data["keys"]
+    if not keys:
+        return {}
+
+    group, starts, counts = data["group"], data["starts"], data["counts"]
+    run_ts, delay = data["run_ts"], data["delay"]
+    n_groups = len(keys)
+    last = starts + counts - 1
+
+    mean = np.bincount(group, weights=delay, minlength=n_groups) / counts
+    percentiles = _group_percentiles(delay, group, starts, counts, PERCENTILES)
+    median = percentiles[:, PERCENTILES.index(50)]
+    rolling = _rolling_median(delay, group, starts)
+
+    # Effet du jour de la semaine (1970-01-01 était un jeudi)
+    weekday = (run_ts // DAY_SECONDS + 3) % 7
+    cell = group * 7 + weekday
+    dow_count = np.bincount(cell, minlength=n_groups * 7).reshape(n_groups, 7)
+    dow_sum = np.bincount(cell, weights=delay, minlength=n_groups * 7).reshape(n_groups, 7)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dow_effect = np.where(dow_count >= MIN_DOW_SAMPLES, dow_sum / dow_count - mean[:, None], np.nan)
+
+    # Tendance : pente des moindres carrés délai ~ date, par groupe
+    days = run_ts / DAY_SECONDS
+    days_centered = days - (np.bincount(group, weights=days, minlength=n_groups) / counts)[group]
+    delay_centered = delay - mean[group]
+    sxx = np.bincount(group, weights=days_centered ** 2, minlength=n_groups)
+    sxy = np.bincount(group, weights=days_centered * delay_centered, minlength=n_groups)
+    trend = np.divide(sxy, sxx, out=np.zeros(n_groups), where=sxx > 0) * 7
+
+    # Aberrants : z-score robuste, MAD plancher à 1 min (délais entiers souvent identiques)
+    deviation = np.abs(delay - median[group])
+    mad = _group_percentiles(deviation, group, starts, counts, (50,))[:, 0]
+    outlier = 0.6745 * deviation / np.maximum(mad, 1)[group] > OUTLIER_Z
+    outliers = np.bincount(group, weights=outlier, minlength=n_groups)
+
+    return {
+        key: {
+            "count": int(counts[i]),
+            "mean": float(mean[i]),
+            "p10": float(percentiles[i, 0]),
+            "p50": float(percentiles[i, 1]),
+            "p90": float(percentiles[i, 2]),
+            "rolling_median": float(rolling[last[i]]),
+            "trend_per_week": float(trend[i]),
+            "dow_effect": [None if np.isnan(e) else float(e) for e in dow_effect[i]],
+            "outliers": int(outliers[i]),
+            "last_delay": int(delay[last[i]]),
+            "last_run_ts": int(run_ts[last[i]]),
+            "last_is_outlier": bool(outlier[last[i]]),
+        }
+        for i, key in enumerate(keys)
+    }
+
+
+# ============ API ============
+
+def analyse(days: int = ANALYSIS_DAYS) -> dict:
+    """
+    Analyse complète des `days` derniers jours (mise en cache),
+    `days` étant plafonné à ANALYSIS_DAYS (rétention des logs bruts).
+
+    Returns:
+        {
+            'days': int,
+            'samples': int,          # logs analysés
+            'elapsed_ms': float,     # chargement + calcul
+            'stats': {(model, run_hour): {...}},  # voir analyse_delays
+        }
+    """
+    days = min(days, ANALYSIS_DAYS)
+    generation = database.log_generation()
+    with _cache_lock:
+        cached = _cache.get(days)
+        if (cached is not None and cached[0] == generation
+                and time.monotonic() - cached[1] < ANALYSIS_TTL_SECONDS):
+            return cached[2]
+
+    start = time.perf_counter()
+    data = load_delays(days)
+    result = {
+        "days": days,
+        "samples": len(data["delay"]),
+        "stats": analyse_delays(data),
+    }
+    result["elapsed_ms"] = (time.perf_counter() - start) * 1000
+    logger.debug(f"🔬 Analyse {days}j : {result['samples']} logs en {result['elapsed_ms']:.1f} ms")
+
+    with _cache_lock:
+        _cache[days] = (generation, time.monotonic(), result)
+    return result
+
+
+def expected_delay(model: str, run_hour: int, weekday: int | None = None) -> int | None:
+    """
+    Délai attendu (minutes) pour le prochain run d'un couple (modèle, run) :
+    médiane glissante des derniers logs (insensible aux aberrants),
+    corrigée de l'effet du jour de la semaine s'il est connu.
+
+    Args:
+        weekday: Jour de la semaine du run (0 = lundi), None = sans correction
+
+    Returns:
+        Délai en minutes, ou None si pas assez de données
+    """
+    stats = analyse()["stats"].get((model, run_hour))
+    if stats is None or stats["count"] < MIN_SAMPLES:
+        return None
+
+    delay = stats["rolling_median"]
+    if weekday is not None and stats["dow_effect"][weekday] is not None:
+        delay += stats["dow_effect"][weekday]
+    return round(delay)
@@ -0,0 +1,147 @@
+"""
+Façade asynchrone de database.py
+Mêmes noms de fonctions, mais awaitables : chaque appel est exécuté sur un
+thread dédié à la base (file FIFO d'un executor à un seul worker). La boucle
+asyncio n'attend plus jamais SQLite (fsync lent du volume, verrou d'écriture...)
+et les appels d'un même handler restent exécutés dans l'ordre.
+
+Usage :
+    import async_db as db
+    user = await db.get_user(chat_id)
+"""
+import asyncio
+import functools
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Thread unique : les requêtes sont sérialisées dans l'ordre d'arrivée
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+
+async def run(func, *args, **kwargs):
+    """Exécute une fonction synchrone quelconque sur le thread de la base."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    Exécute un traitement long (export, import) sur un thread à part, hors de
+    la file de la base : les autres appels n'attendent pas sa fin. Ses lectures
+    passent par une connexion du pool (instantané WAL), ses écritures par
+    transactions courtes sous le verrou du writer.
+    """
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+def _async(func):
+    """Version awaitable d'une fonction de database.py"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+
+def _next_chunk(iterator, size: int) -> list:
+    return list(itertools.islice(iterator, size))
+
+
+def _async_iter(func):
+    """
+    Version itérable en async (async for) d'un générateur de database.py :
+    les lots sont lus sur le thread de la base, les éléments produits sur la boucle.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        iterator = await run(func, *args, **kwargs)
+        try:
+            while chunk := await run(_next_chunk, iterator, database.STREAM_CHUNK_SIZE):
+                for item in chunk:
+                    yield item
+        finally:
+            # Rend la connexion de lecture si l'itération est interrompue
+            await run(iterator.close)
+    return wrapper
+
+
+def shutdown():
+    """Attend la fin des requêtes en file puis arrête le thread de la base."""
+    _executor.shutdown(wait=True)
+
+
+# ============ INIT ============
+
+init_database = _async(database.init_database)
+load_subscription_index = _async(database.load_subscription_index)
+check_subscription_index = _async(database.check_subscription_index)
+
+# ============ USERS ============
+
+get_user = _async(database.get_user)
+create_user = _async(database.create_user)
+get_or_create_user = _async(database.get_or_create_user)
+update_user_models = _async(database.update_user_models)
+update_user_runs = _async(database.update_user_runs)
+get_user_models = _async(database.get_user_models)
+get_user_runs = _async(database.get_user_runs)
+toggle_model_for_user = _async(database.toggle_model_for_user)
+toggle_run_for_user = _async(database.toggle_run_for_user)
+deactivate_user = _async(database.deactivate_user)
+deactivate_users = _async(database.deactivate_users)
+reactivate_user = _async(database.reactivate_user)
+migrate_chat = _async(database.migrate_chat)
+set_user_digest = _async(database.set_user_digest)
+count_active_users = _async(database.count_active_users)
+count_subscribers_by_model = _async(database.count_subscribers_by_model)
+
+# ============ LAST RUNS ============
+
+save_last_run = _async(database.save_last_run)
+get_last_run = _async(database.get_last_run)
+is_new_run = _async(database.is_new_run)
+
+# ============ FILE D'ÉVÉNEMENTS ============
+
+enqueue_run_event = _async(database.enqueue_run_event)
+claim_next_run_event = _async(database.claim_next_run_event)
+complete_run_event = _async(database.complete_run_event)
+defer_run_event = _async(database.defer_run_event)
+count_pending_run_events = _async(database.count_pending_run_events)
+renew_run_event_lease = _async(database.renew_run_event_lease)
+
+# ============ OUTBOX DES NOTIFICATIONS ============
+
+claim_outbox_batch = _async(database.claim_outbox_batch)
+get_digest_companions = _async(database.get_digest_companions)
+record_outbox_results = _async(database.record_outbox_results)
+next_outbox_attempt = _async(database.next_outbox_attempt)
+count_outbox = _async(database.count_outbox)
+
+# ============ RAPPELS ============
+
+upsert_reminder = _async(database.upsert_reminder)
+delete_reminder = _async(database.delete_reminder)
+get_user_reminders = _async(database.get_user_reminders)
+iter_reminders = _async_iter(database.iter_reminders)
+get_active_chat_ids = _async(database.get_active_chat_ids)
+mark_reminders_fired = _async(database.mark_reminders_fired)
+
+# ============ LOGGING ============
+
+log_run_availability = _async(database.log_run_availability)
+count_availability_logs = _async(database.count_availability_logs)
+get_average_delay = _async(database.get_average_delay)
+get_next_run_eta = _async(database.get_next_run_eta)
+get_log_stats = _async(database.get_log_stats)
+get_delay_stats = _async(database.get_delay_stats)
+rebuild_delay_stats = _async(database.rebuild_delay_stats)
+get_history_page = _async(database.get_history_page)
+
+# ============ RÉTENTION ============
+
+run_retention = _async(database.run_retention)
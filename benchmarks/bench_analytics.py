@@ -0,0 +1,87 @@
+"""
+Benchmark de l'analyse NumPy des délais (analytics.py) sur un historique
+synthétique, et vérification contre un calcul groupe par groupe.
+
+Usage : python benchmarks/bench_analytics.py [jours ...]   (défaut : 365 1825)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import analytics  # noqa: E402
+import database  # noqa: E402
+from config import MODELS, AVAILABLE_RUNS  # noqa: E402
+
+
+def populate(days: int, seed: int = 1):
+    """Un log par (modèle, run, jour) sur `days` jours, avec quelques retards aberrants."""
+    rng = random.Random(seed)
+    today = database.days_ago_epoch(0)
+    with database.writer() as conn:
+        conn.executemany(
+            "INSERT INTO run_availability_log (model, run_hour, run_ts, detected_ts, delay_minutes) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (model, run_hour, run_ts, run_ts + delay * 60, delay)
+                for model in MODELS
+                for run_hour in AVAILABLE_RUNS
+                for day in range(days)
+                for run_ts in [today - day * database.DAY_SECONDS + run_hour * 3600]
+                for delay in [200 + run_hour + rng.randint(-15, 15) + (240 if rng.random() < 0.02 else 0)]
+            )
+        )
+
+
+def reference(data: dict) -> dict:
+    """Mêmes statistiques, calculées groupe par groupe avec NumPy."""
+    result = {}
+    for i, key in enumerate(data["keys"]):
+        part = slice(data["starts"][i], data["starts"][i] + data["counts"][i])
+        delay = data["delay"][part]
+        result[key] = {
+            "p10": np.percentile(delay, 10),
+            "p50": np.percentile(delay, 50),
+            "p90": np.percentile(delay, 90),
+            "rolling_median": np.median(delay[-analytics.ROLLING_WINDOW:]),
+            "trend_per_week": np.polyfit(data["run_ts"][part] / database.DAY_SECONDS, delay, 1)[0] * 7,
+        }
+    return result
+
+
+def main():
+    periods = [int(arg) for arg in sys.argv[1:]] or [365, 1825]
+
+    for days in periods:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DATABASE_PATH = os.path.join(tmp, "bench.db")
+            database.init_database()
+            populate(days)
+
+            start = time.perf_counter()
+            data = analytics.load_delays(days)
+            loaded = time.perf_counter()
+            stats = analytics.analyse_delays(data)
+            done = time.perf_counter()
+
+            print(f"\n{days} jours, {len(data['delay'])} logs, {len(stats)} couples (modèle, run)")
+            print(f"  chargement  {(loaded - start) * 1000:8.1f} ms")
+            print(f"  calcul      {(done - loaded) * 1000:8.1f} ms")
+
+            expected = reference(data)
+            for key, values in expected.items():
+                for name, value in values.items():
+                    assert abs(stats[key][name] - value) < 1e-6, (key, name, stats[key][name], value)
+            print(f"  conforme au calcul par groupe ✓ "
+                  f"({sum(st['outliers'] for st in stats.values())} aberrants détectés)")
+
+            database.get_manager().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark : coût par appel des fonctions de database.py
+Avant : une connexion sqlite3 ouverte/fermée par requête (ancien get_connection)
+Après : gestionnaire de connexions (writer + pool de lecture, WAL, pragmas)
+
+Usage : python benchmarks/bench_connections.py [nb_appels]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database  # noqa: E402
+
+
+def legacy_query(path: str, sql: str, params: tuple = (), write: bool = False):
+    """Reproduit l'ancien schéma : connect → requête → (commit) → close."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute(sql, params).fetchone()
+    if write:
+        conn.commit()
+    conn.close()
+    return row
+
+
+def bench(label: str, func, n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        func(i)
+    per_call_us = (time.perf_counter() - start) / n * 1e6
+    print(f"  {label:<34} {per_call_us:8.1f} µs/appel")
+    return per_call_us
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_PATH = os.path.join(tmp, "bench.db")
+        database.init_database()
+        path = database.DATABASE_PATH
+
+        for chat_id in range(1000):
+            database.create_user(chat_id, f"user{chat_id}")
+        database.save_last_run("GFS", datetime(2025, 1, 1, 12, tzinfo=timezone.utc))
+
+        # L'ancien mode journal (rollback) pour la mesure "avant"
+        legacy_path = os.path.join(tmp, "legacy.db")
+        conn = sqlite3.connect(legacy_path)
+        database.create_tables(conn)
+        conn.executemany("INSERT INTO users (chat_id) VALUES (?)", [(i,) for i in range(1000)])
+        conn.execute("INSERT INTO last_runs (model, run_ts) VALUES ('GFS', 1735732800)")
+        conn.commit()
+        conn.close()
+
+        run = datetime(2025, 1, 1, 18, tzinfo=timezone.utc)
+        results = []
+
+        print(f"Lecture get_user ({n} appels)")
+        before = bench("avant (connexion par appel)", lambda i: legacy_query(
+            legacy_path, "SELECT * FROM users WHERE chat_id = ?", (i % 1000,)), n)
+        after = bench("après (pool de lecture)", lambda i: database.get_user(i % 1000), n)
+        results.append(("get_user", before, after))
+
+        print(f"Lecture is_new_run ({n} appels)")
+        before = bench("avant (connexion par appel)", lambda i: legacy_query(
+            legacy_path, "SELECT run_ts FROM last_runs WHERE model = ?", ("GFS",)), n)
+        after = bench("après (pool de lecture)", lambda i: database.is_new_run("GFS", run), n)
+        results.append(("is_new_run", before, after))
+
+        print(f"Écriture update_user_runs ({n} appels)")
+        before = bench("avant (connexion par appel)", lambda i: legacy_query(
+            legacy_path, "UPDATE users SET runs_mask = ? WHERE chat_id = ?", (4160, i % 1000), write=True), n)
+        after = bench("après (writer WAL)", lambda i: database.update_user_runs(i % 1000, [6, 12]), n)
+        results.append(("update_user_runs", before, after))
+
+        print("\nRésumé (µs/appel)")
+        for name, before, after in results:
+            print(f"  {name:<20} {before:8.1f} → {after:8.1f}  (x{before / after:.1f})")
+
+        database.get_manager().close()
+
+
+if __name__ == "__main__":
+    main()
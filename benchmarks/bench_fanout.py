@@ -0,0 +1,55 @@
+"""
+Benchmark du moteur de fan-out (fanout.py) avec un bot factice :
+débit obtenu face à la limite globale, comparé à l'envoi en série
+historique (un message puis 50 ms de pause).
+
+Usage : python benchmarks/bench_fanout.py [nb_chats] [latence_ms]   (défaut : 600 150)
+"""
+import asyncio
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fanout import FanoutEngine, GLOBAL_RATE  # noqa: E402
+
+
+class FakeBot:
+    """Appel API simulé : latence aléatoire autour de `latency` secondes."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent = 0
+
+    async def send_message(self, chat_id: int, text: str):
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        self.sent += 1
+
+
+async def main():
+    n_chats = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 150) / 1000
+
+    bot = FakeBot(latency)
+    engine = FanoutEngine()
+
+    async def chat_ids():
+        for chat_id in range(n_chats):
+            yield chat_id
+
+    async def send(chat_id: int) -> bool:
+        await bot.send_message(chat_id, "message rendu une seule fois")
+        return True
+
+    report = await engine.run(chat_ids(), send)
+
+    serial = n_chats * (latency + 0.05)
+    print(f"{n_chats} chats, latence API ~{latency * 1000:.0f} ms, limite {GLOBAL_RATE} msg/s")
+    print(f"  fan-out concurrent : {report['elapsed']:6.1f} s  ({report['rate']:.1f} msg/s)")
+    print(f"  série (historique) : {serial:6.1f} s  ({n_chats / serial:.1f} msg/s, estimé)")
+    print(f"  plancher plateforme: {n_chats / GLOBAL_RATE:6.1f} s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""
+Benchmark mémoire : liste complète (fetchall) vs parcours en flux (fetchmany)
+des abonnés d'un modèle/run, et remplissage de l'outbox qui consomme ce flux.
+
+Usage : python benchmarks/bench_streaming.py [nb_users ...]   (défaut : 100000 1000000)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database  # noqa: E402
+
+
+def populate(n_users: int, seed: int = 1):
+    """Insère n_users utilisateurs actifs, tous abonnés à AROME 06h."""
+    rng = random.Random(seed)
+    with database.writer() as conn:
+        conn.executemany(
+            "INSERT INTO users (chat_id, username, models_mask, runs_mask) VALUES (?, ?, ?, ?)",
+            ((chat_id, f"user{chat_id}", rng.randint(1, 15), rng.choice((0, 64, 4160)))
+             for chat_id in range(n_users))
+        )
+        conn.execute("INSERT INTO subscriptions SELECT chat_id, 'AROME', 6 FROM users")
+
+
+def fetch_all() -> int:
+    """Référence : tous les abonnés chargés d'un coup"""
+    with database.reader() as conn:
+        return len(conn.execute(
+            "SELECT chat_id FROM subscriptions WHERE model = 'AROME' AND run_hour IN (6, ?)",
+            (database.ALL_RUNS,)
+        ).fetchall())
+
+
+def fill_outbox() -> int:
+    """Remplissage de l'outbox d'un événement fictif, annulé ensuite"""
+    with database.writer(transaction=False) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            return database._fill_outbox(conn, 1, "AROME", 6)
+        finally:
+            conn.execute("ROLLBACK")
+
+
+def measure(label: str, func):
+    """Exécute func et affiche son pic d'allocations Python et sa durée."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<34} {peak / 1024 / 1024:9.1f} Mo  {elapsed:6.2f} s  ({count} lignes)")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]
+
+    for n_users in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DATABASE_PATH = os.path.join(tmp, "bench.db")
+            database.init_database()
+            populate(n_users)
+
+            print(f"\n{n_users} utilisateurs")
+            measure("abonnés en liste (fetchall)", fetch_all)
+            measure("iter_subscribed_chat_ids (flux)",
+                    lambda: sum(1 for _ in database.iter_subscribed_chat_ids("AROME", 6)))
+            measure("_fill_outbox (lots du flux)", fill_outbox)
+
+            database.get_manager().close()
+
+
+if __name__ == "__main__":
+    main()
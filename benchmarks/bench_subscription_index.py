@@ -0,0 +1,84 @@
+"""
+Benchmark : remplissage de l'outbox (destinataires d'un run) depuis la table
+subscriptions (SQL) vs l'index mémoire
+
+Usage : python benchmarks/bench_subscription_index.py [nb_users]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database  # noqa: E402
+from config import MODELS, AVAILABLE_RUNS  # noqa: E402
+from subscription_index import index, ALL_RUNS  # noqa: E402
+
+
+def populate(n_users: int, seed: int = 1):
+    """Insère n_users utilisateurs actifs aux abonnements aléatoires."""
+    rng = random.Random(seed)
+    models = list(MODELS)
+    with database.writer() as conn:
+        for chat_id in range(n_users):
+            user_models = rng.sample(models, rng.randint(1, len(models)))
+            user_runs = [] if rng.random() < 0.1 else rng.sample(AVAILABLE_RUNS, rng.randint(1, 4))
+            conn.execute(
+                "INSERT INTO users (chat_id, models_mask, runs_mask) VALUES (?, ?, ?)",
+                (chat_id, database.models_to_mask(user_models), database.runs_to_mask(user_runs))
+            )
+            conn.executemany(
+                "INSERT INTO subscriptions (chat_id, model, run_hour) VALUES (?, ?, ?)",
+                [(chat_id, m, h) for m in user_models for h in (user_runs or [ALL_RUNS])]
+            )
+
+
+def fill(event_id: int, run_hour: int) -> int:
+    """Remplit l'outbox d'un événement fictif, annulé ensuite (base inchangée)"""
+    with database.writer(transaction=False) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            return database._fill_outbox(conn, event_id, "AROME", run_hour)
+        finally:
+            conn.execute("ROLLBACK")
+
+
+def bench(label: str, n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        fill(i, AVAILABLE_RUNS[i % len(AVAILABLE_RUNS)])
+    per_call_ms = (time.perf_counter() - start) / n * 1e3
+    print(f"  {label:<20} {per_call_ms:10.2f} ms/run")
+    return per_call_ms
+
+
+def main():
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_PATH = os.path.join(tmp, "bench.db")
+        database.init_database()
+        populate(n_users)
+
+        print(f"{n_users} utilisateurs, {fill(0, 12)} abonnés AROME 12h")
+
+        sql = bench("SQL (index)", 20)
+
+        start = time.perf_counter()
+        database.load_subscription_index()
+        print(f"  chargement index     {(time.perf_counter() - start) * 1000:10.1f} ms")
+        mem = bench("index mémoire", 20)
+
+        start = time.perf_counter()
+        for i in range(10_000):
+            index.replace_user(i, {("GFS", 6), ("AROME", ALL_RUNS)})
+        print(f"  mise à jour user     {(time.perf_counter() - start) / 10_000 * 1e6:10.1f} µs/appel")
+
+        print(f"\nRemplissage de l'outbox : x{sql / mem:.1f}")
+        database.get_manager().close()
+
+
+if __name__ == "__main__":
+    main()
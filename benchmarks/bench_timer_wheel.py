@@ -0,0 +1,84 @@
+"""
+Benchmark de la roue temporelle (timer_wheel.py) utilisée par les rappels :
+insertion, annulation et expiration de N minuteries réparties sur 24 h,
+comparées à une liste triée (bisect), structure naïve de référence.
+
+Usage : python benchmarks/bench_timer_wheel.py [nb_minuteries]   (défaut : 100000)
+"""
+import bisect
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from timer_wheel import TimerWheel  # noqa: E402
+
+DAY = 86400
+
+
+def bench_wheel(deadlines: list[float], cancelled: list[int]) -> dict:
+    wheel = TimerWheel(0)
+
+    start = time.perf_counter()
+    for key, when in enumerate(deadlines):
+        wheel.schedule(key, when)
+    insert = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in cancelled:
+        wheel.cancel(key)
+    cancel = time.perf_counter() - start
+
+    # Une journée de ticks d'1 s, comme la boucle de reminders.py
+    start = time.perf_counter()
+    fired = 0
+    for now in range(1, DAY + 1):
+        fired += len(wheel.advance(now))
+    advance = time.perf_counter() - start
+
+    return {"insert": insert, "cancel": cancel, "advance": advance, "fired": fired}
+
+
+def bench_sorted_list(deadlines: list[float], cancelled: list[int]) -> dict:
+    timers: list[tuple[float, int]] = []
+
+    start = time.perf_counter()
+    for key, when in enumerate(deadlines):
+        bisect.insort(timers, (when, key))
+    insert = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for key in cancelled:
+        del timers[bisect.bisect_left(timers, (deadlines[key], key))]
+    cancel = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fired = 0
+    for now in range(1, DAY + 1):
+        cut = bisect.bisect_right(timers, (now, float("inf")))
+        fired += cut
+        del timers[:cut]
+    advance = time.perf_counter() - start
+
+    return {"insert": insert, "cancel": cancel, "advance": advance, "fired": fired}
+
+
+def main():
+    n_timers = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    random.seed(42)
+    deadlines = [random.uniform(1, DAY) for _ in range(n_timers)]
+    cancelled = random.sample(range(n_timers), n_timers // 10)
+
+    print(f"{n_timers} minuteries sur 24 h, {len(cancelled)} annulées, {DAY} ticks d'1 s")
+    for name, bench in (("roue temporelle", bench_wheel), ("liste triée", bench_sorted_list)):
+        result = bench(deadlines, cancelled)
+        print(f"  {name:16s}: insertion {result['insert'] / n_timers * 1e6:6.2f} µs, "
+              f"annulation {result['cancel'] / len(cancelled) * 1e6:6.2f} µs, "
+              f"24 h de ticks {result['advance']:5.2f} s ({result['fired']} expirées)")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,9 +20,9 @@ from telegram.ext import (
     ContextTypes,
 )
 
-from config import BOT_TOKEN, MODELS, AVAILABLE_RUNS, DEFAULT_RUNS
-from database import (
-    init_database,
+from config import BOT_TOKEN, MODELS, AVAILABLE_RUNS, DEFAULT_RUNS, DIGEST_CHOICES, FALLBACK_DELAYS
+from database import init_database, load_subscription_index
+from async_db import (
     get_or_create_user,
     get_user,
     get_user_models,
@@ -32,16 +32,29 @@ from database import (
     update_user_runs,
     deactivate_user,
     reactivate_user,
+    set_user_digest,
+    upsert_reminder,
+    delete_reminder,
+    get_user_reminders,
     get_next_run_eta,  # V1.1
     get_average_delay, # V1.1
     get_log_stats,     # V1.1
+    get_history_page,
 )
 from checker import get_all_latest_runs, get_all_cached_runs, init_cache
+from transport import build_request, long_poll_timeout
+from reminders import reminder_service, DEFAULT_LEAD_MINUTES, MAX_LEAD_MINUTES
 from admin import (
     send_admin_notification,
     admin_stats_command,
     testnotif_command,
     forcecheck_command,
+    checkindex_command,
+    rebuildstats_command,
+    analyse_command,
+    export_command,
+    import_command,
+    dbstats_command,
     count_logs_for_stats,
 )
 
@@ -61,34 +74,6 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # ============ CONSTANTES POUR /PROCHAIN (V1.1) ============
 
-# Délais fallback en minutes (utilisés quand pas encore de stats)
-FALLBACK_DELAYS = {
-    "AROME": {
-        0: 270,   # 4h30 → dispo ~04h30 Paris
-        6: 300,   # 5h00 → dispo ~11h00 Paris
-        12: 285,  # 4h45 → dispo ~16h45 Paris
-        18: 300,  # 5h00 → dispo ~23h00 Paris
-    },
-    "ARPEGE": {
-        0: 300,   # 5h00 → dispo ~05h00 Paris
-        6: 330,   # 5h30 → dispo ~11h30 Paris
-        12: 315,  # 5h15 → dispo ~17h15 Paris
-        18: 330,  # 5h30 → dispo ~23h30 Paris
-    },
-    "GFS": {
-        0: 270,   # 4h30 → dispo ~04h30 Paris
-        6: 300,   # 5h00 → dispo ~11h00 Paris
-        12: 285,  # 4h45 → dispo ~16h45 Paris
-        18: 300,  # 5h00 → dispo ~23h00 Paris
-    },
-    "ECMWF": {
-        0: 540,   # 9h00 → dispo ~09h00 Paris
-        6: 300,   # 5h00 → dispo ~11h00 Paris
-        12: 540,  # 9h00 → dispo ~21h00 Paris
-        18: 300,  # 5h00 → dispo ~23h00 Paris
-    }
-}
-
 EMOJI_MAP = {
     "AROME": "⛵",
     "ARPEGE": "🌍",
@@ -118,7 +103,7 @@ def round_to_quarter_hour(hour_decimal: float) -> str:
     return f"{hours:02d}h{rounded_minutes:02d}"
 
 
-def generate_aide_horaires() -> str:
+async def generate_aide_horaires() -> str:
     """Génère la section horaires de /aide avec stats dynamiques"""
     
     models_info = {
@@ -153,7 +138,7 @@ def generate_aide_horaires() -> str:
         
         for run_hour in info['runs']:
             # Essayer de récupérer les stats
-            stats = get_log_stats(model, run_hour, days=30)
+            stats = await get_log_stats(model, run_hour, days=30)
             
             if stats and stats['count'] >= 3:
                 # Stats disponibles
@@ -201,13 +186,13 @@ def calculate_next_run(now: datetime, run_hour: int) -> datetime:
     return today_run
 
 
-def get_eta_with_fallback(model: str, run_hour: int, run_datetime: datetime) -> tuple[datetime | None, bool]:
+async def get_eta_with_fallback(model: str, run_hour: int, run_datetime: datetime) -> tuple[datetime | None, bool]:
     """
     Retourne (ETA, has_stats).
     has_stats = True si basé sur vraies données, False si fallback
     """
     # Essayer stats réelles
-    eta = get_next_run_eta(model, run_hour, run_datetime)
+    eta = await get_next_run_eta(model, run_hour, run_datetime)
     
     if eta is not None:
         return eta, True
@@ -222,7 +207,7 @@ def get_eta_with_fallback(model: str, run_hour: int, run_datetime: datetime) ->
     return run_datetime + timedelta(minutes=delay_minutes), False
 
 
-def format_prochain_message(runs_by_model: dict, show_all: bool = False):
+async def format_prochain_message(runs_by_model: dict, show_all: bool = False):
     """Formate le message groupé par modèle"""
     paris_tz = ZoneInfo('Europe/Paris')
     now = datetime.now(timezone.utc)
@@ -262,7 +247,7 @@ def format_prochain_message(runs_by_model: dict, show_all: bool = False):
         message += "\n"
     
     # Footer avec légende
-    logs_count = count_logs_for_stats()
+    logs_count = await count_logs_for_stats()
     message += "💡 **Prédictions :**\n"
     
     if logs_count >= 30:
@@ -312,14 +297,16 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = update.message.from_user.username
     
     # Vérifier si c'est un nouvel utilisateur
-    existing_user = get_user(chat_id)
+    existing_user = await get_user(chat_id)
     is_new_user = existing_user is None
     
-    user = get_or_create_user(chat_id, username)
+    user = await get_or_create_user(chat_id, username)
     
-    # Si user existait et était inactif, le réactiver
+    # Si user existait et était inactif, le réactiver (avec ses rappels)
     if not user["active"]:
-        reactivate_user(chat_id)
+        await reactivate_user(chat_id)
+        for reminder in await get_user_reminders(chat_id):
+            await reminder_service.add(reminder)
     
     welcome_text = """
 🌊 **Bienvenue sur Wind Bot !**
@@ -339,6 +326,9 @@ Pour ajouter d'autres runs (00h, 18h) → /horaires
 /prochains — Prochains runs attendus (ETAs)
 /statut — Voir tes abonnements
 /derniers — Derniers runs disponibles
+/historique — Historique des sorties de runs
+/regroupement — Regrouper les runs proches en un message
+/rappel — Être prévenu avant la sortie d'un run
 /aide — Comprendre les runs météo
 /lol — Une blague pour rigoler 😄
 /arreter — Se désabonner
@@ -352,7 +342,7 @@ async def aide_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Commande /aide - Explique le fonctionnement des modèles météo"""
     
     # Générer les horaires dynamiquement (avec stats si disponibles)
-    horaires_section = generate_aide_horaires()
+    horaires_section = await generate_aide_horaires()
     
     aide_text = f"""
 📚 **Comment ça marche ?**
@@ -377,6 +367,9 @@ Pour une nav l'après-midi, attends le run 06h (~12h).
 /prochains — Prochains runs attendus (ETAs)
 /statut — Voir tes abonnements
 /derniers — Derniers runs disponibles
+/historique — Historique des sorties de runs
+/regroupement — Regrouper les runs proches en un message
+/rappel — Être prévenu avant la sortie d'un run
 /lol — Une blague pour rigoler 😄
 /arreter — Se désabonner
     """
@@ -387,7 +380,7 @@ Pour une nav l'après-midi, attends le run 06h (~12h).
 async def modeles_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Commande /modeles - Choix des modèles à suivre"""
     chat_id = update.message.chat.id
-    user_models = get_user_models(chat_id)
+    user_models = await get_user_models(chat_id)
     
     keyboard = []
     
@@ -420,7 +413,7 @@ async def modeles_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def horaires_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Commande /horaires - Choix des runs à suivre"""
     chat_id = update.message.chat.id
-    user_runs = get_user_runs(chat_id)
+    user_runs = await get_user_runs(chat_id)
     
     keyboard = build_horaires_keyboard(user_runs)
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -438,7 +431,7 @@ _(Par défaut : 06h et 12h uniquement)_"""
 async def statut_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Commande /statut - Affiche l'état des abonnements"""
     chat_id = update.message.chat.id
-    user = get_user(chat_id)
+    user = await get_user(chat_id)
     
     if not user:
         await update.message.reply_text(
@@ -474,6 +467,10 @@ async def statut_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         status_text += "  _Tous les runs_\n"
     
+    # Regroupement
+    if user["digest_minutes"]:
+        status_text += f"\n📦 **Regroupement :** runs proches regroupés sur {user['digest_minutes']} min\n"
+    
     # Conseil si config incomplète
     if not models:
         status_text += "\n⚠️ Configure tes modèles avec /modeles"
@@ -527,7 +524,7 @@ async def derniers_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def prochains_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Commande /prochains [tout] - Affiche les prochains runs attendus"""
     chat_id = update.message.chat.id
-    user = get_user(chat_id)
+    user = await get_user(chat_id)
     
     # Détecter si "tout" est demandé
     show_all = len(context.args) > 0 and context.args[0].lower() == "tout"
@@ -562,7 +559,7 @@ async def prochains_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             next_run_dt = calculate_next_run(now, run_hour)
             
             # Obtenir ETA avec fallback
-            result = get_eta_with_fallback(model, run_hour, next_run_dt)
+            result = await get_eta_with_fallback(model, run_hour, next_run_dt)
             
             if result[0] is None:
                 continue
@@ -584,7 +581,7 @@ async def prochains_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             runs_by_model[model] = model_runs
     
     # Formatter le message
-    message = format_prochain_message(runs_by_model, show_all)
+    message = await format_prochain_message(runs_by_model, show_all)
     
     # Ajouter bouton toggle
     keyboard = []
@@ -603,6 +600,228 @@ async def prochains_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await wait_msg.edit_text(message, parse_mode="Markdown", reply_markup=reply_markup)
 
 
+def parse_historique_args(args: list) -> tuple[str | None, int | None]:
+    """
+    Arguments de /historique : [modèle] [heure], dans n'importe quel ordre.
+    
+    Raises:
+        ValueError: argument ni modèle connu ni heure de run valide
+    """
+    model, run_hour = None, None
+    for arg in args:
+        value = arg.strip().upper()
+        if value in MODELS:
+            model = value
+        elif value.rstrip("H").isdigit() and int(value.rstrip("H")) in AVAILABLE_RUNS:
+            run_hour = int(value.rstrip("H"))
+        else:
+            raise ValueError(arg)
+    return model, run_hour
+
+
+async def build_historique_page(model: str | None, run_hour: int | None,
+                                cursor: tuple[int, int] | None = None,
+                                newer: bool = False) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Texte et boutons ◀️/▶️ d'une page de /historique"""
+    page = await get_history_page(model, run_hour, cursor, newer)
+    rows = page["rows"]
+    
+    title = "📜 **Historique des runs"
+    if model:
+        title += f" {MODELS.get(model, {}).get('emoji', '🌐')} {model}"
+    if run_hour is not None:
+        title += f" {run_hour:02d}h"
+    text = title + " :**\n\n"
+    
+    if not rows:
+        text += "_Aucun run enregistré pour le moment._"
+        return text, None
+    
+    paris_tz = ZoneInfo('Europe/Paris')
+    for _, row_model, row_hour, run_ts, delay in rows:
+        run_dt = datetime.fromtimestamp(run_ts, timezone.utc)
+        available = (run_dt + timedelta(minutes=delay)).astimezone(paris_tz)
+        emoji = MODELS.get(row_model, {}).get("emoji", "🌐")
+        hours, minutes = divmod(delay, 60)
+        text += (
+            f"{emoji} **{row_model}** {run_dt.strftime('%d/%m')} {row_hour:02d}h UTC"
+            f" → +{hours}h{minutes:02d} _(dispo {available.strftime('%d/%m %H:%M')})_\n"
+        )
+    text += "\n🕐 _Heure de dispo : Paris_"
+    
+    # Curseurs : première et dernière ligne de la page affichée
+    scope = f"{model or '*'}:{'*' if run_hour is None else run_hour}"
+    buttons = []
+    if page["has_newer"]:
+        _, _, _, run_ts, _ = rows[0]
+        buttons.append(InlineKeyboardButton(
+            "◀️ Plus récents", callback_data=f"hist:{scope}:n:{run_ts}:{rows[0][0]}"
+        ))
+    if page["has_older"]:
+        _, _, _, run_ts, _ = rows[-1]
+        buttons.append(InlineKeyboardButton(
+            "Plus anciens ▶️", callback_data=f"hist:{scope}:o:{run_ts}:{rows[-1][0]}"
+        ))
+    
+    return text, InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def historique_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Commande /historique [modèle] [heure] - Historique paginé des sorties de runs"""
+    try:
+        model, run_hour = parse_historique_args(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(
+            f"❓ Argument inconnu : {e}\n\n"
+            f"Usage : /historique [modèle] [heure]\n"
+            f"Ex : /historique AROME 12h\n\n"
+            f"Modèles : {', '.join(MODELS)}"
+        )
+        return
+    
+    text, reply_markup = await build_historique_page(model, run_hour)
+    await update.message.reply_text(text, parse_mode="Markdown", reply_markup=reply_markup)
+
+
+REGROUPEMENT_TEXT = """**Regrouper les notifications :**
+
+AROME, ARPEGE et GFS sortent souvent à quelques minutes d'écart.
+Avec le regroupement, les runs détectés dans la fenêtre choisie arrivent en **un seul message**, au prix d'un petit délai."""
+
+
+def build_regroupement_keyboard(digest_minutes: int) -> InlineKeyboardMarkup:
+    """Clavier de /regroupement : une ligne par fenêtre de DIGEST_CHOICES"""
+    keyboard = []
+    for minutes in DIGEST_CHOICES:
+        checked = "✅" if minutes == digest_minutes else "⬜"
+        label = f"📦 Fenêtre de {minutes} min" if minutes else "🔔 Un message par run"
+        keyboard.append([InlineKeyboardButton(f"{label} {checked}", callback_data=f"digest_{minutes}")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+async def regroupement_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Commande /regroupement - Fenêtre de regroupement des notifications"""
+    chat_id = update.message.chat.id
+    user = await get_user(chat_id)
+    
+    if not user:
+        await update.message.reply_text("Tu n'es pas encore inscrit. Utilise /start")
+        return
+    
+    await update.message.reply_text(
+        REGROUPEMENT_TEXT,
+        reply_markup=build_regroupement_keyboard(user["digest_minutes"]),
+        parse_mode="Markdown"
+    )
+
+
+RAPPEL_USAGE = (
+    "Usage :\n"
+    "/rappel AROME 12h — rappel 10 min avant la sortie prévue\n"
+    "/rappel AROME 12h 30 — 30 min avant\n"
+    "/rappel suppr AROME 12h — supprimer le rappel\n"
+    "/rappel — voir tes rappels"
+)
+
+
+def parse_rappel_args(args: list) -> tuple[bool, str | None, int | None, int | None]:
+    """
+    Arguments de /rappel : [suppr] modèle heure [minutes].
+    Le premier nombre est l'heure du run, le second l'avance en minutes ("30" ou "30min").
+    
+    Returns:
+        (suppression, modèle, heure, minutes)
+    
+    Raises:
+        ValueError: argument non reconnu
+    """
+    delete, model, run_hour, lead = False, None, None, None
+    for arg in args:
+        value = arg.strip().upper()
+        if value in ("SUPPR", "STOP"):
+            delete = True
+        elif value in MODELS:
+            model = value
+        elif value.endswith("H") and value[:-1].isdigit():
+            run_hour = int(value[:-1])
+        elif value.removesuffix("MIN").isdigit():
+            if run_hour is None and not value.endswith("MIN"):
+                run_hour = int(value)
+            else:
+                lead = int(value.removesuffix("MIN"))
+        else:
+            raise ValueError(arg)
+    return delete, model, run_hour, lead
+
+
+async def rappel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Commande /rappel - Rappel N minutes avant la sortie prévue d'un run"""
+    chat_id = update.message.chat.id
+    user = await get_user(chat_id)
+    
+    if not user or not user["active"]:
+        await update.message.reply_text("Tu n'es pas abonné. Utilise /start")
+        return
+    
+    try:
+        delete, model, run_hour, lead = parse_rappel_args(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(f"❓ Argument inconnu : {e}\n\n{RAPPEL_USAGE}")
+        return
+    
+    # Sans argument : liste des rappels
+    if model is None and run_hour is None:
+        reminders = await get_user_reminders(chat_id)
+        if not reminders:
+            await update.message.reply_text(f"⏰ Aucun rappel programmé.\n\n{RAPPEL_USAGE}")
+            return
+        
+        paris_tz = ZoneInfo('Europe/Paris')
+        text = "⏰ **Tes rappels :**\n\n"
+        for reminder in reminders:
+            emoji = MODELS.get(reminder["model"], {}).get("emoji", "🌐")
+            text += f"{emoji} **{reminder['model']}** {reminder['run_hour']:02d}h — {reminder['lead_minutes']} min avant"
+            next_fire = reminder_service.next_fire(reminder["id"])
+            if next_fire:
+                text += f" _(prochain : {next_fire.astimezone(paris_tz).strftime('%d/%m %H:%M')})_"
+            text += "\n"
+        await update.message.reply_text(text, parse_mode="Markdown")
+        return
+    
+    if model is None or run_hour not in AVAILABLE_RUNS:
+        await update.message.reply_text(
+            f"❓ Précise un modèle ({', '.join(MODELS)}) et un run "
+            f"({', '.join(f'{r:02d}h' for r in AVAILABLE_RUNS)}).\n\n{RAPPEL_USAGE}"
+        )
+        return
+    
+    if delete:
+        reminder_id = await delete_reminder(chat_id, model, run_hour)
+        if reminder_id is None:
+            await update.message.reply_text(f"Aucun rappel pour {model} {run_hour:02d}h.")
+            return
+        reminder_service.remove(reminder_id)
+        await update.message.reply_text(f"🗑️ Rappel {model} {run_hour:02d}h supprimé.")
+        return
+    
+    lead = DEFAULT_LEAD_MINUTES if lead is None else lead
+    if not 1 <= lead <= MAX_LEAD_MINUTES:
+        await update.message.reply_text(f"⏱️ Avance entre 1 et {MAX_LEAD_MINUTES} minutes.")
+        return
+    
+    reminder = await upsert_reminder(chat_id, model, run_hour, lead)
+    if reminder is None:
+        await update.message.reply_text("Tu as déjà le nombre maximum de rappels. Supprimes-en un d'abord.")
+        return
+    await reminder_service.add(reminder)
+    
+    text = f"⏰ Rappel {model} {run_hour:02d}h programmé : {lead} min avant la sortie prévue."
+    next_fire = reminder_service.next_fire(reminder["id"])
+    if next_fire:
+        text += f"\nProchain rappel : {next_fire.astimezone(ZoneInfo('Europe/Paris')).strftime('%d/%m à %H:%M')} (Paris)"
+    await update.message.reply_text(text)
+
+
 async def lol_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Commande /lol - Affiche une blague aléatoire"""
     
@@ -666,10 +885,10 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ----- TOGGLE MODÈLE -----
     if data.startswith("toggle_model_"):
         model = data.replace("toggle_model_", "")
-        toggle_model_for_user(chat_id, model)
+        subscription = await toggle_model_for_user(chat_id, model)
         
         # Reconstruire le clavier avec le nouvel état
-        user_models = get_user_models(chat_id)
+        user_models = subscription["models"]
         keyboard = []
         
         for model_name, model_info in MODELS.items():
@@ -699,10 +918,10 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ----- TOGGLE RUN -----
     elif data.startswith("toggle_run_"):
         run_hour = int(data.replace("toggle_run_", ""))
-        toggle_run_for_user(chat_id, run_hour)
+        subscription = await toggle_run_for_user(chat_id, run_hour)
         
         # Reconstruire le clavier
-        user_runs = get_user_runs(chat_id)
+        user_runs = subscription["runs"]
         keyboard = build_horaires_keyboard(user_runs)
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -717,7 +936,7 @@ _(Par défaut : 06h et 12h uniquement)_"""
     
     # ----- TOUS LES RUNS -----
     elif data == "all_runs":
-        update_user_runs(chat_id, AVAILABLE_RUNS.copy())
+        await update_user_runs(chat_id, AVAILABLE_RUNS.copy())
         
         keyboard = build_horaires_keyboard(AVAILABLE_RUNS.copy())
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -733,7 +952,7 @@ _(Par défaut : 06h et 12h uniquement)_"""
     
     # ----- RUNS PAR DÉFAUT (JOUR) -----
     elif data == "default_runs":
-        update_user_runs(chat_id, DEFAULT_RUNS.copy())
+        await update_user_runs(chat_id, DEFAULT_RUNS.copy())
         
         keyboard = build_horaires_keyboard(DEFAULT_RUNS.copy())
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -749,12 +968,12 @@ _(Par défaut : 06h et 12h uniquement)_"""
     
     # ----- TERMINÉ MODÈLES -----
     elif data == "done_models":
-        models = get_user_models(chat_id)
+        models = await get_user_models(chat_id)
         
         # V1.2.2: Notification admin async (fire-and-forget)
         # Vérifier si c'est un nouvel user (0 modèles avant, 1+ après)
         if models:
-            user = get_user(chat_id)
+            user = await get_user(chat_id)
             username = user.get('username') if user else None
             models_str = ", ".join(models)
             
@@ -787,7 +1006,7 @@ _(Par défaut : 06h et 12h uniquement)_"""
     
     # ----- TERMINÉ HORAIRES -----
     elif data == "done_runs":
-        runs = get_user_runs(chat_id)
+        runs = await get_user_runs(chat_id)
         if runs:
             runs_str = ", ".join([f"{r:02d}h" for r in sorted(runs)])
             night_warning = ""
@@ -809,7 +1028,7 @@ _(Par défaut : 06h et 12h uniquement)_"""
     
     # ----- CONFIRMER STOP -----
     elif data == "confirm_stop":
-        deactivate_user(chat_id)
+        await deactivate_user(chat_id)
         await query.edit_message_text(
             "👋 Tu as été désabonné.\n\n"
             "Utilise /start pour te réabonner."
@@ -822,7 +1041,7 @@ _(Par défaut : 06h et 12h uniquement)_"""
     
     # ----- PROCHAINS : AFFICHER TOUT -----
     elif data == "prochains_all":
-        user = get_user(chat_id)
+        user = await get_user(chat_id)
         if not user:
             await query.answer("Tu dois être inscrit pour utiliser cette fonction.", show_alert=True)
             return
@@ -840,7 +1059,7 @@ _(Par défaut : 06h et 12h uniquement)_"""
             
             for run_hour in runs_to_check:
                 next_run_dt = calculate_next_run(now, run_hour)
-                result = get_eta_with_fallback(model, run_hour, next_run_dt)
+                result = await get_eta_with_fallback(model, run_hour, next_run_dt)
                 
                 if result[0] is None:
                     continue
@@ -860,15 +1079,39 @@ _(Par défaut : 06h et 12h uniquement)_"""
                 runs_by_model[model] = model_runs
         
         # Formatter et afficher avec bouton toggle
-        message = format_prochain_message(runs_by_model, True)
+        message = await format_prochain_message(runs_by_model, True)
         keyboard = [[InlineKeyboardButton("👤 Voir mes abonnements", callback_data="prochains_mine")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(message, parse_mode="Markdown", reply_markup=reply_markup)
     
+    # ----- HISTORIQUE : PAGE SUIVANTE / PRÉCÉDENTE -----
+    elif data.startswith("hist:"):
+        # hist:{model|*}:{heure|*}:{n|o}:{run_ts}:{id}
+        _, model, run_hour, direction, run_ts, row_id = data.split(":")
+        text, reply_markup = await build_historique_page(
+            None if model == "*" else model,
+            None if run_hour == "*" else int(run_hour),
+            (int(run_ts), int(row_id)),
+            newer=direction == "n",
+        )
+        await query.edit_message_text(text, parse_mode="Markdown", reply_markup=reply_markup)
+    
+    # ----- REGROUPEMENT -----
+    elif data.startswith("digest_"):
+        minutes = int(data.replace("digest_", ""))
+        if minutes not in DIGEST_CHOICES:
+            return
+        await set_user_digest(chat_id, minutes)
+        await query.edit_message_text(
+            REGROUPEMENT_TEXT,
+            reply_markup=build_regroupement_keyboard(minutes),
+            parse_mode="Markdown"
+        )
+    
     # ----- PROCHAINS : AFFICHER MES ABONNEMENTS -----
     elif data == "prochains_mine":
-        user = get_user(chat_id)
+        user = await get_user(chat_id)
         if not user:
             await query.answer("Tu dois être inscrit pour utiliser cette fonction.", show_alert=True)
             return
@@ -886,7 +1129,7 @@ _(Par défaut : 06h et 12h uniquement)_"""
             
             for run_hour in runs_to_check:
                 next_run_dt = calculate_next_run(now, run_hour)
-                result = get_eta_with_fallback(model, run_hour, next_run_dt)
+                result = await get_eta_with_fallback(model, run_hour, next_run_dt)
                 
                 if result[0] is None:
                     continue
@@ -906,7 +1149,7 @@ _(Par défaut : 06h et 12h uniquement)_"""
                 runs_by_model[model] = model_runs
         
         # Formatter et afficher avec bouton toggle
-        message = format_prochain_message(runs_by_model, False)
+        message = await format_prochain_message(runs_by_model, False)
         keyboard = [[InlineKeyboardButton("🌍 Voir tous les modèles", callback_data="prochains_all")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -962,11 +1205,20 @@ def main():
     # Initialiser la base de données
     init_database()
     
+    # Index mémoire des abonnements (remplissage de l'outbox sans requête sur subscriptions)
+    load_subscription_index()
+    
     # Pré-charger le cache des runs
     init_cache()
     
-    # Créer l'application
-    app = Application.builder().token(BOT_TOKEN).build()
+    # Créer l'application : un transport pour les envois, un pour le long-polling
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(build_request("bulk"))
+        .get_updates_request(build_request("polling"))
+        .build()
+    )
     
     # Ajouter les handlers de commandes
     app.add_handler(CommandHandler("start", start_command))
@@ -976,6 +1228,9 @@ def main():
     app.add_handler(CommandHandler("prochains", prochains_command))
     app.add_handler(CommandHandler("statut", statut_command))
     app.add_handler(CommandHandler("derniers", derniers_command))
+    app.add_handler(CommandHandler("historique", historique_command))
+    app.add_handler(CommandHandler("regroupement", regroupement_command))
+    app.add_handler(CommandHandler("rappel", rappel_command))
     app.add_handler(CommandHandler("lol", lol_command))
     app.add_handler(CommandHandler("arreter", arreter_command))
     
@@ -983,6 +1238,12 @@ def main():
     app.add_handler(CommandHandler("stats", admin_stats_command))
     app.add_handler(CommandHandler("testnotif", testnotif_command))
     app.add_handler(CommandHandler("forcecheck", forcecheck_command))
+    app.add_handler(CommandHandler("checkindex", checkindex_command))
+    app.add_handler(CommandHandler("rebuildstats", rebuildstats_command))
+    app.add_handler(CommandHandler("analyse", analyse_command))
+    app.add_handler(CommandHandler("export", export_command))
+    app.add_handler(CommandHandler("import", import_command))
+    app.add_handler(CommandHandler("dbstats", dbstats_command))
     
     # Handler pour les boutons
     app.add_handler(CallbackQueryHandler(button_callback))
@@ -994,7 +1255,7 @@ def main():
     # Lancer le bot
     print("🚀 Wind Bot démarré")
     logger.info("Wind Bot started")
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    app.run_polling(allowed_updates=Update.ALL_TYPES, timeout=long_poll_timeout())
 
 
 if __name__ == "__main__":
@@ -8,6 +8,7 @@ from datetime import datetime, timedelta, timezone
 from xml.etree import ElementTree as ET
 import requests
 
+import clock
 from config import AROME_API_KEY, ARPEGE_API_KEY
 
 logger = logging.getLogger(__name__)
@@ -15,6 +16,11 @@ logger = logging.getLogger(__name__)
 # Timeouts pour les requêtes HTTP
 REQUEST_TIMEOUT = 30
 
+# ECMWF : délai minimal (heures) avant de chercher un run sur le serveur
+# 00z/12z : ~9h (runs longs 360h)
+# 06z/18z : ~5h (runs courts 144h)
+ECMWF_MIN_DELAY_HOURS = {0: 9, 6: 5, 12: 9, 18: 5}
+
 # ============ CACHE MÉMOIRE ============
 # Cache des derniers runs connus pour éviter de spammer les APIs
 # Structure: {"MODEL": {"run": datetime, "updated_at": datetime}}
@@ -28,7 +34,7 @@ def get_cached_run(model: str) -> datetime | None:
         return None
     
     entry = _runs_cache[model]
-    age = datetime.now(timezone.utc) - entry["updated_at"]
+    age = clock.now() - entry["updated_at"]
     
     if age > CACHE_TTL:
         return None  # Cache expiré
@@ -40,7 +46,7 @@ def set_cached_run(model: str, run_datetime: datetime):
     """Stocke un run dans le cache."""
     _runs_cache[model] = {
         "run": run_datetime,
-        "updated_at": datetime.now(timezone.utc),
+        "updated_at": clock.now(),
     }
 
 
@@ -49,7 +55,7 @@ def get_all_cached_runs() -> dict[str, dict]:
     Retourne tous les runs en cache avec leur âge.
     Pour la commande /lastruns.
     """
-    now = datetime.now(timezone.utc)
+    now = clock.now()
     result = {}
     
     for model, entry in _runs_cache.items():
@@ -383,7 +389,7 @@ def get_latest_gfs_run(use_cache: bool = True) -> datetime | None:
             logger.debug("GFS: utilisation du cache")
             return cached
     
-    current_time = datetime.now(timezone.utc)
+    current_time = clock.now()
     run_hours = [0, 6, 12, 18]
     
     # Chercher le dernier run disponible
@@ -458,7 +464,7 @@ def get_latest_ecmwf_run(use_cache: bool = True) -> datetime | None:
             logger.debug("ECMWF: utilisation du cache")
             return cached
     
-    current_time = datetime.now(timezone.utc)
+    current_time = clock.now()
     run_hours = [0, 6, 12, 18]
     
     # ECMWF publie ~7-9h après le run
@@ -477,9 +483,7 @@ def get_latest_ecmwf_run(use_cache: bool = True) -> datetime | None:
                 continue
             
             # ECMWF dispo avec délais variables selon le run
-            # 00z/12z : ~9h (runs longs 360h)
-            # 06z/18z : ~5h (runs courts 144h)
-            delay_hours = 5 if run_hour in [6, 18] else 9
+            delay_hours = ECMWF_MIN_DELAY_HOURS[run_hour]
             expected_availability = run_time + timedelta(hours=delay_hours)
             if current_time < expected_availability:
                 continue
@@ -552,7 +556,7 @@ def get_all_latest_runs(force_refresh: bool = False) -> dict[str, datetime | Non
     models = ["AROME", "ARPEGE", "GFS", "ECMWF"]
     results = {}
     
-    current_time = datetime.now(timezone.utc)
+    current_time = clock.now()
     use_cache = not force_refresh
     
     for model in models:
@@ -0,0 +1,41 @@
+"""
+Horloge du bot
+Indirection sur l'heure courante et les attentes du scheduler, pour que
+le simulateur (simulator.py) puisse injecter une horloge virtuelle.
+"""
+import asyncio
+from datetime import datetime, timezone
+
+
+class SystemClock:
+    """Horloge réelle (UTC)."""
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+_clock = SystemClock()
+
+
+def now() -> datetime:
+    """Heure courante (UTC, timezone-aware)."""
+    return _clock.now()
+
+
+async def sleep(seconds: float):
+    """Attente asynchrone selon l'horloge courante."""
+    await _clock.sleep(seconds)
+
+
+def set_clock(clock):
+    """Remplace l'horloge (objet avec now() et sleep() async)."""
+    global _clock
+    _clock = clock
+
+
+def reset_clock():
+    """Revient à l'horloge réelle."""
+    set_clock(SystemClock())
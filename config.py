@@ -17,29 +17,62 @@ ARPEGE_API_KEY = os.environ.get("ARPEGE_API_KEY")
 ADMIN_CHAT_ID = int(os.environ.get("ADMIN_CHAT_ID", "0"))
 
 # Modèles météo disponibles
+# "bit" : position du modèle dans users.models_mask (ne jamais réattribuer un bit)
 MODELS = {
     "AROME": {
+        "bit": 0,
         "emoji": "⛵",
         "description": "Haute résolution France (1.3km)",
         "runs": [0, 3, 6, 12, 18],
     },
     "ARPEGE": {
+        "bit": 1,
         "emoji": "🌍",
         "description": "Europe/Monde (0.1°)",
         "runs": [0, 6, 12, 18],
     },
     "GFS": {
+        "bit": 2,
         "emoji": "🌎",
         "description": "Global NOAA (0.25°)",
         "runs": [0, 6, 12, 18],
     },
     "ECMWF": {
+        "bit": 3,
         "emoji": "🇪🇺",
         "description": "Centre Européen (0.25°)",
         "runs": [0, 6, 12, 18],
     },
 }
 
+# Délais fallback en minutes (ETA quand pas encore de stats : /prochains, rappels)
+FALLBACK_DELAYS = {
+    "AROME": {
+        0: 270,   # 4h30 → dispo ~04h30 Paris
+        6: 300,   # 5h00 → dispo ~11h00 Paris
+        12: 285,  # 4h45 → dispo ~16h45 Paris
+        18: 300,  # 5h00 → dispo ~23h00 Paris
+    },
+    "ARPEGE": {
+        0: 300,   # 5h00 → dispo ~05h00 Paris
+        6: 330,   # 5h30 → dispo ~11h30 Paris
+        12: 315,  # 5h15 → dispo ~17h15 Paris
+        18: 330,  # 5h30 → dispo ~23h30 Paris
+    },
+    "GFS": {
+        0: 270,   # 4h30 → dispo ~04h30 Paris
+        6: 300,   # 5h00 → dispo ~11h00 Paris
+        12: 285,  # 4h45 → dispo ~16h45 Paris
+        18: 300,  # 5h00 → dispo ~23h00 Paris
+    },
+    "ECMWF": {
+        0: 540,   # 9h00 → dispo ~09h00 Paris
+        6: 300,   # 5h00 → dispo ~11h00 Paris
+        12: 540,  # 9h00 → dispo ~21h00 Paris
+        18: 300,  # 5h00 → dispo ~23h00 Paris
+    }
+}
+
 # Runs disponibles pour abonnement
 AVAILABLE_RUNS = [0, 6, 12, 18]
 
@@ -48,3 +81,44 @@ AVAILABLE_RUNS = [0, 6, 12, 18]
 # 12h → notif vers 16h-17h
 # Pas de notification nocturne par défaut
 DEFAULT_RUNS = [6, 12]
+
+# Livraison des notifications
+# "inline"   : le worker de livraison tourne dans le process du bot
+# "external" : le worker tourne à part (python delivery.py)
+DELIVERY_MODE = os.environ.get("DELIVERY_MODE", "inline")
+
+# Délai (secondes) entre deux consultations de la file quand elle est vide
+DELIVERY_POLL_INTERVAL = int(os.environ.get("DELIVERY_POLL_INTERVAL", "10"))
+
+# Transport HTTP vers l'API Telegram : un profil par usage (voir transport.py)
+# "bulk"    : tous les appels du bot (notifications, réponses) — pool large,
+#             HTTP/2 (requêtes multiplexées sur quelques connexions)
+# "polling" : getUpdates en long-polling — une connexion dédiée, qui n'occupe
+#             jamais le pool des envois ; long_poll = durée d'attente côté Telegram (s)
+# Timeouts en secondes
+TELEGRAM_TRANSPORT = {
+    "bulk": {
+        "pool_size": int(os.environ.get("TELEGRAM_POOL_SIZE", "32")),
+        "http_version": os.environ.get("TELEGRAM_HTTP_VERSION", "2"),
+        "connect_timeout": 5.0,
+        "read_timeout": float(os.environ.get("TELEGRAM_READ_TIMEOUT", "10")),
+        "write_timeout": 10.0,
+        "pool_timeout": 5.0,
+    },
+    "polling": {
+        "pool_size": 1,
+        "http_version": "1.1",
+        "connect_timeout": 5.0,
+        "read_timeout": 10.0,      # en plus de long_poll (ajouté par la lib)
+        "write_timeout": 5.0,
+        "pool_timeout": 5.0,
+        "long_poll": int(os.environ.get("TELEGRAM_LONG_POLL", "30")),
+    },
+}
+
+# Fenêtres de regroupement proposées par /regroupement (minutes, 0 = désactivé) :
+# les runs détectés dans la fenêtre arrivent en un seul message
+DIGEST_CHOICES = [0, 15, 30, 60]
+
+# Appels à la base journalisés comme lents au-delà de ce délai (ms), voir db_metrics.py
+DB_SLOW_QUERY_MS = int(os.environ.get("DB_SLOW_QUERY_MS", "200"))
@@ -1,11 +1,22 @@
 """
 Gestion de la base de données SQLite
+Les accès passent par le gestionnaire de connexions partagé (db_connection.py)
 """
 import sqlite3
+import itertools
 import json
 import os
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
+from typing import Iterator
+
+import clock
+from config import MODELS, DEFAULT_RUNS
+from db_connection import ConnectionManager
+from db_metrics import instrumented
+from subscription_index import index as subscription_index, ALL_RUNS
 
 # Configuration du chemin de la base de données
 # Par défaut : répertoire courant
@@ -15,8 +26,36 @@ DATABASE_PATH = os.getenv("DB_PATH", "wind_bot.db")
 logger = logging.getLogger(__name__)
 
 
+_manager: ConnectionManager | None = None
+
+
+def get_manager() -> ConnectionManager:
+    """Retourne le gestionnaire de connexions (recréé si DATABASE_PATH a changé)"""
+    global _manager, _last_runs
+    if _manager is None or _manager.path != DATABASE_PATH:
+        if _manager is not None:
+            _manager.close()
+        _manager = ConnectionManager(DATABASE_PATH)
+        _last_runs = None  # Miroirs de l'ancienne base
+        subscription_index.clear()
+    return _manager
+
+
+def reader():
+    """Connexion de lecture du pool (context manager)"""
+    return get_manager().reader()
+
+
+def writer(transaction: bool = True):
+    """Connexion d'écriture, en transaction par défaut (context manager)"""
+    return get_manager().writer(transaction)
+
+
 def get_connection():
-    """Retourne une connexion à la base de données"""
+    """
+    Retourne une connexion indépendante à la base de données.
+    Réservé aux diagnostics ponctuels : préférer reader() / writer().
+    """
     conn = sqlite3.connect(DATABASE_PATH)
     conn.row_factory = sqlite3.Row
     return conn
@@ -60,23 +99,48 @@ def check_persistence():
         logger.info("📝 Database doesn't exist yet - will be created")
 
 
+@instrumented
 def init_database():
     """Initialise les tables si elles n'existent pas"""
     # Vérifier la persistence avant d'initialiser
     check_persistence()
     
-    conn = get_connection()
+    # Vacuum incrémental (rétention) : à activer avant la création des tables,
+    # une base existante doit être reconstruite une fois par VACUUM
+    with writer(transaction=False) as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            logger.info("🧹 auto_vacuum=INCREMENTAL activé")
     
-    # Table users
-    conn.execute("""
+    with writer() as conn:
+        fresh = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+        ).fetchone() is None
+        create_tables(conn)
+        migrate(conn, fresh)
+        create_indexes(conn)
+    
+    load_last_runs()
+    logger.info("✅ Database initialized")
+    
+    # Re-check après init pour voir le résultat
+    check_persistence()
+
+
+def create_tables(conn):
+    """Crée les tables manquantes (dates en secondes epoch, voir DATES)"""
+    # Table users (abonnements en masques de bits, voir MASQUES D'ABONNEMENT)
+    conn.execute(f"""
         CREATE TABLE IF NOT EXISTS users (
             chat_id INTEGER PRIMARY KEY,
             username TEXT,
-            models TEXT DEFAULT '[]',
-            runs TEXT DEFAULT '[6, 12]',
+            models_mask INTEGER NOT NULL DEFAULT 0,
+            runs_mask INTEGER NOT NULL DEFAULT {DEFAULT_RUNS_MASK},
             active INTEGER DEFAULT 1,
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            last_notification TEXT
+            last_notification TEXT,
+            digest_minutes INTEGER NOT NULL DEFAULT 0
         )
     """)
     
@@ -84,8 +148,8 @@ def init_database():
     conn.execute("""
         CREATE TABLE IF NOT EXISTS last_runs (
             model TEXT PRIMARY KEY,
-            run_datetime TEXT NOT NULL,
-            notified_at TEXT DEFAULT CURRENT_TIMESTAMP
+            run_ts INTEGER NOT NULL,
+            notified_ts INTEGER
         )
     """)
     
@@ -95,64 +159,506 @@ def init_database():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             model TEXT NOT NULL,
             run_hour INTEGER NOT NULL,
-            run_date TEXT NOT NULL,
-            detected_at TEXT NOT NULL,
+            run_ts INTEGER NOT NULL,
+            detected_ts INTEGER NOT NULL,
             delay_minutes INTEGER NOT NULL,
-            CONSTRAINT unique_detection UNIQUE(model, run_date, run_hour)
+            CONSTRAINT unique_detection UNIQUE(model, run_ts)
+        )
+    """)
+    
+    # Table subscriptions : index dénormalisé (modèle, run) → chat_id des users actifs
+    # Source de vérité : masques models_mask/runs_mask de users (run_hour = ALL_RUNS si runs vide)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            chat_id INTEGER NOT NULL,
+            model TEXT NOT NULL,
+            run_hour INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, model, run_hour)
+        ) WITHOUT ROWID
+    """)
+    
+    # Table run_availability_daily : agrégats journaliers des logs anciens (rétention)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_availability_daily (
+            model TEXT NOT NULL,
+            run_hour INTEGER NOT NULL,
+            day_ts INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            delay_sum INTEGER NOT NULL,
+            delay_sumsq INTEGER NOT NULL DEFAULT 0,
+            delay_min INTEGER NOT NULL,
+            delay_max INTEGER NOT NULL,
+            PRIMARY KEY (model, run_hour, day_ts)
+        ) WITHOUT ROWID
+    """)
+    
+    # Table delay_stats : agrégats des délais par (model, run_hour), tenus à jour
+    # à chaque log (voir STATS DES DÉLAIS). Totaux sur tout l'historique conservé
+    # (logs bruts + agrégats journaliers, soit DAILY_ROLLUP_RETENTION_DAYS jours)
+    # et fenêtre glissante de STATS_WINDOW_DAYS jours (win_*)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS delay_stats (
+            model TEXT NOT NULL,
+            run_hour INTEGER NOT NULL,
+            samples INTEGER NOT NULL DEFAULT 0,
+            delay_sum INTEGER NOT NULL DEFAULT 0,
+            delay_sumsq INTEGER NOT NULL DEFAULT 0,
+            delay_min INTEGER,
+            delay_max INTEGER,
+            last_delay INTEGER,
+            last_run_ts INTEGER,
+            window_start_ts INTEGER,
+            win_samples INTEGER NOT NULL DEFAULT 0,
+            win_sum INTEGER NOT NULL DEFAULT 0,
+            win_sumsq INTEGER NOT NULL DEFAULT 0,
+            win_min INTEGER,
+            win_max INTEGER,
+            PRIMARY KEY (model, run_hour)
+        ) WITHOUT ROWID
+    """)
+    
+    # Table run_events : file durable détection → livraison
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model TEXT NOT NULL,
+            run_ts INTEGER NOT NULL,
+            detected_ts INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_ts INTEGER,
+            done_ts INTEGER,
+            next_attempt_ts INTEGER,
+            sent_count INTEGER,
+            failed_count INTEGER,
+            CONSTRAINT unique_event UNIQUE(model, run_ts)
+        )
+    """)
+    
+    # Table reminders : rappels "N minutes avant l'ETA d'un run" (voir reminders.py)
+    # last_run_ts = dernier run rappelé (pas de double rappel après redémarrage)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            model TEXT NOT NULL,
+            run_hour INTEGER NOT NULL,
+            lead_minutes INTEGER NOT NULL,
+            last_run_ts INTEGER NOT NULL DEFAULT 0,
+            UNIQUE(chat_id, model, run_hour)
         )
     """)
     
-    # Index
+    # Table notification_outbox : un envoi par (événement, chat), registre idempotent
+    # status : pending → sent | failed ; lease_until_ts = bail du worker qui l'envoie
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY,
+            event_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_ts INTEGER NOT NULL DEFAULT 0,
+            lease_until_ts INTEGER NOT NULL DEFAULT 0,
+            sent_ts INTEGER,
+            last_error TEXT,
+            UNIQUE(event_id, chat_id)
+        )
+    """)
+
+
+def create_indexes(conn):
+    """Crée les index manquants (après les migrations : ils portent sur le schéma courant)"""
     conn.execute("CREATE INDEX IF NOT EXISTS idx_users_active ON users(active)")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_log_stats ON run_availability_log(model, run_hour, run_date DESC)")
+    # Couvrant pour les stats : fenêtre, dernier délai, reconstruction de delay_stats
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_log_stats "
+        "ON run_availability_log(model, run_hour, run_ts, delay_minutes)"
+    )
+    # Couvrant pour la sélection des lots de rétention (id = rowid)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_log_run_ts ON run_availability_log(run_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_run_events_status ON run_events(status, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_fanout ON subscriptions(model, run_hour, chat_id)")
+    # Envois restant à faire : seules les lignes pending sont indexées
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_pending "
+        "ON notification_outbox(event_id, next_attempt_ts, id) WHERE status = 'pending'"
+    )
+    # Envois en attente d'un même chat (regroupement en digest)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_chat_pending "
+        "ON notification_outbox(chat_id) WHERE status = 'pending'"
+    )
+
+
+# ============ MASQUES D'ABONNEMENT ============
+# users.models_mask : un bit par modèle (MODELS[model]["bit"])
+# users.runs_mask : bit n = run de n h UTC ; 0 = tous les runs
+
+def model_bit(model: str) -> int:
+    """Bit d'un modèle dans models_mask"""
+    if model not in MODELS:
+        raise ValueError(f"Modèle inconnu : {model}")
+    return 1 << MODELS[model]["bit"]
+
+
+def run_bit(run_hour: int) -> int:
+    """Bit d'une heure de run dans runs_mask"""
+    if not 0 <= run_hour < 24:
+        raise ValueError(f"Heure de run invalide : {run_hour}")
+    return 1 << run_hour
+
+
+def models_to_mask(models) -> int:
+    """Encode une liste de modèles en masque (modèles inconnus ignorés)"""
+    mask = 0
+    for model in models:
+        if model in MODELS:
+            mask |= model_bit(model)
+    return mask
+
+
+def mask_to_models(mask: int) -> list[str]:
+    """Décode un masque de modèles (dans l'ordre de config.MODELS)"""
+    return [model for model in MODELS if mask & model_bit(model)]
+
+
+def runs_to_mask(runs) -> int:
+    """Encode une liste d'heures de run en masque"""
+    mask = 0
+    for run_hour in runs:
+        mask |= run_bit(run_hour)
+    return mask
+
+
+def mask_to_runs(mask: int) -> list[int]:
+    """Décode un masque de runs (heures croissantes)"""
+    return [run_hour for run_hour in range(24) if mask & (1 << run_hour)]
+
+
+DEFAULT_RUNS_MASK = runs_to_mask(DEFAULT_RUNS)
+
+
+# ============ DATES ============
+# Les dates des tables last_runs, run_availability_log, run_availability_daily,
+# delay_stats, run_events, notification_outbox et reminders sont stockées en
+# secondes epoch UTC (colonnes *_ts) :
+# filtres par intervalle = comparaisons d'entiers, pas de parsing à la lecture
+
+DAY_SECONDS = 86400
+
+
+def to_epoch(dt: datetime) -> int:
+    """Datetime (naïf = UTC) → secondes epoch"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def from_epoch(ts: int) -> datetime:
+    """Secondes epoch → datetime UTC"""
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+def day_epoch(ts: int) -> int:
+    """Début (00h UTC) du jour contenant ts"""
+    return ts - ts % DAY_SECONDS
+
+
+def days_ago_epoch(days: int) -> int:
+    """Début du jour UTC d'il y a `days` jours"""
+    return day_epoch(to_epoch(clock.now() - timedelta(days=days)))
+
+
+# ============ MIGRATIONS ============
+
+def _migrate_1_subscriptions(conn):
+    """Remplit subscriptions depuis les colonnes JSON models/runs des users actifs"""
+    rows = conn.execute("SELECT chat_id, models, runs FROM users WHERE active = 1").fetchall()
+    for row in rows:
+        runs = json.loads(row["runs"] or "[]") or [ALL_RUNS]
+        conn.executemany(
+            "INSERT OR IGNORE INTO subscriptions (chat_id, model, run_hour) VALUES (?, ?, ?)",
+            [(row["chat_id"], model, run_hour)
+             for model in json.loads(row["models"] or "[]") for run_hour in runs]
+        )
+    logger.info(f"🔧 Migration subscriptions : {len(rows)} utilisateurs indexés")
+
+
+def _migrate_2_masks(conn):
+    """Remplace les colonnes JSON models/runs de users par models_mask/runs_mask"""
+    conn.execute("ALTER TABLE users ADD COLUMN models_mask INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        f"ALTER TABLE users ADD COLUMN runs_mask INTEGER NOT NULL DEFAULT {DEFAULT_RUNS_MASK}"
+    )
     
-    conn.commit()
-    conn.close()
+    rows = conn.execute("SELECT chat_id, models, runs FROM users").fetchall()
+    conn.executemany(
+        "UPDATE users SET models_mask = ?, runs_mask = ? WHERE chat_id = ?",
+        [
+            (
+                models_to_mask(json.loads(row["models"] or "[]")),
+                runs_to_mask(r for r in json.loads(row["runs"] or "[]") if 0 <= r < 24),
+                row["chat_id"],
+            )
+            for row in rows
+        ]
+    )
     
-    logger.info("✅ Database initialized")
+    conn.execute("ALTER TABLE users DROP COLUMN models")
+    conn.execute("ALTER TABLE users DROP COLUMN runs")
     
-    # Re-check après init pour voir le résultat
-    check_persistence()
+    # Les modèles inconnus de config.MODELS ont disparu des masques
+    for row in rows:
+        sync_subscriptions(conn, row["chat_id"])
+    logger.info(f"🔧 Migration masques : {len(rows)} utilisateurs convertis")
+
+
+def _columns(conn, table: str) -> set[str]:
+    """Colonnes actuelles d'une table"""
+    return {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _migrate_3_delay_stats(conn):
+    """
+    Ajoute la somme des carrés aux agrégats journaliers
+    (delay_stats est construite par la migration 4, sur le schéma epoch).
+    """
+    # Table créée à l'instant par create_tables : déjà au schéma courant
+    if "delay_sumsq" in _columns(conn, "run_availability_daily"):
+        return
+    conn.execute(
+        "ALTER TABLE run_availability_daily ADD COLUMN delay_sumsq INTEGER NOT NULL DEFAULT 0"
+    )
+    # Agrégats existants : dispersion intra-journée inconnue, on la suppose nulle
+    conn.execute("UPDATE run_availability_daily SET delay_sumsq = delay_sum * delay_sum / samples")
+
+
+# Conversion des tables temporelles : {table: (colonne ISO d'origine, copie vers le schéma epoch)}
+# strftime('%s') comprend les formats ISO écrits jusqu'ici (avec ou sans offset)
+_EPOCH_CONVERSIONS = {
+    "last_runs": ("run_datetime", """
+        INSERT INTO last_runs (model, run_ts, notified_ts)
+        SELECT model, CAST(strftime('%s', run_datetime) AS INTEGER),
+               CAST(strftime('%s', notified_at) AS INTEGER)
+        FROM last_runs_iso
+    """),
+    "run_availability_log": ("run_date", """
+        INSERT INTO run_availability_log (id, model, run_hour, run_ts, detected_ts, delay_minutes)
+        SELECT id, model, run_hour,
+               CAST(strftime('%s', run_date) AS INTEGER) + run_hour * 3600,
+               CAST(strftime('%s', detected_at) AS INTEGER), delay_minutes
+        FROM run_availability_log_iso
+    """),
+    "run_availability_daily": ("day", """
+        INSERT INTO run_availability_daily
+            (model, run_hour, day_ts, samples, delay_sum, delay_sumsq, delay_min, delay_max)
+        SELECT model, run_hour, CAST(strftime('%s', day) AS INTEGER),
+               samples, delay_sum, delay_sumsq, delay_min, delay_max
+        FROM run_availability_daily_iso
+    """),
+    # Recalculée depuis les logs ci-dessous
+    "delay_stats": ("window_start", None),
+}
+
+
+def _convert_to_epoch(conn, table: str, iso_column: str, copy_sql: str | None):
+    """Recrée une table au schéma epoch et y recopie ses lignes (voir _EPOCH_CONVERSIONS)"""
+    # Table créée à l'instant par create_tables : déjà au schéma courant
+    if iso_column not in _columns(conn, table):
+        return
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_iso")
+    create_tables(conn)
+    if copy_sql:
+        conn.execute(copy_sql)
+    # Les index de l'ancienne table disparaissent avec elle (recréés par create_indexes)
+    conn.execute(f"DROP TABLE {table}_iso")
+
+
+def _migrate_4_epoch(conn):
+    """Convertit les dates ISO (TEXT) des tables temporelles en secondes epoch (INTEGER)"""
+    for table, (iso_column, copy_sql) in _EPOCH_CONVERSIONS.items():
+        _convert_to_epoch(conn, table, iso_column, copy_sql)
+    
+    _rebuild_delay_stats(conn)
+    logger.info("🔧 Migration dates epoch effectuée")
+
+
+def _migrate_5_digest(conn):
+    """Ajoute la fenêtre de regroupement des users et le report des événements"""
+    # Tables créées à l'instant par create_tables : déjà au schéma courant
+    # (run_events au schéma epoch de la migration 7 : next_attempt_ts)
+    if "digest_minutes" not in _columns(conn, "users"):
+        conn.execute("ALTER TABLE users ADD COLUMN digest_minutes INTEGER NOT NULL DEFAULT 0")
+    run_events_columns = _columns(conn, "run_events")
+    if "run_datetime" in run_events_columns and "next_attempt_at" not in run_events_columns:
+        conn.execute("ALTER TABLE run_events ADD COLUMN next_attempt_at TEXT")
+
+
+def _migrate_6_outbox_lease(conn):
+    """Ajoute le bail par envoi de l'outbox (plusieurs workers de livraison)"""
+    if "lease_until_ts" not in _columns(conn, "notification_outbox"):
+        conn.execute(
+            "ALTER TABLE notification_outbox ADD COLUMN lease_until_ts INTEGER NOT NULL DEFAULT 0"
+        )
+
+
+def _migrate_7_run_events_epoch(conn):
+    """Convertit les dates ISO de la file run_events en secondes epoch (comme la migration 4)"""
+    _convert_to_epoch(conn, "run_events", "run_datetime", """
+        INSERT INTO run_events (
+            id, model, run_ts, detected_ts, status, attempts,
+            claimed_ts, done_ts, next_attempt_ts, sent_count, failed_count
+        )
+        SELECT id, model, CAST(strftime('%s', run_datetime) AS INTEGER),
+               CAST(strftime('%s', detected_at) AS INTEGER), status, attempts,
+               CAST(strftime('%s', claimed_at) AS INTEGER), CAST(strftime('%s', done_at) AS INTEGER),
+               CAST(strftime('%s', next_attempt_at) AS INTEGER), sent_count, failed_count
+        FROM run_events_iso
+    """)
+
+
+# {version: fonction(conn)} appliquées dans l'ordre au-delà de PRAGMA user_version
+MIGRATIONS = {
+    1: _migrate_1_subscriptions,
+    2: _migrate_2_masks,
+    3: _migrate_3_delay_stats,
+    4: _migrate_4_epoch,
+    5: _migrate_5_digest,
+    6: _migrate_6_outbox_lease,
+    7: _migrate_7_run_events_epoch,
+}
+
+
+def migrate(conn, fresh: bool = False):
+    """
+    Applique les migrations manquantes (dans la transaction de init_database).
+    Une base créée à l'instant (fresh) a déjà le schéma courant.
+    """
+    if fresh:
+        conn.execute(f"PRAGMA user_version = {max(MIGRATIONS)}")
+        return
+    
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version in sorted(MIGRATIONS):
+        if version > current:
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            logger.info(f"🔧 Schéma migré en version {version}")
 
 
 # ============ USERS ============
 
+def sync_subscriptions(conn, chat_id: int, row=None):
+    """
+    Recalcule les lignes subscriptions d'un utilisateur depuis users,
+    dans la transaction d'écriture en cours.
+    
+    Args:
+        row: (models_mask, runs_mask, active) déjà lus, sinon relus en base
+    
+    Returns:
+        Les clés (model, run_hour) écrites, à reporter dans l'index mémoire
+        une fois la transaction validée (voir _index_user)
+    """
+    conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
+    
+    if row is None:
+        row = conn.execute(
+            "SELECT models_mask, runs_mask, active FROM users WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+    if row is None or not row["active"]:
+        return set()
+    
+    # Masque runs vide = tous les runs
+    runs = mask_to_runs(row["runs_mask"]) or [ALL_RUNS]
+    keys = {(model, run_hour) for model in mask_to_models(row["models_mask"]) for run_hour in runs}
+    conn.executemany(
+        "INSERT INTO subscriptions (chat_id, model, run_hour) VALUES (?, ?, ?)",
+        [(chat_id, model, run_hour) for model, run_hour in keys]
+    )
+    return keys
+
+
+def _index_user(chat_id: int, keys: set):
+    """Reporte un changement d'abonnements validé dans l'index mémoire"""
+    if subscription_index.loaded:
+        subscription_index.replace_user(chat_id, keys)
+
+
+@instrumented
+def load_subscription_index():
+    """
+    Construit l'index mémoire des abonnements depuis la table subscriptions.
+    
+    À n'appeler que dans le process qui fait toutes les écritures users (le bot) :
+    un autre process (worker de livraison externe) garde la requête SQL.
+    """
+    with reader() as conn:
+        rows = conn.execute("SELECT chat_id, model, run_hour FROM subscriptions").fetchall()
+    subscription_index.load(tuple(row) for row in rows)
+    logger.info(f"🗂️ Index abonnements chargé : {subscription_index.stats()}")
+
+
+@instrumented
+def check_subscription_index() -> dict:
+    """
+    Compare l'index mémoire à la table subscriptions.
+    
+    Returns:
+        {'loaded': bool, 'missing': [...], 'extra': [...], **stats}
+        missing = lignes en base absentes de l'index, extra = l'inverse
+    """
+    with reader() as conn:
+        db_rows = {
+            tuple(row) for row in
+            conn.execute("SELECT chat_id, model, run_hour FROM subscriptions").fetchall()
+        }
+    index_rows = subscription_index.rows()
+    
+    return {
+        "loaded": subscription_index.loaded,
+        "missing": sorted(db_rows - index_rows),
+        "extra": sorted(index_rows - db_rows),
+        **subscription_index.stats(),
+    }
+
+
+@instrumented
 def get_user(chat_id: int) -> dict | None:
     """Récupère un utilisateur par son chat_id"""
-    conn = get_connection()
-    cursor = conn.execute("SELECT * FROM users WHERE chat_id = ?", (chat_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with reader() as conn:
+        row = conn.execute("SELECT * FROM users WHERE chat_id = ?", (chat_id,)).fetchone()
     
     if row:
         return {
             "chat_id": row["chat_id"],
             "username": row["username"],
-            "models": json.loads(row["models"]),
-            "runs": json.loads(row["runs"]),
+            "models": mask_to_models(row["models_mask"]),
+            "runs": mask_to_runs(row["runs_mask"]),
             "active": bool(row["active"]),
             "created_at": row["created_at"],
             "last_notification": row["last_notification"],
+            "digest_minutes": row["digest_minutes"],
         }
     return None
 
 
+@instrumented
 def create_user(chat_id: int, username: str = None) -> dict:
     """Crée un nouvel utilisateur"""
-    from config import DEFAULT_RUNS  # Import local pour éviter circular import
-    
-    conn = get_connection()
-    
     # Insérer avec runs par défaut explicites (double sécurité)
-    conn.execute(
-        "INSERT OR IGNORE INTO users (chat_id, username, runs) VALUES (?, ?, ?)",
-        (chat_id, username, json.dumps(DEFAULT_RUNS))
-    )
-    conn.commit()
-    conn.close()
+    with writer() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO users (chat_id, username, runs_mask) VALUES (?, ?, ?)",
+            (chat_id, username, DEFAULT_RUNS_MASK)
+        )
+        keys = sync_subscriptions(conn, chat_id)
+    _index_user(chat_id, keys)
     return get_user(chat_id)
 
 
+@instrumented
 def get_or_create_user(chat_id: int, username: str = None) -> dict:
     """Récupère ou crée un utilisateur"""
     user = get_user(chat_id)
@@ -161,196 +667,773 @@ def get_or_create_user(chat_id: int, username: str = None) -> dict:
     return create_user(chat_id, username)
 
 
+@instrumented
 def update_user_models(chat_id: int, models: list):
     """Met à jour les modèles d'un utilisateur"""
-    conn = get_connection()
-    conn.execute(
-        "UPDATE users SET models = ? WHERE chat_id = ?",
-        (json.dumps(models), chat_id)
-    )
-    conn.commit()
-    conn.close()
+    with writer() as conn:
+        conn.execute(
+            "UPDATE users SET models_mask = ? WHERE chat_id = ?",
+            (models_to_mask(models), chat_id)
+        )
+        keys = sync_subscriptions(conn, chat_id)
+    _index_user(chat_id, keys)
 
 
+@instrumented
 def update_user_runs(chat_id: int, runs: list):
     """Met à jour les runs d'un utilisateur"""
-    conn = get_connection()
-    conn.execute(
-        "UPDATE users SET runs = ? WHERE chat_id = ?",
-        (json.dumps(runs), chat_id)
-    )
-    conn.commit()
-    conn.close()
+    with writer() as conn:
+        conn.execute(
+            "UPDATE users SET runs_mask = ? WHERE chat_id = ?",
+            (runs_to_mask(runs), chat_id)
+        )
+        keys = sync_subscriptions(conn, chat_id)
+    _index_user(chat_id, keys)
 
 
+@instrumented
 def get_user_models(chat_id: int) -> list:
     """Récupère les modèles d'un utilisateur"""
     user = get_user(chat_id)
     return user["models"] if user else []
 
 
+@instrumented
 def get_user_runs(chat_id: int) -> list:
     """Récupère les runs d'un utilisateur"""
     user = get_user(chat_id)
     return user["runs"] if user else []
 
 
-def toggle_model_for_user(chat_id: int, model: str) -> bool:
-    """Active/désactive un modèle pour un utilisateur. Retourne le nouvel état."""
-    # S'assurer que l'utilisateur existe
-    get_or_create_user(chat_id)
+def _toggle_bit(chat_id: int, column: str, bit: int, initial_mask: int) -> dict:
+    """
+    Inverse un bit de models_mask/runs_mask en une seule requête
+    (création de l'utilisateur si besoin + bascule + relecture).
     
-    models = get_user_models(chat_id)
+    Args:
+        initial_mask: valeur de la colonne pour un utilisateur créé par ce clic
     
-    if model in models:
-        models.remove(model)
-        enabled = False
-    else:
-        models.append(model)
-        enabled = True
+    Returns:
+        {'enabled': nouvel état du bit, 'models': [...], 'runs': [...], 'active': bool}
+    """
+    initial = {"models_mask": 0, "runs_mask": DEFAULT_RUNS_MASK}
+    initial[column] = initial_mask
     
-    update_user_models(chat_id, models)
-    return enabled
+    with writer() as conn:
+        # XOR (absent de SQLite) : (m | bit) - (m & bit)
+        row = conn.execute(
+            f"""
+            INSERT INTO users (chat_id, models_mask, runs_mask)
+            VALUES (:chat_id, :models_mask, :runs_mask)
+            ON CONFLICT(chat_id) DO UPDATE SET {column} = ({column} | :bit) - ({column} & :bit)
+            RETURNING models_mask, runs_mask, active
+            """,
+            {"chat_id": chat_id, "bit": bit, **initial}
+        ).fetchone()
+        keys = sync_subscriptions(conn, chat_id, row)
+    _index_user(chat_id, keys)
+    
+    return {
+        "enabled": bool(row[column] & bit),
+        "models": mask_to_models(row["models_mask"]),
+        "runs": mask_to_runs(row["runs_mask"]),
+        "active": bool(row["active"]),
+    }
 
 
-def toggle_run_for_user(chat_id: int, run_hour: int) -> bool:
-    """Active/désactive un run pour un utilisateur. Retourne le nouvel état."""
-    # S'assurer que l'utilisateur existe
-    get_or_create_user(chat_id)
-    
-    runs = get_user_runs(chat_id)
-    
-    if run_hour in runs:
-        runs.remove(run_hour)
-        enabled = False
-    else:
-        runs.append(run_hour)
-        enabled = True
-    
-    update_user_runs(chat_id, runs)
-    return enabled
+@instrumented
+def toggle_model_for_user(chat_id: int, model: str) -> dict:
+    """
+    Active/désactive un modèle pour un utilisateur.
+    Retourne le nouvel état et les abonnements à jour (voir _toggle_bit).
+    """
+    bit = model_bit(model)
+    return _toggle_bit(chat_id, "models_mask", bit, initial_mask=bit)
 
 
+@instrumented
+def toggle_run_for_user(chat_id: int, run_hour: int) -> dict:
+    """
+    Active/désactive un run pour un utilisateur.
+    Retourne le nouvel état et les abonnements à jour (voir _toggle_bit).
+    """
+    bit = run_bit(run_hour)
+    return _toggle_bit(chat_id, "runs_mask", bit, initial_mask=DEFAULT_RUNS_MASK ^ bit)
+
+
+@instrumented
+def set_user_digest(chat_id: int, minutes: int):
+    """
+    Fenêtre de regroupement des notifications d'un utilisateur :
+    les runs détectés dans les `minutes` suivant une détection sont envoyés
+    en un seul message (0 = une notification par run).
+    """
+    with writer() as conn:
+        conn.execute(
+            "UPDATE users SET digest_minutes = ? WHERE chat_id = ?",
+            (max(0, minutes), chat_id)
+        )
+
+
+@instrumented
 def deactivate_user(chat_id: int):
     """Désactive un utilisateur"""
-    conn = get_connection()
-    conn.execute("UPDATE users SET active = 0 WHERE chat_id = ?", (chat_id,))
-    conn.commit()
-    conn.close()
+    with writer() as conn:
+        conn.execute("UPDATE users SET active = 0 WHERE chat_id = ?", (chat_id,))
+        keys = sync_subscriptions(conn, chat_id)
+    _index_user(chat_id, keys)
+
+
+# chat_ids par requête de deactivate_users (limite de paramètres SQLite)
+DEACTIVATE_BATCH_SIZE = 500
+
+
+@instrumented
+def deactivate_users(chat_ids: list[int]) -> int:
+    """
+    Désactive en lot des chats injoignables (bot bloqué, compte supprimé...) :
+    abonnements retirés et envois encore pending passés en échec, pour que
+    les prochains fan-outs ne les contiennent plus. /start les réactive.
+    
+    Returns:
+        Nombre d'utilisateurs désactivés (hors déjà inactifs)
+    """
+    chat_ids = list(dict.fromkeys(chat_ids))
+    deactivated = 0
+    
+    with writer() as conn:
+        for i in range(0, len(chat_ids), DEACTIVATE_BATCH_SIZE):
+            batch = chat_ids[i:i + DEACTIVATE_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            deactivated += conn.execute(
+                f"UPDATE users SET active = 0 WHERE active = 1 AND chat_id IN ({placeholders})", batch
+            ).rowcount
+            conn.execute(f"DELETE FROM subscriptions WHERE chat_id IN ({placeholders})", batch)
+            conn.execute(f"""
+                UPDATE notification_outbox SET status = 'failed', last_error = 'chat injoignable'
+                WHERE status = 'pending' AND chat_id IN ({placeholders})
+            """, batch)
+    
+    for chat_id in chat_ids:
+        _index_user(chat_id, set())
+    return deactivated
 
 
+@instrumented
 def reactivate_user(chat_id: int):
     """Réactive un utilisateur"""
-    conn = get_connection()
-    conn.execute("UPDATE users SET active = 1 WHERE chat_id = ?", (chat_id,))
-    conn.commit()
-    conn.close()
+    with writer() as conn:
+        conn.execute("UPDATE users SET active = 1 WHERE chat_id = ?", (chat_id,))
+        keys = sync_subscriptions(conn, chat_id)
+    _index_user(chat_id, keys)
 
 
-def get_active_users() -> list:
-    """Récupère tous les utilisateurs actifs"""
-    conn = get_connection()
-    cursor = conn.execute("SELECT * FROM users WHERE active = 1")
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return [
-        {
-            "chat_id": row["chat_id"],
-            "username": row["username"],
-            "models": json.loads(row["models"]),
-            "runs": json.loads(row["runs"]),
-        }
-        for row in rows
-    ]
+@instrumented
+def migrate_chat(old_chat_id: int, new_chat_id: int) -> bool:
+    """
+    Groupe converti en supergroupe (ChatMigrated) : l'utilisateur, ses
+    abonnements, ses rappels et ses envois pending passent au nouveau chat_id.
+    Si le supergroupe est déjà inscrit (/start), ses réglages sont conservés
+    et l'ancien chat est désactivé.
 
+    Returns:
+        True si l'utilisateur a été déplacé, False s'il a été fusionné ou est inconnu
+    """
+    with writer() as conn:
+        merged = conn.execute("SELECT 1 FROM users WHERE chat_id = ?", (new_chat_id,)).fetchone()
+        moved = False
+        keys = set()
+        if merged:
+            conn.execute("UPDATE users SET active = 0 WHERE chat_id = ?", (old_chat_id,))
+        else:
+            moved = conn.execute(
+                "UPDATE users SET chat_id = ? WHERE chat_id = ?", (new_chat_id, old_chat_id)
+            ).rowcount > 0
 
-def get_subscribed_users(model: str, run_hour: int) -> list[int]:
-    """Récupère les chat_ids des utilisateurs abonnés à un modèle/run"""
-    users = get_active_users()
-    subscribed = []
+        conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (old_chat_id,))
+        if moved:
+            keys = sync_subscriptions(conn, new_chat_id)
+
+        # En cas de fusion, les rappels et envois déjà présents côté supergroupe priment
+        conn.execute(
+            "UPDATE OR IGNORE reminders SET chat_id = ? WHERE chat_id = ?", (new_chat_id, old_chat_id)
+        )
+        conn.execute("DELETE FROM reminders WHERE chat_id = ?", (old_chat_id,))
+        conn.execute("""
+            UPDATE OR IGNORE notification_outbox SET chat_id = ?
+            WHERE chat_id = ? AND status = 'pending'
+        """, (new_chat_id, old_chat_id))
+        conn.execute("""
+            UPDATE notification_outbox SET status = 'failed', last_error = 'chat migré'
+            WHERE chat_id = ? AND status = 'pending'
+        """, (old_chat_id,))
+
+    _index_user(old_chat_id, set())
+    if moved:
+        _index_user(new_chat_id, keys)
+    logger.info(f"🔀 Chat {old_chat_id} migré vers {new_chat_id} ({'déplacé' if moved else 'fusionné'})")
+    return moved
+
+
+# Taille des lots lus par fetchmany dans les parcours en flux
+STREAM_CHUNK_SIZE = 1000
+
+
+def _stream(sql: str, params=(), chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Exécute une requête et en produit les lignes par lots de chunk_size,
+    en tuples simples (pas de sqlite3.Row).
     
-    for user in users:
-        # Vérifie abonnement au modèle
-        if model not in user["models"]:
-            continue
-        
-        # Vérifie abonnement au run (liste vide = tous les runs)
-        if user["runs"] and run_hour not in user["runs"]:
-            continue
-        
-        subscribed.append(user["chat_id"])
+    La connexion de lecture reste empruntée jusqu'à épuisement
+    ou fermeture (close()) du générateur.
+    """
+    with reader() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, params)
+        try:
+            while rows := cursor.fetchmany(chunk_size):
+                yield from rows
+        finally:
+            cursor.close()
+
+
+@instrumented
+def iter_subscribed_chat_ids(model: str, run_hour: int,
+                             chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[int]:
+    """Parcourt les chat_ids des utilisateurs abonnés à un modèle/run"""
+    # Index mémoire si chargé (process du bot) : tuple déjà en mémoire
+    if subscription_index.loaded:
+        yield from subscription_index.lookup(model, run_hour)
+        return
     
-    return subscribed
+    # Index SQL (model, run_hour, chat_id) : ne lit que les abonnés concernés
+    # (run_hour = ALL_RUNS pour les users sans filtre de runs)
+    for (chat_id,) in _stream(
+        "SELECT chat_id FROM subscriptions WHERE model = ? AND run_hour IN (?, ?)",
+        (model, run_hour, ALL_RUNS),
+        chunk_size
+    ):
+        yield chat_id
 
 
+@instrumented
 def count_active_users() -> int:
     """Compte le nombre d'utilisateurs actifs"""
-    conn = get_connection()
-    cursor = conn.execute("SELECT COUNT(*) FROM users WHERE active = 1")
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count
+    with reader() as conn:
+        return conn.execute("SELECT COUNT(*) FROM users WHERE active = 1").fetchone()[0]
+
+
+@instrumented
+def count_subscribers_by_model() -> dict[str, int]:
+    """Compte les utilisateurs actifs abonnés à chaque modèle (filtre par masque dans SQLite)"""
+    with reader() as conn:
+        return {
+            model: conn.execute(
+                "SELECT COUNT(*) FROM users WHERE active = 1 AND models_mask & ? != 0",
+                (model_bit(model),)
+            ).fetchone()[0]
+            for model in MODELS
+        }
 
 
 # ============ LAST RUNS ============
+# Miroir mémoire de last_runs {model: run_ts}, chargé au démarrage : les
+# vérifications du scheduler (is_new_run, claim_run) ne touchent pas le disque.
+# Les écritures passent par save_last_run (base puis miroir).
+
+_last_runs: dict[str, int] | None = None
+# Runs réservés par claim_run, pas encore sauvegardés : {model: run_ts précédent}
+_claims: dict[str, int | None] = {}
+_last_runs_lock = threading.Lock()
+
+
+@instrumented
+def load_last_runs():
+    """(Re)charge le miroir mémoire depuis la table last_runs"""
+    global _last_runs
+    with reader() as conn:
+        rows = conn.execute("SELECT model, run_ts FROM last_runs").fetchall()
+    with _last_runs_lock:
+        _last_runs = {row["model"]: row["run_ts"] for row in rows}
+        _claims.clear()
 
+
+def _ensure_last_runs():
+    get_manager()  # Réinitialise le miroir si DATABASE_PATH a changé
+    if _last_runs is None:
+        load_last_runs()
+
+
+@instrumented
 def save_last_run(model: str, run_datetime: datetime):
-    """Sauvegarde le dernier run notifié pour un modèle"""
-    # Convertir en ISO string pour stockage SQLite
+    """Sauvegarde le dernier run notifié pour un modèle (base, puis miroir)"""
+    run_ts = to_epoch(run_datetime)
+    with writer() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO last_runs (model, run_ts, notified_ts) VALUES (?, ?, ?)",
+            (model, run_ts, to_epoch(clock.now()))
+        )
+    
+    _ensure_last_runs()
+    with _last_runs_lock:
+        _last_runs[model] = run_ts
+        _claims.pop(model, None)
+
+
+def get_last_run(model: str) -> datetime | None:
+    """Récupère le dernier run notifié (ou réservé) pour un modèle"""
+    _ensure_last_runs()
+    run_ts = _last_runs.get(model)
+    return from_epoch(run_ts) if run_ts is not None else None
+
+
+def is_new_run(model: str, run_datetime: datetime) -> bool:
+    """Vérifie si c'est un nouveau run (pas encore notifié ni réservé)"""
+    _ensure_last_runs()
+    last_ts = _last_runs.get(model)
+    return last_ts is None or to_epoch(run_datetime) > last_ts
+
+
+def claim_run(model: str, run_datetime: datetime) -> bool:
+    """
+    Compare-and-set : réserve un run pour notification s'il est plus récent
+    que le dernier run connu. Pour un même run, un seul appelant obtient True.
+    
+    La réservation est en mémoire seulement : à confirmer par save_last_run
+    une fois l'événement mis en file, ou à annuler par release_run.
+    """
+    run_ts = to_epoch(run_datetime)
+    _ensure_last_runs()
+    with _last_runs_lock:
+        current = _last_runs.get(model)
+        if current is not None and run_ts <= current:
+            return False
+        _claims.setdefault(model, current)
+        _last_runs[model] = run_ts
+        return True
+
+
+def release_run(model: str, run_datetime: datetime):
+    """Annule la réservation d'un run (il sera re-détecté au prochain cycle)"""
+    run_ts = to_epoch(run_datetime)
+    with _last_runs_lock:
+        if model not in _claims or _last_runs.get(model) != run_ts:
+            return
+        previous = _claims.pop(model)
+        if previous is None:
+            _last_runs.pop(model, None)
+        else:
+            _last_runs[model] = previous
+
+
+# ============ FILE D'ÉVÉNEMENTS RUN → LIVRAISON ============
+
+@instrumented
+def enqueue_run_event(model: str, run_datetime: datetime, detected_at: datetime) -> bool:
+    """
+    Ajoute un événement "run disponible" dans la file de livraison.
+    
+    Idempotent : un même (model, run) n'est mis en file qu'une seule fois.
+    
+    Returns:
+        True si l'événement a été ajouté, False s'il existait déjà
+    """
     if run_datetime.tzinfo is None:
         run_datetime = run_datetime.replace(tzinfo=timezone.utc)
+    if detected_at.tzinfo is None:
+        detected_at = detected_at.replace(tzinfo=timezone.utc)
     
-    iso_string = run_datetime.isoformat()
+    with writer() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO run_events (model, run_ts, detected_ts) VALUES (?, ?, ?)",
+            (model, to_epoch(run_datetime), to_epoch(detected_at))
+        )
+        if cursor.rowcount == 0:
+            return False
+        
+        # Destinataires figés à la détection, dans la même transaction
+        recipients = _fill_outbox(conn, cursor.lastrowid, model, run_datetime.hour)
     
-    conn = get_connection()
-    conn.execute(
-        "INSERT OR REPLACE INTO last_runs (model, run_datetime, notified_at) VALUES (?, ?, ?)",
-        (model, iso_string, datetime.now(timezone.utc).isoformat())
-    )
-    conn.commit()
-    conn.close()
+    logger.info(f"📬 {model} {run_datetime.hour:02d}h : {recipients} notifications en file")
+    return True
 
 
-def get_last_run(model: str) -> datetime | None:
-    """Récupère le dernier run notifié pour un modèle"""
-    conn = get_connection()
-    cursor = conn.execute(
-        "SELECT run_datetime FROM last_runs WHERE model = ?",
-        (model,)
-    )
-    row = cursor.fetchone()
-    conn.close()
+@instrumented
+def claim_next_run_event(lease_minutes: int = 15) -> dict | None:
+    """
+    Réserve le plus ancien événement en attente pour livraison.
     
-    if row and row["run_datetime"]:
-        # Parser la string ISO en datetime
-        try:
-            dt = datetime.fromisoformat(row["run_datetime"])
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            return dt
-        except (ValueError, TypeError):
+    Un événement resté "processing" plus de `lease_minutes` (worker mort
+    en pleine livraison) est de nouveau réservable : sa livraison reprend
+    aux envois encore "pending" de notification_outbox. Un événement reporté
+    (defer_run_event) n'est réservable qu'à partir de son next_attempt_ts.
+    
+    Returns:
+        {'id', 'model', 'run_datetime', 'detected_at', 'attempts'} ou None si file vide
+    """
+    now = to_epoch(clock.now())
+    stale_before = now - lease_minutes * 60
+    
+    # Transaction BEGIN IMMEDIATE : un seul worker peut réserver à la fois (multi-process)
+    with writer() as conn:
+        row = conn.execute("""
+            SELECT id, model, run_ts, detected_ts, attempts
+            FROM run_events
+            WHERE (status = 'pending' AND (next_attempt_ts IS NULL OR next_attempt_ts <= ?))
+               OR (status = 'processing' AND claimed_ts < ?)
+            ORDER BY id
+            LIMIT 1
+        """, (now, stale_before)).fetchone()
+        
+        if row is None:
             return None
+        
+        conn.execute(
+            "UPDATE run_events SET status = 'processing', claimed_ts = ?, attempts = attempts + 1 WHERE id = ?",
+            (now, row["id"])
+        )
+        
+        # Événement mis en file avant l'outbox : destinataires calculés maintenant
+        has_outbox = conn.execute(
+            "SELECT 1 FROM notification_outbox WHERE event_id = ? LIMIT 1", (row["id"],)
+        ).fetchone()
+        if has_outbox is None:
+            _fill_outbox(conn, row["id"], row["model"], from_epoch(row["run_ts"]).hour)
     
-    return None
+    return {
+        "id": row["id"],
+        "model": row["model"],
+        "run_datetime": from_epoch(row["run_ts"]),
+        "detected_at": from_epoch(row["detected_ts"]),
+        "attempts": row["attempts"] + 1,
+    }
 
 
-def is_new_run(model: str, run_datetime: datetime) -> bool:
-    """Vérifie si c'est un nouveau run (pas encore notifié)"""
-    last = get_last_run(model)
+@instrumented
+def complete_run_event(event_id: int, sent_count: int, failed_count: int):
+    """Marque un événement comme livré"""
+    with writer() as conn:
+        conn.execute(
+            "UPDATE run_events SET status = 'done', done_ts = ?, sent_count = ?, failed_count = ? WHERE id = ?",
+            (to_epoch(clock.now()), sent_count, failed_count, event_id)
+        )
+
+
+@instrumented
+def defer_run_event(event_id: int, next_attempt_at: datetime):
+    """
+    Rend un événement dont les envois restants ne sont pas encore dus
+    (digests, nouveaux essais) : le worker passe aux suivants et le
+    reprend à next_attempt_at.
+    """
+    with writer() as conn:
+        conn.execute(
+            "UPDATE run_events SET status = 'pending', next_attempt_ts = ? WHERE id = ? AND status = 'processing'",
+            (to_epoch(next_attempt_at), event_id)
+        )
+
+
+@instrumented
+def count_pending_run_events() -> int:
+    """Compte les événements pas encore livrés (file de livraison)"""
+    with reader() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM run_events WHERE status != 'done'"
+        ).fetchone()[0]
+
+
+@instrumented
+def renew_run_event_lease(event_id: int):
+    """Prolonge le bail d'un événement en cours de livraison (longs fan-outs, reprises)"""
+    with writer() as conn:
+        conn.execute(
+            "UPDATE run_events SET claimed_ts = ? WHERE id = ? AND status = 'processing'",
+            (to_epoch(clock.now()), event_id)
+        )
+
+
+# ============ OUTBOX DES NOTIFICATIONS ============
+
+# Tentatives avant abandon d'un envoi (hors RetryAfter, qui ne compte pas)
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_RETENTION_DAYS = 7
+
+# Bail d'un envoi réclamé (même durée que celui des événements) : deux workers
+# n'envoient jamais la même ligne, celles d'un worker arrêté sont reprises à expiration
+OUTBOX_LEASE_SECONDS = 15 * 60
+
+
+def _fill_outbox(conn, event_id: int, model: str, run_hour: int) -> int:
+    """
+    Insère un envoi pending par abonné de (model, run_hour), par lots de
+    OUTBOX_BATCH_SIZE chat_ids lus en flux (iter_subscribed_chat_ids : index
+    mémoire dans le process du bot, table subscriptions ailleurs).
+    Les envois des users en mode digest sont retenus digest_minutes : les runs
+    détectés entre-temps partiront dans le même message (get_digest_companions).
+    """
+    now = to_epoch(clock.now())
+    chat_ids = iter_subscribed_chat_ids(model, run_hour)
+    filled = 0
+    try:
+        while batch := list(itertools.islice(chat_ids, OUTBOX_BATCH_SIZE)):
+            filled += conn.execute("""
+                INSERT OR IGNORE INTO notification_outbox (event_id, chat_id, next_attempt_ts)
+                SELECT ?, u.chat_id, ? + u.digest_minutes * 60
+                FROM json_each(?) AS j
+                JOIN users u ON u.chat_id = j.value
+            """, (event_id, now, json.dumps(batch))).rowcount
+    finally:
+        # Rend la connexion de lecture (requête SQL) même en cas d'erreur
+        chat_ids.close()
+    return filled
+
+
+@instrumented
+def claim_outbox_batch(event_id: int, after_id: int = 0,
+                       limit: int = OUTBOX_BATCH_SIZE) -> list[tuple[int, int, int]]:
+    """
+    Réclame les prochains envois dus (pending, next_attempt_ts échu, sans bail
+    en cours) d'un événement, par id croissant à partir de after_id.
+    Ils restent à ce worker jusqu'à record_outbox_results ou OUTBOX_LEASE_SECONDS.
     
-    if last is None:
-        return True
+    Returns:
+        [(id, chat_id, attempts), ...]
+    """
+    now = to_epoch(clock.now())
+    with writer() as conn:
+        rows = conn.execute("""
+            UPDATE notification_outbox SET lease_until_ts = ?
+            WHERE id IN (
+                SELECT id FROM notification_outbox
+                WHERE event_id = ? AND status = 'pending' AND next_attempt_ts <= ?
+                  AND lease_until_ts <= ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            )
+            RETURNING id, chat_id, attempts
+        """, (now + OUTBOX_LEASE_SECONDS, event_id, now, now, after_id, limit)).fetchall()
+    return sorted(tuple(row) for row in rows)
+
+
+@instrumented
+def get_digest_companions(event_id: int, chat_ids: list[int]) -> dict[int, list[tuple]]:
+    """
+    Réclame les envois pending des autres événements pour les users en mode
+    digest parmi chat_ids : à joindre au message de event_id plutôt qu'envoyés
+    à part. Même bail que claim_outbox_batch, pris dans la transaction qui les
+    lit : un autre worker ne peut plus les envoyer (ni les joindre) de son côté.
     
-    # S'assurer que les deux sont timezone-aware pour comparaison
-    if run_datetime.tzinfo is None:
-        run_datetime = run_datetime.replace(tzinfo=timezone.utc)
+    Returns:
+        {chat_id: [(id, model, run_datetime), ...]} par ordre de détection
+    """
+    if not chat_ids:
+        return {}
+    
+    now = to_epoch(clock.now())
+    with writer() as conn:
+        rows = conn.execute(f"""
+            UPDATE notification_outbox SET lease_until_ts = ?
+            WHERE status = 'pending' AND event_id != ? AND lease_until_ts <= ?
+              AND chat_id IN ({', '.join('?' * len(chat_ids))})
+              AND chat_id IN (SELECT chat_id FROM users WHERE digest_minutes > 0)
+            RETURNING id, chat_id, event_id
+        """, (now + OUTBOX_LEASE_SECONDS, event_id, now, *chat_ids)).fetchall()
+        
+        event_ids = {row["event_id"] for row in rows}
+        events = {
+            row["id"]: (row["model"], from_epoch(row["run_ts"]))
+            for row in conn.execute(
+                f"SELECT id, model, run_ts FROM run_events "
+                f"WHERE id IN ({', '.join('?' * len(event_ids))})",
+                tuple(event_ids)
+            )
+        } if event_ids else {}
+    
+    companions: dict[int, list[tuple]] = {}
+    for row in sorted(rows, key=lambda row: (row["event_id"], row["id"])):
+        companions.setdefault(row["chat_id"], []).append((row["id"], *events[row["event_id"]]))
+    return companions
+
+
+@instrumented
+def record_outbox_results(results: list[dict]):
+    """
+    Enregistre un lot de résultats d'envoi en une transaction.
     
-    return run_datetime > last
+    Args:
+        results: [{'id', 'outcome', 'next_ts', 'error'}, ...] avec outcome :
+            'sent'   : livré
+            'retry'  : échec temporaire, nouvel essai à next_ts (abandon après OUTBOX_MAX_ATTEMPTS)
+            'defer'  : RetryAfter, nouvel essai à next_ts sans compter de tentative
+            'failed' : échec définitif
+    """
+    if not results:
+        return
+    
+    now = to_epoch(clock.now())
+    with writer() as conn:
+        conn.executemany("""
+            UPDATE notification_outbox SET
+                status = CASE :outcome
+                    WHEN 'sent' THEN 'sent'
+                    WHEN 'failed' THEN 'failed'
+                    WHEN 'retry' THEN CASE WHEN attempts + 1 >= :max_attempts THEN 'failed' ELSE 'pending' END
+                    ELSE 'pending'
+                END,
+                attempts = attempts + (:outcome != 'defer'),
+                next_attempt_ts = COALESCE(:next_ts, next_attempt_ts),
+                lease_until_ts = 0,
+                sent_ts = CASE WHEN :outcome = 'sent' THEN :now END,
+                last_error = :error
+            WHERE id = :id AND status = 'pending'
+        """, [
+            {"next_ts": None, "error": None, **result, "now": now, "max_attempts": OUTBOX_MAX_ATTEMPTS}
+            for result in results
+        ])
+
+
+@instrumented
+def next_outbox_attempt(event_id: int) -> int | None:
+    """
+    Échéance (epoch) du prochain envoi pending d'un événement, None si tout est traité.
+    Un envoi sous le bail d'un autre worker n'est réclamable qu'à son expiration.
+    """
+    with reader() as conn:
+        return conn.execute("""
+            SELECT MIN(MAX(next_attempt_ts, lease_until_ts)) FROM notification_outbox
+            WHERE event_id = ? AND status = 'pending'
+        """, (event_id,)).fetchone()[0]
+
+
+@instrumented
+def count_outbox(event_id: int) -> dict[str, int]:
+    """Envois d'un événement par statut {'pending', 'sent', 'failed'}"""
+    counts = {"pending": 0, "sent": 0, "failed": 0}
+    with reader() as conn:
+        for status, count in conn.execute(
+            "SELECT status, COUNT(*) FROM notification_outbox WHERE event_id = ? GROUP BY status",
+            (event_id,)
+        ):
+            counts[status] = count
+    return counts
+
+
+@instrumented
+def purge_outbox(days: int = OUTBOX_RETENTION_DAYS) -> int:
+    """Supprime le registre des événements livrés depuis plus de `days` jours"""
+    cutoff = to_epoch(clock.now() - timedelta(days=days))
+    with writer() as conn:
+        cursor = conn.execute("""
+            DELETE FROM notification_outbox WHERE event_id IN (
+                SELECT id FROM run_events WHERE status = 'done' AND done_ts < ?
+            )
+        """, (cutoff,))
+        return cursor.rowcount
+
+
+# ============ RAPPELS ============
+
+MAX_REMINDERS_PER_USER = 10
+
+
+@instrumented
+def upsert_reminder(chat_id: int, model: str, run_hour: int, lead_minutes: int) -> dict | None:
+    """
+    Crée un rappel, ou met à jour le délai d'un rappel existant (même modèle/run).
+    
+    Returns:
+        {'id', 'chat_id', 'model', 'run_hour', 'lead_minutes', 'last_run_ts'},
+        ou None si l'utilisateur a déjà MAX_REMINDERS_PER_USER rappels
+    """
+    with writer() as conn:
+        count = conn.execute(
+            "SELECT COUNT(*) FROM reminders WHERE chat_id = ? AND NOT (model = ? AND run_hour = ?)",
+            (chat_id, model, run_hour)
+        ).fetchone()[0]
+        if count >= MAX_REMINDERS_PER_USER:
+            return None
+        
+        row = conn.execute("""
+            INSERT INTO reminders (chat_id, model, run_hour, lead_minutes) VALUES (?, ?, ?, ?)
+            ON CONFLICT(chat_id, model, run_hour) DO UPDATE SET lead_minutes = excluded.lead_minutes
+            RETURNING id, chat_id, model, run_hour, lead_minutes, last_run_ts
+        """, (chat_id, model, run_hour, lead_minutes)).fetchone()
+    return dict(row)
+
+
+@instrumented
+def delete_reminder(chat_id: int, model: str, run_hour: int) -> int | None:
+    """Supprime un rappel. Retourne son id, None s'il n'existait pas."""
+    with writer() as conn:
+        row = conn.execute(
+            "DELETE FROM reminders WHERE chat_id = ? AND model = ? AND run_hour = ? RETURNING id",
+            (chat_id, model, run_hour)
+        ).fetchone()
+    return row["id"] if row else None
+
+
+@instrumented
+def get_user_reminders(chat_id: int) -> list[dict]:
+    """Rappels d'un utilisateur, par modèle puis heure de run"""
+    with reader() as conn:
+        return [
+            dict(row) for row in conn.execute(
+                "SELECT id, chat_id, model, run_hour, lead_minutes, last_run_ts FROM reminders "
+                "WHERE chat_id = ? ORDER BY model, run_hour",
+                (chat_id,)
+            )
+        ]
+
+
+@instrumented
+def iter_reminders(chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[tuple[int, int, str, int, int, int]]:
+    """
+    Parcourt les rappels des utilisateurs actifs (chargement de la roue au démarrage).
+    
+    Yields:
+        (id, chat_id, model, run_hour, lead_minutes, last_run_ts)
+    """
+    yield from _stream(
+        """
+        SELECT r.id, r.chat_id, r.model, r.run_hour, r.lead_minutes, r.last_run_ts
+        FROM reminders r JOIN users u ON u.chat_id = r.chat_id
+        WHERE u.active = 1
+        """,
+        chunk_size=chunk_size
+    )
+
+
+@instrumented
+def get_active_chat_ids(chat_ids: list[int]) -> set[int]:
+    """Parmi chat_ids, ceux des utilisateurs actifs"""
+    active = set()
+    with reader() as conn:
+        for i in range(0, len(chat_ids), DEACTIVATE_BATCH_SIZE):
+            batch = chat_ids[i:i + DEACTIVATE_BATCH_SIZE]
+            active.update(
+                row[0] for row in conn.execute(
+                    f"SELECT chat_id FROM users WHERE active = 1 AND chat_id IN ({', '.join('?' * len(batch))})",
+                    batch
+                )
+            )
+    return active
+
+
+@instrumented
+def mark_reminders_fired(reminder_ids: list[int], run_ts: int):
+    """Enregistre en une transaction les rappels envoyés pour le run run_ts"""
+    with writer() as conn:
+        conn.executemany(
+            "UPDATE reminders SET last_run_ts = ? WHERE id = ?",
+            [(run_ts, reminder_id) for reminder_id in reminder_ids]
+        )
 
 
 # ============ RUN AVAILABILITY LOGGING (V1.1) ============
 
+@instrumented
 def log_run_availability(model: str, run_datetime: datetime, detected_at: datetime):
     """
     Log la disponibilité d'un run avec son délai.
@@ -366,28 +1449,35 @@ def log_run_availability(model: str, run_datetime: datetime, detected_at: dateti
         detected_at = detected_at.replace(tzinfo=timezone.utc)
     
     run_hour = run_datetime.hour
-    run_date = run_datetime.date().isoformat()
+    run_ts = to_epoch(run_datetime)
     
     # Calculer délai en minutes (arrondi)
     delay = detected_at - run_datetime
     delay_minutes = round(delay.total_seconds() / 60)
     
-    conn = get_connection()
     try:
-        conn.execute("""
-            INSERT INTO run_availability_log 
-            (model, run_hour, run_date, detected_at, delay_minutes)
-            VALUES (?, ?, ?, ?, ?)
-        """, (model, run_hour, run_date, detected_at.isoformat(), delay_minutes))
-        conn.commit()
+        with writer() as conn:
+            conn.execute("""
+                INSERT INTO run_availability_log 
+                (model, run_hour, run_ts, detected_ts, delay_minutes)
+                VALUES (?, ?, ?, ?, ?)
+            """, (model, run_hour, run_ts, to_epoch(detected_at), delay_minutes))
+            _add_delay_sample(conn, model, run_hour, run_ts, delay_minutes)
+        _log_changed()
         logger.info(f"📊 {model} {run_hour:02d}h logged: +{delay_minutes} min")
     except sqlite3.IntegrityError:
         # Doublon (redémarrage ou détection multiple) : ignorer silencieusement
         pass
-    finally:
-        conn.close()
 
 
+@instrumented
+def count_availability_logs() -> int:
+    """Compte le nombre total de logs de disponibilité"""
+    with reader() as conn:
+        return conn.execute("SELECT COUNT(*) FROM run_availability_log").fetchone()[0]
+
+
+@instrumented
 def get_average_delay(model: str, run_hour: int, days: int = 30) -> int | None:
     """
     Calcule le délai moyen en minutes pour un couple (modèle, run).
@@ -400,31 +1490,20 @@ def get_average_delay(model: str, run_hour: int, days: int = 30) -> int | None:
     Returns:
         Délai moyen en minutes, ou None si pas assez de données
     """
-    cutoff_date = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
-    
-    conn = get_connection()
-    cursor = conn.execute("""
-        SELECT AVG(delay_minutes), COUNT(*) 
-        FROM run_availability_log
-        WHERE model = ? AND run_hour = ? AND run_date >= ?
-    """, (model, run_hour, cutoff_date))
-    
-    result = cursor.fetchone()
-    conn.close()
-    
-    avg_delay = result[0]
-    count = result[1]
+    stats = get_log_stats(model, run_hour, days)
     
     # Nécessite au moins 3 observations pour être fiable
-    if count < 3:
+    if stats is None or stats["count"] < 3:
         return None
     
-    return round(avg_delay) if avg_delay else None
+    return stats["avg_delay"] or None
 
 
+@instrumented
 def get_next_run_eta(model: str, run_hour: int, run_date: datetime) -> datetime | None:
     """
-    Prédit l'heure de disponibilité d'un run basé sur l'historique.
+    Prédit l'heure de disponibilité d'un run basé sur l'historique
+    (médiane glissante + effet du jour de la semaine, voir analytics.py).
     
     Args:
         model: Nom du modèle
@@ -434,10 +1513,7 @@ def get_next_run_eta(model: str, run_hour: int, run_date: datetime) -> datetime
     Returns:
         Datetime prédit de disponibilité, ou None si pas assez de données
     """
-    avg_delay = get_average_delay(model, run_hour, days=30)
-    
-    if avg_delay is None:
-        return None
+    from analytics import expected_delay
     
     # Construire le datetime du run
     if run_date.tzinfo is None:
@@ -445,15 +1521,23 @@ def get_next_run_eta(model: str, run_hour: int, run_date: datetime) -> datetime
     
     run_datetime = run_date.replace(hour=run_hour, minute=0, second=0, microsecond=0)
     
-    # Ajouter le délai moyen
-    eta = run_datetime + timedelta(minutes=avg_delay)
+    delay = expected_delay(model, run_hour, run_datetime.weekday())
+    
+    if delay is None:
+        return None
+    
+    # Ajouter le délai attendu
+    eta = run_datetime + timedelta(minutes=delay)
     
     return eta
 
 
+@instrumented
 def get_log_stats(model: str, run_hour: int, days: int = 30) -> dict | None:
     """
     Retourne des statistiques détaillées sur un couple (modèle, run).
+    Lecture d'une seule ligne de delay_stats pour la fenêtre standard
+    (STATS_WINDOW_DAYS), parcours des logs bruts pour une autre durée.
     
     Returns:
         {
@@ -461,71 +1545,468 @@ def get_log_stats(model: str, run_hour: int, days: int = 30) -> dict | None:
             'avg_delay': int,       # Délai moyen (minutes)
             'min_delay': int,       # Délai minimum
             'max_delay': int,       # Délai maximum
+            'stddev_delay': float,  # Écart-type des délais
             'last_delay': int       # Dernier délai observé
         }
         ou None si pas de données
     """
-    cutoff_date = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
-    
-    conn = get_connection()
-    cursor = conn.execute("""
-        SELECT 
-            COUNT(*) as count,
-            AVG(delay_minutes) as avg_delay,
-            MIN(delay_minutes) as min_delay,
-            MAX(delay_minutes) as max_delay
-        FROM run_availability_log
-        WHERE model = ? AND run_hour = ? AND run_date >= ?
-    """, (model, run_hour, cutoff_date))
-    
-    result = cursor.fetchone()
-    
-    # Récupérer le dernier délai
-    cursor2 = conn.execute("""
-        SELECT delay_minutes
-        FROM run_availability_log
-        WHERE model = ? AND run_hour = ?
-        ORDER BY run_date DESC, detected_at DESC
-        LIMIT 1
-    """, (model, run_hour))
-    
-    last_result = cursor2.fetchone()
-    conn.close()
+    if days != STATS_WINDOW_DAYS:
+        return _scan_log_stats(model, run_hour, days)
+    
+    row = get_delay_stats(model, run_hour)
+    if row is None or row["win_samples"] == 0:
+        return None
+    
+    count = row["win_samples"]
+    return {
+        "count": count,
+        "avg_delay": round(row["win_sum"] / count),
+        "min_delay": row["win_min"],
+        "max_delay": row["win_max"],
+        "stddev_delay": _stddev(count, row["win_sum"], row["win_sumsq"]),
+        "last_delay": row["last_delay"],
+    }
+
+
+def _scan_log_stats(model: str, run_hour: int, days: int) -> dict | None:
+    """get_log_stats calculé sur les logs bruts (fenêtre hors delay_stats)"""
+    cutoff_ts = days_ago_epoch(days)
+    
+    with reader() as conn:
+        result = conn.execute("""
+            SELECT 
+                COUNT(*) as count,
+                SUM(delay_minutes) as delay_sum,
+                SUM(delay_minutes * delay_minutes) as delay_sumsq,
+                MIN(delay_minutes) as min_delay,
+                MAX(delay_minutes) as max_delay
+            FROM run_availability_log
+            WHERE model = ? AND run_hour = ? AND run_ts >= ?
+        """, (model, run_hour, cutoff_ts)).fetchone()
+        
+        # Récupérer le dernier délai
+        last_result = conn.execute("""
+            SELECT delay_minutes
+            FROM run_availability_log
+            WHERE model = ? AND run_hour = ?
+            ORDER BY run_ts DESC
+            LIMIT 1
+        """, (model, run_hour)).fetchone()
     
     if result["count"] == 0:
         return None
     
     return {
         "count": result["count"],
-        "avg_delay": round(result["avg_delay"]) if result["avg_delay"] else 0,
+        "avg_delay": round(result["delay_sum"] / result["count"]),
         "min_delay": result["min_delay"],
         "max_delay": result["max_delay"],
+        "stddev_delay": _stddev(result["count"], result["delay_sum"], result["delay_sumsq"]),
         "last_delay": last_result["delay_minutes"] if last_result else None
     }
 
 
-def cleanup_old_logs(days: int = 365):
+# ============ STATS DES DÉLAIS (delay_stats) ============
+
+# Fenêtre glissante matérialisée dans delay_stats (colonnes win_*)
+STATS_WINDOW_DAYS = 30
+
+
+def _stddev(count: int, total: int, total_sq: int) -> float:
+    """Écart-type (population) depuis n, somme et somme des carrés"""
+    mean = total / count
+    return max(0.0, total_sq / count - mean * mean) ** 0.5
+
+
+def _stats_window_start() -> int:
+    """Début (epoch) de la fenêtre glissante courante"""
+    return days_ago_epoch(STATS_WINDOW_DAYS)
+
+
+def _add_delay_sample(conn, model: str, run_hour: int, run_ts: int, delay: int):
+    """Ajoute une observation à delay_stats, dans la transaction du log brut"""
+    in_window = run_ts >= _stats_window_start()
+    # Dans DO UPDATE, les colonnes désignent les valeurs avant mise à jour
+    conn.execute("""
+        INSERT INTO delay_stats (
+            model, run_hour, samples, delay_sum, delay_sumsq, delay_min, delay_max,
+            last_delay, last_run_ts, window_start_ts,
+            win_samples, win_sum, win_sumsq, win_min, win_max
+        )
+        VALUES (
+            :model, :run_hour, 1, :delay, :delay * :delay, :delay, :delay,
+            :delay, :run_ts, :window_start,
+            :w, :w * :delay, :w * :delay * :delay, :win_delay, :win_delay
+        )
+        ON CONFLICT(model, run_hour) DO UPDATE SET
+            samples = samples + 1,
+            delay_sum = delay_sum + :delay,
+            delay_sumsq = delay_sumsq + :delay * :delay,
+            delay_min = MIN(COALESCE(delay_min, :delay), :delay),
+            delay_max = MAX(COALESCE(delay_max, :delay), :delay),
+            last_delay = CASE WHEN last_run_ts IS NULL OR :run_ts >= last_run_ts
+                              THEN :delay ELSE last_delay END,
+            last_run_ts = MAX(COALESCE(last_run_ts, :run_ts), :run_ts),
+            win_samples = win_samples + :w,
+            win_sum = win_sum + :w * :delay,
+            win_sumsq = win_sumsq + :w * :delay * :delay,
+            win_min = CASE WHEN :w THEN MIN(COALESCE(win_min, :delay), :delay) ELSE win_min END,
+            win_max = CASE WHEN :w THEN MAX(COALESCE(win_max, :delay), :delay) ELSE win_max END
+    """, {
+        "model": model,
+        "run_hour": run_hour,
+        "delay": delay,
+        "run_ts": run_ts,
+        "window_start": _stats_window_start(),
+        "w": int(in_window),
+        "win_delay": delay if in_window else None,
+    })
+
+
+def _refresh_delay_windows(conn, window_start: int):
+    """Recalcule les agrégats win_* des lignes dont la fenêtre a glissé"""
+    conn.execute("""
+        UPDATE delay_stats SET
+            window_start_ts = :window_start,
+            (win_samples, win_sum, win_sumsq, win_min, win_max) = (
+                SELECT COUNT(*), COALESCE(SUM(delay_minutes), 0),
+                       COALESCE(SUM(delay_minutes * delay_minutes), 0),
+                       MIN(delay_minutes), MAX(delay_minutes)
+                FROM run_availability_log AS log
+                WHERE log.model = delay_stats.model
+                  AND log.run_hour = delay_stats.run_hour
+                  AND log.run_ts >= :window_start
+            )
+        WHERE window_start_ts IS NOT :window_start
+    """, {"window_start": window_start})
+
+
+def _recompute_lifetime_stats(conn, model: str, run_hour: int):
+    """
+    Recalcule les totaux (hors fenêtre) d'un couple depuis les logs bruts et
+    les agrégats journaliers restants, après suppression d'agrégats expirés :
+    min/max ne se soustraient pas. Ligne supprimée s'il ne reste aucune donnée.
+    """
+    params = {"model": model, "run_hour": run_hour}
+    conn.execute("""
+        UPDATE delay_stats SET (samples, delay_sum, delay_sumsq, delay_min, delay_max) = (
+            SELECT COALESCE(SUM(n), 0), COALESCE(SUM(total), 0), COALESCE(SUM(total_sq), 0),
+                   MIN(low), MAX(high)
+            FROM (
+                SELECT COUNT(*) AS n, SUM(delay_minutes) AS total,
+                       SUM(delay_minutes * delay_minutes) AS total_sq,
+                       MIN(delay_minutes) AS low, MAX(delay_minutes) AS high
+                FROM run_availability_log
+                WHERE model = :model AND run_hour = :run_hour
+                UNION ALL
+                SELECT SUM(samples), SUM(delay_sum), SUM(delay_sumsq), MIN(delay_min), MAX(delay_max)
+                FROM run_availability_daily
+                WHERE model = :model AND run_hour = :run_hour
+            )
+        )
+        WHERE model = :model AND run_hour = :run_hour
+    """, params)
+    conn.execute(
+        "DELETE FROM delay_stats WHERE model = :model AND run_hour = :run_hour AND samples = 0", params
+    )
+
+
+def _rebuild_delay_stats(conn):
+    """Reconstruit delay_stats depuis les logs bruts et les agrégats journaliers"""
+    conn.execute("DELETE FROM delay_stats")
+    conn.execute("""
+        INSERT INTO delay_stats
+            (model, run_hour, samples, delay_sum, delay_sumsq, delay_min, delay_max)
+        SELECT model, run_hour, SUM(n), SUM(total), SUM(total_sq), MIN(low), MAX(high)
+        FROM (
+            SELECT model, run_hour, COUNT(*) AS n, SUM(delay_minutes) AS total,
+                   SUM(delay_minutes * delay_minutes) AS total_sq,
+                   MIN(delay_minutes) AS low, MAX(delay_minutes) AS high
+            FROM run_availability_log
+            GROUP BY model, run_hour
+            UNION ALL
+            SELECT model, run_hour, SUM(samples), SUM(delay_sum), SUM(delay_sumsq),
+                   MIN(delay_min), MAX(delay_max)
+            FROM run_availability_daily
+            GROUP BY model, run_hour
+        )
+        GROUP BY model, run_hour
+    """)
+    conn.execute("""
+        UPDATE delay_stats SET (last_delay, last_run_ts) = (
+            SELECT delay_minutes, run_ts
+            FROM run_availability_log AS log
+            WHERE log.model = delay_stats.model AND log.run_hour = delay_stats.run_hour
+            ORDER BY run_ts DESC
+            LIMIT 1
+        )
+    """)
+    _refresh_delay_windows(conn, _stats_window_start())
+
+
+@instrumented
+def rebuild_delay_stats() -> int:
+    """
+    Reconstruit entièrement delay_stats (après import ou correction manuelle des logs).
+    
+    Returns:
+        Nombre de couples (model, run_hour) agrégés
+    """
+    with writer() as conn:
+        _rebuild_delay_stats(conn)
+        count = conn.execute("SELECT COUNT(*) FROM delay_stats").fetchone()[0]
+    _log_changed()
+    logger.info(f"📊 delay_stats reconstruite : {count} couples (modèle, run)")
+    return count
+
+
+@instrumented
+def get_delay_stats(model: str, run_hour: int) -> sqlite3.Row | None:
+    """
+    Ligne delay_stats d'un couple (modèle, run).
+    Au premier appel de la journée, les fenêtres glissantes sont recalculées.
     """
-    Supprime les logs plus vieux que X jours.
+    window_start = _stats_window_start()
+    
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT * FROM delay_stats WHERE model = ? AND run_hour = ?", (model, run_hour)
+        ).fetchone()
+    
+    if row is None or row["window_start_ts"] == window_start:
+        return row
+    
+    with writer() as conn:
+        _refresh_delay_windows(conn, window_start)
+        return conn.execute(
+            "SELECT * FROM delay_stats WHERE model = ? AND run_hour = ?", (model, run_hour)
+        ).fetchone()
+
+
+# ============ HISTORIQUE (PAGINATION PAR CLÉ) ============
+
+HISTORY_PAGE_SIZE = 10
+
+# Pages déjà servies {(model, run_hour, cursor, newer, limit): page}, vidé à chaque
+# écriture dans run_availability_log
+HISTORY_CACHE_SIZE = 256
+_history_cache: OrderedDict = OrderedDict()
+_history_cache_lock = threading.Lock()
+
+
+# Incrémenté à chaque écriture dans run_availability_log (invalidation des caches dérivés)
+_log_generation = 0
+
+
+def _log_changed():
+    global _log_generation
+    with _history_cache_lock:
+        _history_cache.clear()
+        _log_generation += 1
+
+
+def log_generation() -> int:
+    """Compteur des écritures dans run_availability_log depuis le démarrage"""
+    return _log_generation
+
+
+@instrumented
+def get_history_page(model: str | None = None, run_hour: int | None = None,
+                     cursor: tuple[int, int] | None = None, newer: bool = False,
+                     limit: int = HISTORY_PAGE_SIZE) -> dict:
+    """
+    Une page de run_availability_log, du plus récent au plus ancien.
+    
+    Pagination par clé (keyset) : WHERE clé < curseur ORDER BY clé LIMIT n,
+    servie par un index quel que soit l'historique (jamais d'OFFSET).
+    Clé = run_ts si le modèle est fixé (unique par modèle), (run_ts, id) sinon.
     
     Args:
-        days: Nombre de jours à garder (défaut: 365 = 1 an)
+        cursor: (run_ts, id) de la ligne limite de la page affichée, None = page la plus récente
+        newer: True = lignes plus récentes que cursor (page précédente)
     
     Returns:
-        Nombre de logs supprimés
+        {
+            'rows': [(id, model, run_hour, run_ts, delay_minutes), ...],  # plus récent d'abord
+            'has_newer': bool,
+            'has_older': bool
+        }
     """
-    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+    cache_key = (model, run_hour, cursor, newer, limit)
+    with _history_cache_lock:
+        page = _history_cache.get(cache_key)
+        if page is not None:
+            _history_cache.move_to_end(cache_key)
+            return page
     
-    conn = get_connection()
-    cursor = conn.execute(
-        "DELETE FROM run_availability_log WHERE run_date < ?", 
-        (cutoff,)
-    )
-    deleted = cursor.rowcount
-    conn.commit()
-    conn.close()
+    conditions, params = [], []
+    if model:
+        conditions.append("model = ?")
+        params.append(model)
+    if run_hour is not None:
+        conditions.append("run_hour = ?")
+        params.append(run_hour)
+    
+    op, order = (">", "ASC") if newer else ("<", "DESC")
+    if model:
+        if cursor is not None:
+            conditions.append(f"run_ts {op} ?")
+            params.append(cursor[0])
+        order_by = f"run_ts {order}"
+    else:
+        if cursor is not None:
+            conditions.append(f"(run_ts, id) {op} (?, ?)")
+            params.extend(cursor)
+        order_by = f"run_ts {order}, id {order}"
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with reader() as conn:
+        rows = [
+            tuple(row) for row in conn.execute(
+                f"SELECT id, model, run_hour, run_ts, delay_minutes FROM run_availability_log "
+                f"{where} ORDER BY {order_by} LIMIT ?",
+                (*params, limit + 1)
+            )
+        ]
     
-    if deleted > 0:
-        logger.info(f"🧹 Cleanup: {deleted} logs supprimés (>{days} jours)")
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
-    return deleted
+    if newer:
+        if not has_more:
+            # Début de l'historique atteint : page la plus récente, complète
+            return get_history_page(model, run_hour, None, False, limit)
+        rows.reverse()
+        page = {"rows": rows, "has_newer": True, "has_older": True}
+    else:
+        page = {"rows": rows, "has_newer": cursor is not None, "has_older": has_more}
+    
+    with _history_cache_lock:
+        _history_cache[cache_key] = page
+        if len(_history_cache) > HISTORY_CACHE_SIZE:
+            _history_cache.popitem(last=False)
+    return page
+
+
+# ============ RÉTENTION DES LOGS ============
+
+# Les logs bruts sont conservés RAW_LOG_RETENTION_DAYS jours (> fenêtre des stats),
+# puis agrégés par (model, run_hour, jour) dans run_availability_daily
+RAW_LOG_RETENTION_DAYS = 90
+DAILY_ROLLUP_RETENTION_DAYS = 3 * 365
+
+# Travail incrémental : petits lots pour ne jamais bloquer la base longtemps
+RETENTION_BATCH_SIZE = 500
+RETENTION_MAX_BATCHES = 20
+RETENTION_VACUUM_PAGES = 500
+
+
+@instrumented
+def rollup_log_batch(cutoff_ts: int, batch_size: int = RETENTION_BATCH_SIZE) -> int:
+    """
+    Agrège un lot de logs bruts antérieurs à cutoff_ts dans
+    run_availability_daily puis les supprime, dans une même transaction.
+    
+    Returns:
+        Nombre de logs bruts agrégés (0 = plus rien à traiter)
+    """
+    with writer() as conn:
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS retention_batch (id INTEGER PRIMARY KEY)
+        """)
+        conn.execute("DELETE FROM retention_batch")
+        conn.execute("""
+            INSERT INTO retention_batch (id)
+            SELECT id FROM run_availability_log
+            WHERE run_ts < ?
+            ORDER BY run_ts
+            LIMIT ?
+        """, (cutoff_ts, batch_size))
+        
+        conn.execute("""
+            INSERT INTO run_availability_daily
+                (model, run_hour, day_ts, samples, delay_sum, delay_sumsq, delay_min, delay_max)
+            SELECT model, run_hour, run_ts - run_ts % :day,
+                   COUNT(*), SUM(delay_minutes), SUM(delay_minutes * delay_minutes),
+                   MIN(delay_minutes), MAX(delay_minutes)
+            FROM run_availability_log
+            WHERE id IN (SELECT id FROM retention_batch)
+            GROUP BY model, run_hour, run_ts - run_ts % :day
+            ON CONFLICT(model, run_hour, day_ts) DO UPDATE SET
+                samples = samples + excluded.samples,
+                delay_sum = delay_sum + excluded.delay_sum,
+                delay_sumsq = delay_sumsq + excluded.delay_sumsq,
+                delay_min = MIN(delay_min, excluded.delay_min),
+                delay_max = MAX(delay_max, excluded.delay_max)
+        """, {"day": DAY_SECONDS})
+        cursor = conn.execute(
+            "DELETE FROM run_availability_log WHERE id IN (SELECT id FROM retention_batch)"
+        )
+        rolled = cursor.rowcount
+    
+    if rolled:
+        _log_changed()
+    return rolled
+
+
+@instrumented
+def run_retention(raw_days: int = RAW_LOG_RETENTION_DAYS,
+                  rollup_days: int = DAILY_ROLLUP_RETENTION_DAYS,
+                  max_batches: int = RETENTION_MAX_BATCHES) -> dict:
+    """
+    Passe de rétention quotidienne, bornée en travail :
+    1. agrège au plus `max_batches` lots de logs bruts plus vieux que `raw_days`
+    2. supprime les agrégats journaliers plus vieux que `rollup_days`, en
+       recalculant les totaux de delay_stats des couples concernés (même
+       transaction), et le registre des notifications livrées (purge_outbox)
+    3. rend au système une partie des pages libres (incremental vacuum)
+    
+    Ce qui n'a pas été traité le sera à la passe suivante.
+    
+    Returns:
+        {'rolled_up': int, 'rollups_deleted': int, 'outbox_deleted': int, 'backlog': bool}
+    """
+    raw_cutoff = days_ago_epoch(raw_days)
+    rollup_cutoff = days_ago_epoch(rollup_days)
+    
+    rolled_up = 0
+    backlog = False
+    for _ in range(max_batches):
+        rolled = rollup_log_batch(raw_cutoff)
+        rolled_up += rolled
+        if rolled < RETENTION_BATCH_SIZE:
+            break
+    else:
+        backlog = True
+    
+    with writer() as conn:
+        expired_pairs = conn.execute(
+            "SELECT DISTINCT model, run_hour FROM run_availability_daily WHERE day_ts < ?",
+            (rollup_cutoff,)
+        ).fetchall()
+        cursor = conn.execute(
+            "DELETE FROM run_availability_daily WHERE day_ts < ?", (rollup_cutoff,)
+        )
+        rollups_deleted = cursor.rowcount
+        for model, run_hour in expired_pairs:
+            _recompute_lifetime_stats(conn, model, run_hour)
+    
+    outbox_deleted = purge_outbox()
+    
+    # Nécessite auto_vacuum=INCREMENTAL (activé dans init_database), hors transaction
+    with writer(transaction=False) as conn:
+        conn.execute(f"PRAGMA incremental_vacuum({RETENTION_VACUUM_PAGES})").fetchall()
+    
+    if rolled_up or rollups_deleted or outbox_deleted:
+        logger.info(
+            f"🧹 Rétention : {rolled_up} logs agrégés, {rollups_deleted} agrégats supprimés, "
+            f"{outbox_deleted} envois archivés supprimés"
+            f"{' (reste du travail)' if backlog else ''}"
+        )
+    
+    return {
+        "rolled_up": rolled_up,
+        "rollups_deleted": rollups_deleted,
+        "outbox_deleted": outbox_deleted,
+        "backlog": backlog,
+    }
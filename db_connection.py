@@ -0,0 +1,134 @@
+"""
+Gestionnaire de connexions SQLite
+Une connexion d'écriture longue durée (protégée par un verrou) et un petit
+pool de connexions de lecture, en mode WAL : les lectures ne sont plus
+bloquées par les écritures et on ne paie plus l'ouverture d'une connexion
+à chaque requête.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import db_metrics
+
+logger = logging.getLogger(__name__)
+
+# Pragmas appliqués à chaque connexion
+PRAGMAS = {
+    "journal_mode": "WAL",       # lecteurs non bloqués pendant les écritures
+    "synchronous": "NORMAL",     # fsync au checkpoint seulement (sûr en WAL)
+    "cache_size": -8000,         # 8 Mo de cache de pages par connexion
+    "mmap_size": 64 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,        # ms, si un autre process (worker) écrit
+}
+
+# Requêtes préparées gardées en cache par connexion
+CACHED_STATEMENTS = 256
+
+READ_POOL_SIZE = 4
+
+
+class ConnectionManager:
+    """
+    Connexions partagées vers une base SQLite.
+
+    - writer() : connexion unique d'écriture, sérialisée par un verrou,
+      dans une transaction BEGIN IMMEDIATE (commit/rollback automatique)
+    - reader() : connexion empruntée au pool de lecture
+    Les connexions sont utilisables depuis n'importe quel thread.
+    """
+
+    def __init__(self, path: str, read_pool_size: int = READ_POOL_SIZE):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._writer_conn: sqlite3.Connection | None = None
+        self._readers: queue.LifoQueue = queue.LifoQueue()
+        self._read_pool_size = read_pool_size
+        self._readers_created = 0
+        self._pool_lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,  # transactions gérées explicitement
+            cached_statements=CACHED_STATEMENTS,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        # Comptage des requêtes par fonction instrumentée
+        conn.set_trace_callback(db_metrics.on_statement)
+        return conn
+
+    @contextmanager
+    def writer(self, transaction: bool = True):
+        """
+        Connexion d'écriture exclusive.
+
+        Args:
+            transaction: False pour les commandes interdites en transaction (VACUUM...)
+        """
+        start = time.perf_counter()
+        with self._write_lock:
+            db_metrics.record_lock_wait(time.perf_counter() - start)
+            if self._writer_conn is None:
+                self._writer_conn = self._connect()
+            conn = self._writer_conn
+
+            if not transaction:
+                yield conn
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            else:
+                conn.execute("COMMIT")
+
+    @contextmanager
+    def reader(self):
+        """Connexion de lecture empruntée au pool."""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_create = self._readers_created < self._read_pool_size
+                if can_create:
+                    self._readers_created += 1
+            if can_create:
+                conn = self._connect()
+            else:
+                # Pool épuisé : attente d'une connexion rendue
+                start = time.perf_counter()
+                conn = self._readers.get()
+                db_metrics.record_lock_wait(time.perf_counter() - start)
+
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                conn.close()
+            else:
+                self._readers.put(conn)
+
+    def close(self):
+        """Ferme toutes les connexions (les lectures en cours ferment la leur en sortant)."""
+        self._closed = True
+        with self._write_lock:
+            if self._writer_conn is not None:
+                self._writer_conn.close()
+                self._writer_conn = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
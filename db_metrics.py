@@ -0,0 +1,184 @@
+"""
+Instrumentation des accès à la base
+Par fonction de database.py (décorateur @instrumented) : nombre d'appels,
+histogramme des latences, requêtes SQL exécutées, lignes renvoyées et temps
+d'attente du verrou d'écriture / du pool de lecture (db_connection.py).
+Les appels plus lents que DB_SLOW_QUERY_MS sont journalisés.
+Consultable avec /dbstats (admin).
+"""
+import bisect
+import functools
+import inspect
+import logging
+import threading
+import time
+
+from config import DB_SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+# Bornes supérieures des tranches de l'histogramme (ms), dernière tranche = au-delà
+LATENCY_BUCKETS_MS = (1, 5, 20, 100, 500)
+
+# Instructions de transaction (émises par db_connection.py) non comptées comme requêtes
+_TRANSACTION_PREFIXES = ("BEGIN", "COMMIT", "ROLLBACK")
+
+_stats: dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+# Appels de premier niveau (non imbriqués) : totaux sans double comptage
+_totals = {"calls": 0, "queries": 0}
+
+# Appels instrumentés en cours dans le thread : pile de {queries, lock_wait}
+_local = threading.local()
+
+
+def _frames() -> list:
+    frames = getattr(_local, "frames", None)
+    if frames is None:
+        frames = _local.frames = []
+    return frames
+
+
+# ============ SONDES (db_connection.py) ============
+
+def on_statement(sql: str):
+    """Trace callback SQLite : une instruction exécutée par le thread courant."""
+    frames = getattr(_local, "frames", None)
+    if frames and not sql.startswith(_TRANSACTION_PREFIXES):
+        frames[-1]["queries"] += 1
+
+
+def record_lock_wait(seconds: float):
+    """Temps passé à attendre le verrou d'écriture ou une connexion du pool."""
+    frames = _frames()
+    if frames:
+        frames[-1]["lock_wait"] += seconds
+
+
+# ============ ENREGISTREMENT ============
+
+def _count_rows(result) -> int:
+    """Lignes renvoyées : taille d'une collection, 1 pour une ligne/un dict, 0 pour un scalaire"""
+    if result is None or isinstance(result, (bool, int, float, str)):
+        return 0
+    if isinstance(result, (list, tuple, set, frozenset)):
+        return len(result)
+    return 1
+
+
+def _record(name: str, elapsed: float, frame: dict, rows: int, slow_log: bool = True):
+    elapsed_ms = elapsed * 1000
+    lock_wait_ms = frame["lock_wait"] * 1000
+
+    # Appel imbriqué : ses requêtes et attentes comptent aussi pour l'appelant
+    frames = _frames()
+    nested = bool(frames)
+    if nested:
+        frames[-1]["queries"] += frame["queries"]
+        frames[-1]["lock_wait"] += frame["lock_wait"]
+
+    bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)
+    slow = slow_log and elapsed_ms >= DB_SLOW_QUERY_MS
+
+    with _stats_lock:
+        st = _stats.get(name)
+        if st is None:
+            st = _stats[name] = {
+                "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                "queries": 0, "rows": 0, "lock_wait_ms": 0.0, "slow": 0,
+            }
+        st["calls"] += 1
+        st["total_ms"] += elapsed_ms
+        st["max_ms"] = max(st["max_ms"], elapsed_ms)
+        st["histogram"][bucket] += 1
+        st["queries"] += frame["queries"]
+        st["rows"] += rows
+        st["lock_wait_ms"] += lock_wait_ms
+        st["slow"] += slow
+        if not nested:
+            _totals["calls"] += 1
+            _totals["queries"] += frame["queries"]
+
+    if slow:
+        logger.warning(
+            f"🐢 Requête lente : {name} {elapsed_ms:.0f} ms "
+            f"({frame['queries']} requêtes, {rows} lignes, attente verrou {lock_wait_ms:.0f} ms)"
+        )
+
+
+def instrumented(func):
+    """
+    Mesure chaque appel de func. Pour un générateur, la durée est celle du
+    parcours complet (consommateur compris) et n'est pas journalisée comme lente.
+    """
+    name = func.__name__
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def gen_wrapper(*args, **kwargs):
+            frame = {"queries": 0, "lock_wait": 0.0}
+            rows = 0
+            start = time.perf_counter()
+            iterator = func(*args, **kwargs)
+            try:
+                # La requête s'exécute au premier élément : seul appel attribué à la fonction
+                frames = _frames()
+                frames.append(frame)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    frames.pop()
+                rows += 1
+                yield item
+                for item in iterator:
+                    rows += 1
+                    yield item
+            finally:
+                iterator.close()
+                _record(name, time.perf_counter() - start, frame, rows, slow_log=False)
+        return gen_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        frame = {"queries": 0, "lock_wait": 0.0}
+        frames = _frames()
+        frames.append(frame)
+        result = None
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            frames.pop()
+            _record(name, elapsed, frame, _count_rows(result))
+        return result
+    return wrapper
+
+
+# ============ CONSULTATION ============
+
+def snapshot() -> dict[str, dict]:
+    """Copie des compteurs {fonction: stats}"""
+    with _stats_lock:
+        return {name: {**st, "histogram": list(st["histogram"])} for name, st in _stats.items()}
+
+
+def totals() -> tuple[int, int]:
+    """(appels, requêtes) cumulés, appels imbriqués comptés une seule fois"""
+    with _stats_lock:
+        return _totals["calls"], _totals["queries"]
+
+
+def top(limit: int = 10, key: str = "total_ms") -> list[tuple[str, dict]]:
+    """Les `limit` fonctions les plus coûteuses selon `key` (total_ms, calls, queries...)"""
+    return sorted(snapshot().items(), key=lambda item: item[1][key], reverse=True)[:limit]
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+        _totals.update(calls=0, queries=0)
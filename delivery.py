@@ -0,0 +1,447 @@
+"""
+Worker de livraison des notifications
+Consomme la file durable run_events alimentée par le scheduler (détection)
+et envoie les notifications aux utilisateurs abonnés.
+
+Peut tourner dans le process du bot (DELIVERY_MODE=inline)
+ou dans un process séparé : python delivery.py
+"""
+import logging
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, RetryAfter
+
+import clock
+from config import BOT_TOKEN, DELIVERY_POLL_INTERVAL, MODELS
+from fanout import FanoutEngine, iter_rows
+from async_db import (
+    claim_next_run_event,
+    complete_run_event,
+    defer_run_event,
+    renew_run_event_lease,
+    claim_outbox_batch,
+    get_digest_companions,
+    record_outbox_results,
+    next_outbox_attempt,
+    count_outbox,
+    deactivate_users,
+    migrate_chat,
+)
+
+logger = logging.getLogger(__name__)
+
+# Réveil du worker quand la détection tourne dans le même process
+_wakeup: asyncio.Event | None = None
+
+# Limites de débit partagées par tous les fan-outs du process
+fanout_engine = FanoutEngine()
+
+# Résultats d'envoi écrits dans l'outbox par transaction : au pire ce nombre
+# de messages est renvoyé après un arrêt brutal en plein fan-out
+OUTBOX_FLUSH_SIZE = 50
+
+# Nouvel essai après échec temporaire : 30 s, 1 min, 2 min... plafonné
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 600
+
+# BadRequest qui signifient que le chat n'existe plus (les autres visent le message)
+UNREACHABLE_BAD_REQUESTS = ("chat not found", "user is deactivated", "peer_id_invalid", "chat_id is empty")
+
+# Chats injoignables désactivés depuis le démarrage (affiché par /stats)
+pruned_chats = 0
+
+# Groupes passés en supergroupe depuis le démarrage (affiché par /stats)
+migrated_chats = 0
+
+
+def wake_delivery_worker():
+    """Signale au worker in-process qu'un événement vient d'être mis en file."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def render_notification(model: str, run_datetime: datetime) -> str:
+    """Texte de la notification d'un run (rendu une fois par fan-out)"""
+    emoji_map = {
+        "AROME": "⛵",
+        "ARPEGE": "🌍",
+        "GFS": "🌎",
+        "ECMWF": "🇪🇺",
+    }
+
+    emoji = emoji_map.get(model, "🌐")
+    run_hour = run_datetime.hour
+    run_date = run_datetime.strftime("%d/%m/%Y")
+    now = clock.now()
+
+    message = f"""
+{emoji} **Nouveau run disponible !**
+
+📊 **Modèle :** {model}
+⏰ **Run :** {run_hour:02d}h UTC
+📅 **Date :** {run_date}
+🕐 **Notifié à :** {now.strftime("%H:%M")} UTC
+
+🔗 **Liens :**
+• [Meteociel](https://www.meteociel.fr/modeles/)
+• [Windy](https://www.windy.com/)
+"""
+    return message
+
+
+def render_digest(runs: list[tuple[str, datetime]]) -> str:
+    """Texte d'un digest : plusieurs runs détectés dans la fenêtre de regroupement"""
+    now = clock.now()
+
+    lines = "\n".join(
+        f"• {MODELS.get(model, {}).get('emoji', '🌐')} **{model}** "
+        f"{run_datetime.hour:02d}h UTC ({run_datetime.strftime('%d/%m')})"
+        for model, run_datetime in runs
+    )
+
+    message = f"""
+📦 **{len(runs)} nouveaux runs disponibles !**
+
+{lines}
+
+🕐 **Notifié à :** {now.strftime("%H:%M")} UTC
+
+🔗 **Liens :**
+• [Meteociel](https://www.meteociel.fr/modeles/)
+• [Windy](https://www.windy.com/)
+"""
+    return message
+
+
+async def send_notification(bot, chat_id: int, model: str, run_datetime: datetime,
+                            message: str | None = None):
+    """
+    Envoie une notification à un utilisateur.
+    """
+    if message is None:
+        message = render_notification(model, run_datetime)
+
+    try:
+        await _send_message(bot, chat_id, message, model, run_datetime.hour)
+        return True
+    except Exception as e:
+        await _report_send_error(bot, chat_id, model, run_datetime.hour, e)
+        return False
+
+
+def classify_send_error(error: Exception) -> str:
+    """
+    Nature d'un échec d'envoi :
+        'unreachable' : chat définitivement injoignable (bot bloqué, compte supprimé...)
+                        → utilisateur désactivé
+        'migrated'    : groupe devenu supergroupe, joignable sous error.new_chat_id
+                        → utilisateur déplacé (migrate_chat) puis nouvel envoi
+        'rejected'    : message refusé par Telegram (Markdown invalide...) → pas de nouvel essai
+        'transient'   : réseau, timeout, erreur serveur → nouvel essai
+    """
+    if isinstance(error, ChatMigrated):
+        return "migrated" if error.new_chat_id else "transient"
+    if isinstance(error, Forbidden):
+        return "unreachable"
+    if isinstance(error, BadRequest):
+        text = str(error).lower()
+        if any(reason in text for reason in UNREACHABLE_BAD_REQUESTS):
+            return "unreachable"
+        return "rejected"
+    return "transient"
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Délai imposé par Telegram (int ou timedelta selon la version de la lib)"""
+    if isinstance(error.retry_after, timedelta):
+        return error.retry_after.total_seconds()
+    return float(error.retry_after)
+
+
+async def _send_message(bot, chat_id: int, message: str, model: str, run_hour: int):
+    """Envoie le texte d'une notification (exceptions de l'API propagées)"""
+    await bot.send_message(
+        chat_id=chat_id,
+        text=message,
+        parse_mode="Markdown",
+        disable_web_page_preview=True
+    )
+    logger.debug(f"Notification envoyée à {chat_id}: {model} {run_hour}h")
+
+
+async def _report_send_error(bot, chat_id: int, model: str, run_hour: int, error: Exception) -> str:
+    """
+    Journalise un échec d'envoi et alerte l'admin, sauf chat injoignable ou
+    migré (traités par l'appelant).
+
+    Returns:
+        Nature de l'échec (voir classify_send_error)
+    """
+    kind = classify_send_error(error)
+    if kind == "unreachable":
+        logger.info(f"🚫 Chat {chat_id} injoignable : {error}")
+        return kind
+    if kind == "migrated":
+        logger.info(f"🔀 Chat {chat_id} migré vers {error.new_chat_id}")
+        return kind
+
+    logger.error(f"Erreur envoi notification à {chat_id}: {error}")
+
+    # V1.2: Notifier admin en cas d'échec critique
+    from admin import send_admin_notification
+    try:
+        await send_admin_notification(
+            bot,
+            f"❌ **Échec notification utilisateur**\n\n"
+            f"User: `{chat_id}`\n"
+            f"Modèle: {model} {run_hour:02d}h\n"
+            f"Erreur: `{str(error)[:100]}`",
+            error_type=f"notification_{kind}"
+        )
+    except:
+        pass  # Éviter boucle infinie si admin notif échoue aussi
+
+    return kind
+
+
+async def _deliver_outbox_row(bot, row: tuple, message: str, model: str, run_hour: int) -> dict:
+    """
+    Envoie une ligne de l'outbox et retourne son résultat pour record_outbox_results.
+    """
+    row_id, chat_id, attempts = row
+    try:
+        await _send_message(bot, chat_id, message, model, run_hour)
+        return {"id": row_id, "outcome": "sent"}
+
+    except RetryAfter as e:
+        # Flood control : tout le fan-out se met en pause, l'envoi est reporté sans pénalité
+        delay = retry_after_seconds(e)
+        fanout_engine.bucket.pause(delay)
+        logger.warning(f"⏸️ RetryAfter {delay:.0f} s (envoi à {chat_id} reporté)")
+        return {"id": row_id, "outcome": "defer", "next_ts": int(clock.now().timestamp() + delay), "error": str(e)[:200]}
+
+    except Exception as e:
+        kind = await _report_send_error(bot, chat_id, model, run_hour, e)
+        if kind == "unreachable":
+            # Le chat sera désactivé après l'écriture du lot
+            return {"id": row_id, "chat_id": chat_id, "outcome": "failed",
+                    "unreachable": True, "error": str(e)[:200]}
+        if kind == "migrated":
+            # Renvoyé sans pénalité une fois la ligne passée au nouveau chat_id (flush)
+            return {"id": row_id, "chat_id": chat_id, "outcome": "defer", "next_ts": int(clock.now().timestamp()),
+                    "migrated_to": e.new_chat_id, "error": str(e)[:200]}
+        if kind == "rejected":
+            return {"id": row_id, "outcome": "failed", "error": str(e)[:200]}
+        delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempts)
+        return {"id": row_id, "outcome": "retry", "next_ts": int(clock.now().timestamp() + delay), "error": str(e)[:200]}
+
+
+async def deliver_event(bot, event: dict):
+    """
+    Envoie les notifications d'un événement "run disponible" à tous les abonnés.
+
+    Les destinataires sont les lignes pending de notification_outbox (figées à la
+    détection) : une livraison interrompue reprend là où elle s'était arrêtée,
+    sans renvoyer les messages déjà enregistrés comme livrés. Les résultats sont
+    écrits par lots de OUTBOX_FLUSH_SIZE ; les échecs temporaires sont réessayés
+    avec un délai croissant, les RetryAfter après le délai imposé par Telegram.
+
+    Chaque lot d'envois est réclamé sous bail (claim_outbox_batch), comme les
+    envois joints en digest : plusieurs workers peuvent tourner sans doublon.
+
+    Users en mode digest : leurs envois pending des autres événements partent
+    dans le même message (un seul appel API pour plusieurs runs). Si les envois
+    restants ne sont dus que dans plus de DELIVERY_POLL_INTERVAL (fenêtre de
+    digest, nouvel essai), l'événement est reporté pour ne pas bloquer la file.
+
+    Les chats définitivement injoignables (voir classify_send_error) sont
+    désactivés à chaque écriture de lot ; les groupes devenus supergroupes
+    passent à leur nouveau chat_id et leurs envois repartent au tour suivant.
+
+    Returns:
+        (nombre d'envois réussis, nombre d'échecs définitifs),
+        ou None si l'événement a été reporté
+    """
+    event_id = event["id"]
+    model = event["model"]
+    run_datetime = event["run_datetime"]
+    run_hour = run_datetime.hour
+
+    message = render_notification(model, run_datetime)
+    results: list[dict] = []
+    companions: dict[int, list[tuple]] = {}
+    sent_now = 0
+    merged = 0
+    pruned = 0
+
+    async def flush():
+        nonlocal pruned
+        global pruned_chats, migrated_chats
+        batch = results[:]
+        results.clear()
+        # Lot écrit même si l'expéditeur est annulé (arrêt du fan-out) : ses envois sont partis
+        await asyncio.shield(record_outbox_results(batch))
+
+        # Après l'écriture : les lignes reportées suivent le chat sous son nouvel id
+        migrations = {result["chat_id"]: result["migrated_to"] for result in batch if result.get("migrated_to")}
+        for old_chat_id, new_chat_id in migrations.items():
+            await migrate_chat(old_chat_id, new_chat_id)
+        migrated_chats += len(migrations)
+
+        # Chats injoignables retirés des prochains fan-outs, un lot à la fois
+        unreachable = [result["chat_id"] for result in batch if result.get("unreachable")]
+        if unreachable:
+            count = await deactivate_users(unreachable)
+            pruned += count
+            pruned_chats += count
+
+    async def send(row: tuple) -> bool:
+        nonlocal sent_now, merged
+        extra = companions.get(row[1], [])
+        text = message
+        if extra:
+            text = render_digest([(model, run_datetime)] + [(m, r) for _, m, r in extra])
+
+        result = await _deliver_outbox_row(bot, row, text, model, run_hour)
+        sent_now += result["outcome"] == "sent"
+        results.append(result)
+        # Même résultat pour les runs joints au message
+        results.extend({**result, "id": companion_id} for companion_id, _, _ in extra)
+        merged += len(extra)
+        if len(results) >= OUTBOX_FLUSH_SIZE:
+            await flush()
+        return result["outcome"] == "sent"
+
+    start = time.monotonic()
+    after_id = 0
+    while True:
+        rows = await claim_outbox_batch(event_id, after_id)
+
+        if rows:
+            after_id = rows[-1][0]
+            companions = await get_digest_companions(event_id, [row[1] for row in rows])
+            try:
+                await fanout_engine.run(iter_rows(rows), send, key=lambda row: row[1])
+            finally:
+                await flush()
+            await renew_run_event_lease(event_id)
+            continue
+
+        # Plus rien de dû : attendre les envois reprogrammés, s'il en reste
+        next_ts = await next_outbox_attempt(event_id)
+        if next_ts is None:
+            break
+        if next_ts - clock.now().timestamp() > DELIVERY_POLL_INTERVAL:
+            await defer_run_event(event_id, datetime.fromtimestamp(next_ts, timezone.utc))
+            logger.info(
+                f"{model}: {sent_now} notifications envoyées, {pruned} chats injoignables désactivés, "
+                f"suite reportée à "
+                f"{datetime.fromtimestamp(next_ts, timezone.utc).strftime('%H:%M:%S')} UTC"
+            )
+            return None
+        await renew_run_event_lease(event_id)
+        await clock.sleep(max(1.0, next_ts - clock.now().timestamp()))
+        after_id = 0
+
+    counts = await count_outbox(event_id)
+    elapsed = time.monotonic() - start
+    logger.info(
+        f"{model}: {counts['sent']}/{counts['sent'] + counts['failed']} notifications envoyées "
+        f"({sent_now} dans cette passe, {merged} runs joints en digest, "
+        f"en {elapsed:.1f} s, {sent_now / elapsed if elapsed else 0:.1f} msg/s)"
+    )
+    if pruned:
+        logger.info(f"🧹 {model}: {pruned} chats injoignables désactivés")
+    return counts["sent"], counts["failed"]
+
+
+async def delivery_loop(bot):
+    """
+    Boucle du worker de livraison.
+
+    Traite les événements un par un, dans l'ordre de détection : la file
+    absorbe les pics (backpressure) sans jamais ralentir la détection.
+    Un événement dont le worker meurt en cours de livraison est repris
+    après expiration de son bail (voir claim_next_run_event).
+    """
+    global _wakeup
+    _wakeup = asyncio.Event()
+
+    logger.info("📬 Worker de livraison démarré")
+
+    while True:
+        try:
+            event = await claim_next_run_event()
+        except Exception as e:
+            logger.error(f"Erreur DB claim_next_run_event: {e}")
+            event = None
+
+        if event is None:
+            # File vide : attendre un réveil (détection in-process) ou le prochain poll
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=DELIVERY_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        model = event["model"]
+        logger.info(f"📬 Livraison {model} {event['run_datetime']} (tentative {event['attempts']})")
+
+        try:
+            delivered = await deliver_event(bot, event)
+            if delivered is not None:
+                await complete_run_event(event["id"], *delivered)
+        except Exception as e:
+            # L'événement reste "processing" et sera repris à l'expiration du bail
+            logger.error(f"{model}: Erreur livraison événement {event['id']}: {e}")
+
+            from admin import send_admin_notification
+            try:
+                await send_admin_notification(
+                    bot,
+                    f"❌ **Erreur livraison**\n\n"
+                    f"Modèle: {model}\n"
+                    f"Run: {event['run_datetime'].strftime('%Y-%m-%d %H:00 UTC')}\n"
+                    f"Erreur: `{str(e)[:150]}`",
+                    error_type="delivery_error"
+                )
+            except:
+                pass
+
+            await asyncio.sleep(DELIVERY_POLL_INTERVAL)
+
+
+def main():
+    """Point d'entrée du worker de livraison en process séparé"""
+    from telegram import Bot
+    from database import init_database
+    from transport import build_request
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+        stream=sys.stdout
+    )
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if not BOT_TOKEN:
+        print("❌ TELEGRAM_BOT_TOKEN non défini")
+        return
+
+    init_database()
+
+    async def run():
+        # Pool dimensionné pour le fan-out (PTB 21 : une seule connexion par défaut)
+        async with Bot(BOT_TOKEN, request=build_request("bulk")) as bot:
+            await delivery_loop(bot)
+
+    print("📬 Worker de livraison démarré")
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
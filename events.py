@@ -0,0 +1,94 @@
+"""
+Bus d'événements asynchrone in-process
+La détection publie des événements typés (RunDetected), les abonnés
+(livraison, stats, cache, métriques...) réagissent en parallèle.
+"""
+import logging
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RunDetected:
+    """Un nouveau run vient d'être détecté comme disponible."""
+    model: str
+    run_datetime: datetime
+    detected_at: datetime
+
+
+class EventBus:
+    """
+    Pub/sub asynchrone minimaliste.
+
+    Chaque abonné tourne dans sa propre tâche : un abonné lent ou en erreur
+    ne bloque ni ne fait échouer les autres. Le temps d'exécution et les
+    échecs sont comptés par abonné.
+    """
+
+    def __init__(self):
+        # {event_type: [(name, handler), ...]}
+        self._subscribers: dict[type, list[tuple[str, callable]]] = {}
+        # {name: {"calls", "failures", "total_ms", "max_ms"}}
+        self.stats: dict[str, dict] = {}
+        # Callback async (name, event, exception) appelé en cas d'échec d'un abonné
+        self.on_error = None
+
+    def subscribe(self, event_type: type, handler, name: str | None = None):
+        """Abonne un handler async à un type d'événement."""
+        name = name or handler.__name__
+        self._subscribers.setdefault(event_type, []).append((name, handler))
+        self.stats.setdefault(name, {"calls": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+    def clear(self):
+        """Retire tous les abonnés (et remet les stats à zéro)."""
+        self._subscribers.clear()
+        self.stats.clear()
+
+    async def _run_handler(self, name: str, handler, event) -> bool:
+        start = time.perf_counter()
+        ok = True
+        try:
+            await handler(event)
+        except Exception as e:
+            ok = False
+            logger.error(f"Abonné {name} en échec sur {type(event).__name__}: {e}")
+            if self.on_error is not None:
+                try:
+                    await self.on_error(name, event, e)
+                except Exception:
+                    pass  # Ne jamais propager une erreur du hook d'erreur
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stats = self.stats[name]
+            stats["calls"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            if not ok:
+                stats["failures"] += 1
+            logger.debug(f"Abonné {name}: {elapsed_ms:.1f} ms")
+        return ok
+
+    async def publish(self, event) -> dict[str, bool]:
+        """
+        Publie un événement et attend que tous les abonnés aient terminé.
+        Les abonnés s'exécutent en parallèle.
+
+        Returns:
+            {nom_abonné: succès}
+        """
+        handlers = self._subscribers.get(type(event), [])
+        if not handlers:
+            return {}
+
+        results = await asyncio.gather(
+            *(self._run_handler(name, handler, event) for name, handler in handlers)
+        )
+        return {name: ok for (name, _), ok in zip(handlers, results)}
+
+
+# Bus partagé par le scheduler et ses abonnés
+bus = EventBus()
@@ -0,0 +1,220 @@
+"""
+Export / import en flux des tables de la base
+Fichiers CSV ou NDJSON compressés en gzip, lus et écrits par lots
+(mémoire constante quelle que soit la taille de la table).
+
+Depuis Telegram : /export et /import (admin.py)
+En ligne de commande, sur le volume Railway :
+    python export.py export logs /data/logs.csv.gz
+    python export.py import logs /data/logs.csv.gz
+"""
+import argparse
+import csv
+import gzip
+import itertools
+import json
+import logging
+import sys
+from typing import Iterator
+
+import database
+from db_metrics import instrumented
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+
+# Lignes écrites dans la base par transaction à l'import
+IMPORT_BATCH_SIZE = 1000
+
+# Tables exportables : nom → (table, colonnes)
+# id et les tables dérivées (delay_stats, subscriptions) ne sont pas exportés
+EXPORTS = {
+    "logs": ("run_availability_log",
+             ("model", "run_hour", "run_ts", "detected_ts", "delay_minutes")),
+    "daily": ("run_availability_daily",
+              ("model", "run_hour", "day_ts", "samples", "delay_sum", "delay_sumsq",
+               "delay_min", "delay_max")),
+    "users": ("users",
+              ("chat_id", "username", "active", "models_mask", "runs_mask",
+               "created_at", "last_notification")),
+}
+
+# Tables restaurables : lignes déjà présentes ignorées (INSERT OR IGNORE), ainsi
+# que les jours déjà comptés sous l'autre forme. Un log brut plus vieux que
+# RAW_LOG_RETENTION_DAYS a été agrégé dans run_availability_daily puis supprimé :
+# le réinsérer le compterait deux fois au rollup suivant (et inversement pour
+# un agrégat dont les logs bruts sont encore là). Au plus un log par
+# (modèle, run, jour) : un agrégat existant couvre tout le jour.
+IMPORTS = {
+    "logs": """
+        NOT EXISTS (
+            SELECT 1 FROM run_availability_daily
+            WHERE model = :model AND run_hour = :run_hour
+              AND day_ts = CAST(:run_ts AS INTEGER) - CAST(:run_ts AS INTEGER) % :day
+        )
+    """,
+    "daily": """
+        NOT EXISTS (
+            SELECT 1 FROM run_availability_log
+            WHERE model = :model AND run_hour = :run_hour
+              AND run_ts >= CAST(:day_ts AS INTEGER) AND run_ts < CAST(:day_ts AS INTEGER) + :day
+        )
+    """,
+}
+
+
+def detect_format(filename: str) -> str:
+    """Format d'après l'extension (logs.csv.gz, users.ndjson.gz...)"""
+    for fmt in FORMATS:
+        if f".{fmt}" in filename.lower():
+            return fmt
+    raise ValueError(f"Format inconnu pour {filename} (attendu : .csv.gz ou .ndjson.gz)")
+
+
+def _iter_rows(table: str, columns: tuple) -> Iterator[tuple]:
+    """Lignes d'une table en tuples, lues par lots de STREAM_CHUNK_SIZE"""
+    with database.reader() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+        try:
+            while rows := cursor.fetchmany(database.STREAM_CHUNK_SIZE):
+                yield from rows
+        finally:
+            cursor.close()
+
+
+# ============ EXPORT ============
+
+@instrumented
+def export_table(name: str, target, fmt: str = "csv") -> int:
+    """
+    Exporte une table en gzip, ligne par ligne.
+
+    Args:
+        name: Clé de EXPORTS ('logs', 'daily', 'users')
+        target: Chemin ou fichier binaire ouvert en écriture
+        fmt: 'csv' (avec en-tête) ou 'ndjson' (un objet JSON par ligne)
+
+    Returns:
+        Nombre de lignes exportées
+    """
+    if name not in EXPORTS:
+        raise ValueError(f"Table inconnue : {name} (disponibles : {', '.join(EXPORTS)})")
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt} (disponibles : {', '.join(FORMATS)})")
+
+    table, columns = EXPORTS[name]
+    count = 0
+
+    with gzip.open(target, "wt", encoding="utf-8", newline="") as out:
+        if fmt == "csv":
+            writer = csv.writer(out)
+            writer.writerow(columns)
+            for row in _iter_rows(table, columns):
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in _iter_rows(table, columns):
+                out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n")
+                count += 1
+
+    logger.info(f"📦 Export {name} ({fmt}) : {count} lignes")
+    return count
+
+
+# ============ IMPORT ============
+
+def _read_records(source, fmt: str):
+    """Enregistrements (dicts) d'un fichier gzip, lus en flux"""
+    with gzip.open(source, "rt", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            for record in csv.DictReader(f):
+                # CSV : cellule vide = NULL
+                yield {key: (value if value != "" else None) for key, value in record.items()}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+@instrumented
+def import_table(name: str, source, fmt: str = "csv") -> int:
+    """
+    Importe un export de logs ou d'agrégats journaliers, par lots de
+    IMPORT_BATCH_SIZE (une transaction par lot), puis reconstruit delay_stats.
+    Les lignes déjà présentes (même modèle/run/date) et les jours déjà comptés
+    sous l'autre forme (logs agrégés par la rétention, voir IMPORTS) sont ignorés.
+
+    Args:
+        name: 'logs' ou 'daily'
+        source: Chemin ou fichier binaire ouvert en lecture
+        fmt: 'csv' ou 'ndjson'
+
+    Returns:
+        Nombre de lignes insérées
+    """
+    if name not in IMPORTS:
+        raise ValueError(f"Import impossible pour {name} (possibles : {', '.join(IMPORTS)})")
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt} (disponibles : {', '.join(FORMATS)})")
+
+    table, columns = EXPORTS[name]
+    sql = (
+        f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+        f"SELECT {', '.join(':' + column for column in columns)} "
+        f"WHERE {IMPORTS[name]}"
+    )
+
+    records = _read_records(source, fmt)
+    inserted = 0
+    read = 0
+    while batch := list(itertools.islice(records, IMPORT_BATCH_SIZE)):
+        try:
+            rows = [
+                {column: record[column] for column in columns} | {"day": database.DAY_SECONDS}
+                for record in batch
+            ]
+        except KeyError as e:
+            raise ValueError(f"Colonne manquante dans le fichier : {e}") from None
+
+        read += len(rows)
+
+        with database.writer() as conn:
+            before = conn.total_changes
+            conn.executemany(sql, rows)
+            inserted += conn.total_changes - before
+
+    database.rebuild_delay_stats()
+    logger.info(f"📥 Import {name} ({fmt}) : {inserted} lignes insérées, {read - inserted} ignorées")
+    return inserted
+
+
+# ============ LIGNE DE COMMANDE ============
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import des tables Wind Bot (gzip)")
+    parser.add_argument("action", choices=("export", "import"))
+    parser.add_argument("table", choices=tuple(EXPORTS))
+    parser.add_argument("path", help="Fichier .csv.gz ou .ndjson.gz")
+    parser.add_argument("--format", choices=FORMATS, help="Par défaut : d'après l'extension")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    try:
+        fmt = args.format or detect_format(args.path)
+        database.init_database()
+        if args.action == "export":
+            count = export_table(args.table, args.path, fmt)
+        else:
+            count = import_table(args.table, args.path, fmt)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"{args.action} {args.table} : {count} lignes")
+
+
+if __name__ == "__main__":
+    main()
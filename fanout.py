@@ -0,0 +1,160 @@
+"""
+Moteur de fan-out des notifications
+N expéditeurs concurrents se partagent un seau à jetons global (limite
+Telegram ~30 msg/s tous chats confondus) et un limiteur par chat
+(~1 msg/s) : le débit d'un fan-out approche la limite de la plateforme
+au lieu d'envoyer un message toutes les 50 ms en série.
+"""
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Limites Telegram (bots) : ~30 messages/s au total, ~1 message/s par chat
+# Réserve d'un seul jeton : sur toute fenêtre d'une seconde, au plus
+# GLOBAL_RATE + GLOBAL_BURST envois (une réserve pleine doublerait la
+# première seconde d'un fan-out)
+GLOBAL_RATE = 30
+GLOBAL_BURST = 1
+PER_CHAT_INTERVAL = 1.0
+
+# Expéditeurs simultanés : couvre la latence d'un appel API (~100-300 ms) à 30 msg/s
+FANOUT_CONCURRENCY = 16
+
+# Au-delà, les entrées expirées du limiteur par chat sont purgées
+CHAT_LIMITER_PRUNE_SIZE = 10_000
+
+
+class TokenBucket:
+    """Seau à jetons asynchrone : `rate` jetons/s, au plus `capacity` en réserve."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # Les attentes sont servies dans l'ordre d'arrivée
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Suspend la distribution (RetryAfter de Telegram), sans rafale à la reprise."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        """Attend puis consomme un jeton."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatLimiter:
+    """Intervalle minimum entre deux messages à un même chat, partagé entre fan-outs."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_slot: dict[int, float] = {}
+
+    async def wait(self, chat_id: int):
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(chat_id, 0.0))
+        self._next_slot[chat_id] = slot + self.interval
+
+        if len(self._next_slot) > CHAT_LIMITER_PRUNE_SIZE:
+            self._next_slot = {cid: t for cid, t in self._next_slot.items() if t > now}
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def iter_rows(rows: list):
+    """Itérable async sur des lignes déjà chargées (lot de l'outbox, rappels dus), pour FanoutEngine.run"""
+    for row in rows:
+        yield row
+
+
+class FanoutEngine:
+    """
+    Envoi concurrent d'un message à une liste de chats.
+
+    Les chat_ids sont consommés en flux via une file bornée (la liste des
+    abonnés n'est jamais chargée entière) par `concurrency` expéditeurs.
+    Chaque envoi attend d'abord son créneau par chat, puis un jeton global.
+    """
+
+    def __init__(self, rate: float = GLOBAL_RATE, burst: float = GLOBAL_BURST,
+                 concurrency: int = FANOUT_CONCURRENCY,
+                 per_chat_interval: float = PER_CHAT_INTERVAL):
+        self.bucket = TokenBucket(rate, burst)
+        self.chats = ChatLimiter(per_chat_interval)
+        self.concurrency = concurrency
+        self.last_report: dict | None = None
+
+    def sharing_limits(self) -> "FanoutEngine":
+        """
+        Moteur distinct (son propre last_report) partageant le seau global et
+        le limiteur par chat de celui-ci : les limites Telegram valent pour
+        tout le process.
+        """
+        engine = FanoutEngine(concurrency=self.concurrency)
+        engine.bucket = self.bucket
+        engine.chats = self.chats
+        return engine
+
+    async def run(self, chat_ids, send, key=None) -> dict:
+        """
+        Args:
+            chat_ids: itérable async des destinataires
+            send: coroutine send(chat_id) -> bool (True = envoyé)
+            key: chat_id d'un élément de chat_ids s'il n'en est pas un (ligne d'outbox...)
+
+        Returns:
+            {'sent': int, 'failed': int, 'elapsed': float (s), 'rate': float (msg/s)}
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        report = {"sent": 0, "failed": 0}
+
+        async def sender():
+            while (chat_id := await queue.get()) is not None:
+                await self.chats.wait(key(chat_id) if key else chat_id)
+                await self.bucket.acquire()
+                try:
+                    success = await send(chat_id)
+                except Exception as e:
+                    logger.error(f"Erreur envoi à {chat_id}: {e}")
+                    success = False
+                report["sent" if success else "failed"] += 1
+
+        start = time.monotonic()
+        senders = [asyncio.create_task(sender()) for _ in range(self.concurrency)]
+        try:
+            async for chat_id in chat_ids:
+                await queue.put(chat_id)
+            for _ in senders:
+                await queue.put(None)
+            await asyncio.gather(*senders)
+        finally:
+            for task in senders:
+                task.cancel()
+
+        elapsed = time.monotonic() - start
+        total = report["sent"] + report["failed"]
+        report["elapsed"] = elapsed
+        report["rate"] = total / elapsed if elapsed > 0 else 0.0
+        self.last_report = report
+        return report
@@ -0,0 +1,319 @@
+"""
+Rappels avant la disponibilité prévue des runs
+"Préviens-moi 10 min avant AROME 12h" : chaque rappel de la table reminders
+est programmé dans une roue temporelle (timer_wheel.py) à ETA - délai,
+l'ETA venant de get_next_run_eta (repli : FALLBACK_DELAYS).
+
+La roue est reconstruite depuis la base au démarrage (last_run_ts évite un
+double rappel) ; les rappels échus partent par le moteur de fan-out de
+delivery.py, avec les mêmes limites de débit que les notifications.
+Un run détecté avant l'heure annule ses rappels, reprogrammés au run suivant.
+Commande : /rappel (bot.py)
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from telegram.error import RetryAfter
+
+import clock
+import delivery
+from config import FALLBACK_DELAYS
+from database import to_epoch, from_epoch
+from delivery import classify_send_error, retry_after_seconds
+from fanout import iter_rows
+from async_db import (
+    get_next_run_eta,
+    get_last_run,
+    iter_reminders,
+    get_active_chat_ids,
+    get_user_reminders,
+    mark_reminders_fired,
+    deactivate_users,
+    migrate_chat,
+)
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+# Période d'avance de la roue (s) : précision des rappels
+REMINDER_TICK_SECONDS = 1
+
+DEFAULT_LEAD_MINUTES = 10
+MAX_LEAD_MINUTES = 180
+
+# Délai supposé d'un couple (modèle, run) absent de FALLBACK_DELAYS
+DEFAULT_FALLBACK_DELAY = 300
+
+# Rapports distincts de ceux des notifications (/stats), limites de débit partagées
+fanout_engine = delivery.fanout_engine.sharing_limits()
+
+
+def render_reminder(model: str, run_hour: int, eta: datetime, lead_minutes: int) -> str:
+    """Texte d'un rappel (ETA en heure de Paris)"""
+    eta_paris = eta.astimezone(ZoneInfo("Europe/Paris"))
+    return (
+        f"⏰ **Rappel : {model} {run_hour:02d}h UTC**\n\n"
+        f"Sortie attendue vers **{eta_paris.strftime('%H:%M')}** (heure de Paris), "
+        f"dans ~{lead_minutes} min.\n"
+        f"Tu recevras la notification dès qu'il sera disponible."
+    )
+
+
+class ReminderService:
+    """
+    Rappels programmés du process du bot.
+
+    Une minuterie par rappel (clé = id en base), payload (run_ts, eta_ts) ;
+    _by_run regroupe les ids par (modèle, run_ts) pour annuler en O(1) par
+    rappel ceux d'un run détecté avant l'heure.
+    """
+
+    def __init__(self):
+        self.wheel: TimerWheel | None = None
+        # {id: (chat_id, model, run_hour, lead_minutes)}
+        self._reminders: dict[int, tuple[int, str, int, int]] = {}
+        # {(model, run_ts): {id, ...}} et {id: run_ts} des minuteries en place
+        self._by_run: dict[tuple[str, int], set[int]] = {}
+        self._run_of: dict[int, int] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.stats = {"sent": 0, "skipped": 0, "failed": 0}
+
+    def __len__(self) -> int:
+        return len(self.wheel) if self.wheel is not None else 0
+
+    # ----- Calcul des échéances -----
+
+    async def _candidates(self, model: str, run_hour: int) -> list[tuple[int, float]]:
+        """(run_ts, eta_ts) des runs (hier, aujourd'hui, demain) pas encore sortis et attendus à venir"""
+        now = clock.now()
+        last = await get_last_run(model)
+        today = now.replace(hour=run_hour, minute=0, second=0, microsecond=0)
+
+        candidates = []
+        for days in (-1, 0, 1):
+            run_dt = today + timedelta(days=days)
+            if last is not None and run_dt <= last:
+                continue
+            eta = await get_next_run_eta(model, run_hour, run_dt)
+            if eta is None:
+                delay = FALLBACK_DELAYS.get(model, {}).get(run_hour, DEFAULT_FALLBACK_DELAY)
+                eta = run_dt + timedelta(minutes=delay)
+            if eta > now:
+                candidates.append((to_epoch(run_dt), eta.timestamp()))
+        return candidates
+
+    def _unindex(self, reminder_id: int):
+        run_ts = self._run_of.pop(reminder_id, None)
+        if run_ts is not None:
+            model = self._reminders[reminder_id][1]
+            ids = self._by_run.get((model, run_ts))
+            if ids is not None:
+                ids.discard(reminder_id)
+                if not ids:
+                    del self._by_run[(model, run_ts)]
+
+    def _schedule(self, reminder_id: int, last_run_ts: int, candidates: list[tuple[int, float]]) -> bool:
+        """Programme un rappel connu de _reminders pour le premier run après last_run_ts"""
+        self._unindex(reminder_id)
+        _, model, _, lead_minutes = self._reminders[reminder_id]
+
+        for run_ts, eta_ts in candidates:
+            if run_ts > last_run_ts:
+                break
+        else:
+            self.wheel.cancel(reminder_id)
+            return False
+
+        fire_at = max(eta_ts - lead_minutes * 60, clock.now().timestamp())
+        self.wheel.schedule(reminder_id, fire_at, (run_ts, eta_ts))
+        self._by_run.setdefault((model, run_ts), set()).add(reminder_id)
+        self._run_of[reminder_id] = run_ts
+        return True
+
+    # ----- API -----
+
+    async def load(self):
+        """(Re)construit la roue depuis la table reminders"""
+        start = time.perf_counter()
+        self.wheel = TimerWheel(clock.now().timestamp())
+        self._reminders.clear()
+        self._by_run.clear()
+        self._run_of.clear()
+
+        # Échéances calculées une fois par couple (modèle, run), pas par rappel
+        candidates: dict[tuple[str, int], list] = {}
+        async for reminder_id, chat_id, model, run_hour, lead_minutes, last_run_ts in iter_reminders():
+            if (model, run_hour) not in candidates:
+                candidates[(model, run_hour)] = await self._candidates(model, run_hour)
+            self._reminders[reminder_id] = (chat_id, model, run_hour, lead_minutes)
+            self._schedule(reminder_id, last_run_ts, candidates[(model, run_hour)])
+
+        logger.info(
+            f"⏰ {len(self.wheel)} rappels programmés "
+            f"({(time.perf_counter() - start) * 1000:.0f} ms)"
+        )
+
+    async def add(self, reminder: dict):
+        """Programme un rappel créé ou modifié par /rappel"""
+        if self.wheel is None:
+            return  # Chargé depuis la base au démarrage de la boucle
+        reminder_id = reminder["id"]
+        self._reminders[reminder_id] = (
+            reminder["chat_id"], reminder["model"], reminder["run_hour"], reminder["lead_minutes"]
+        )
+        candidates = await self._candidates(reminder["model"], reminder["run_hour"])
+        self._schedule(reminder_id, reminder["last_run_ts"], candidates)
+
+    def remove(self, reminder_id: int):
+        """Annule un rappel supprimé par /rappel"""
+        if self.wheel is None or reminder_id not in self._reminders:
+            return
+        self._unindex(reminder_id)
+        self.wheel.cancel(reminder_id)
+        del self._reminders[reminder_id]
+
+    def next_fire(self, reminder_id: int) -> datetime | None:
+        """Prochain envoi programmé d'un rappel, None s'il n'est pas en roue"""
+        if self.wheel is None:
+            return None
+        when = self.wheel.deadline(reminder_id)
+        return from_epoch(int(when)) if when is not None else None
+
+    async def on_run_detected(self, event):
+        """Abonné RunDetected : les rappels d'un run déjà sorti passent au run suivant"""
+        if self.wheel is None:
+            return
+        run_ts = to_epoch(event.run_datetime)
+        ids = list(self._by_run.get((event.model, run_ts), ()))
+        if not ids:
+            return
+
+        candidates: dict[int, list] = {}
+        for reminder_id in ids:
+            run_hour = self._reminders[reminder_id][2]
+            if run_hour not in candidates:
+                candidates[run_hour] = await self._candidates(event.model, run_hour)
+            self._schedule(reminder_id, run_ts, candidates[run_hour])
+        logger.info(f"⏰ {event.model}: {len(ids)} rappels devenus inutiles reprogrammés")
+
+    # ----- Envoi -----
+
+    async def _fire(self, bot, due: list):
+        """Envoie les rappels échus, groupés par run, puis les reprogramme au run suivant"""
+        groups: dict[tuple[str, int], list] = {}
+        for reminder_id, _, (run_ts, eta_ts) in due:
+            self._unindex(reminder_id)
+            # Définition figée : le rappel peut être modifié ou supprimé pendant le fan-out
+            chat_id, model, run_hour, lead_minutes = self._reminders[reminder_id]
+            groups.setdefault((model, run_ts), []).append(
+                (reminder_id, chat_id, run_hour, lead_minutes, eta_ts)
+            )
+
+        for (model, run_ts), items in groups.items():
+            try:
+                await self._fire_run(bot, model, run_ts, items)
+            except Exception as e:
+                logger.error(f"Erreur envoi des rappels {model} {run_ts}: {e}")
+
+    async def _fire_run(self, bot, model: str, run_ts: int, items: list[tuple]):
+        """
+        Rappels échus d'un même run.
+        
+        Args:
+            items: [(id, chat_id, run_hour, lead_minutes, eta_ts), ...]
+        """
+        last = await get_last_run(model)
+        already_out = last is not None and to_epoch(last) >= run_ts
+
+        active = await get_active_chat_ids([item[1] for item in items])
+        rows = [item for item in items if item[1] in active]
+        unreachable = set()
+        # {ancien chat_id: nouveau} des groupes devenus supergroupes
+        migrated: dict[int, int] = {}
+
+        async def send(row: tuple) -> bool:
+            _, chat_id, run_hour, lead_minutes, eta_ts = row
+            try:
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=render_reminder(model, run_hour, from_epoch(int(eta_ts)), lead_minutes),
+                    parse_mode="Markdown"
+                )
+                return True
+            except RetryAfter as e:
+                # Rappel daté : pas de nouvel essai, mais tout le fan-out ralentit
+                fanout_engine.bucket.pause(retry_after_seconds(e))
+                return False
+            except Exception as e:
+                kind = classify_send_error(e)
+                if kind == "unreachable":
+                    unreachable.add(chat_id)
+                elif kind == "migrated":
+                    migrated[chat_id] = e.new_chat_id
+                logger.info(f"Rappel à {chat_id} non envoyé : {e}")
+                return False
+
+        if already_out or not rows:
+            self.stats["skipped"] += len(items)
+        else:
+            report = await fanout_engine.run(iter_rows(rows), send, key=lambda row: row[1])
+
+            # Groupes migrés : rappels déplacés avec l'utilisateur, renvoyés au nouveau chat_id
+            if migrated:
+                for old_chat_id, new_chat_id in migrated.items():
+                    await migrate_chat(old_chat_id, new_chat_id)
+                retry = [(item[0], migrated[item[1]], *item[2:]) for item in rows if item[1] in migrated]
+                retried = await fanout_engine.run(iter_rows(retry), send, key=lambda row: row[1])
+                report = {"sent": report["sent"] + retried["sent"], "failed": report["failed"] - retried["sent"]}
+
+            self.stats["sent"] += report["sent"]
+            self.stats["failed"] += report["failed"]
+            self.stats["skipped"] += len(items) - len(rows)
+            logger.info(
+                f"⏰ {model} {from_epoch(run_ts).strftime('%d/%m %Hh')}: "
+                f"{report['sent']}/{len(rows)} rappels envoyés"
+            )
+
+        await mark_reminders_fired([item[0] for item in items], run_ts)
+        if unreachable:
+            await deactivate_users(list(unreachable))
+
+        # Run suivant ; les users inactifs sont retirés de la roue (rechargés au /start)
+        candidates: dict[int, list] = {}
+        for reminder_id, chat_id, run_hour, _, _ in items:
+            if reminder_id not in self._reminders or reminder_id in self._run_of:
+                continue  # Supprimé ou déjà reprogrammé par /rappel entre-temps
+            if chat_id not in active or chat_id in unreachable or chat_id in migrated:
+                self.remove(reminder_id)
+                continue
+            if run_hour not in candidates:
+                candidates[run_hour] = await self._candidates(model, run_hour)
+            self._schedule(reminder_id, run_ts, candidates[run_hour])
+
+        # Rappels des chats migrés relus sous leur nouvel id (fusionnés s'il existait déjà)
+        for new_chat_id in set(migrated.values()):
+            for reminder in await get_user_reminders(new_chat_id):
+                await self.add(reminder)
+
+    async def run(self, bot):
+        """Boucle des rappels : avance la roue chaque seconde, envoie les échus en tâche de fond"""
+        await self.load()
+
+        while True:
+            try:
+                due = self.wheel.advance(clock.now().timestamp())
+                if due:
+                    # Un gros lot (fan-out limité à ~30 msg/s) ne retarde pas les suivants
+                    task = asyncio.create_task(self._fire(bot, due))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            except Exception as e:
+                logger.error(f"Erreur boucle des rappels: {e}")
+
+            await clock.sleep(REMINDER_TICK_SECONDS)
+
+
+reminder_service = ReminderService()
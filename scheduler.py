@@ -2,100 +2,57 @@
 Scheduler pour la vérification périodique des runs météo
 Wind Bot - V1.1 avec logging des disponibilités
 V1.2 avec notifications admin pour erreurs critiques
+V1.3 détection seule : les notifications passent par la file run_events (delivery.py)
+V1.3 effets de bord d'une détection découplés via le bus d'événements (events.py)
 """
 import logging
 import asyncio
-from datetime import datetime, timezone
 
-from config import MODELS
-from database import (
-    get_last_run,
+import clock
+import db_metrics
+from config import MODELS, DELIVERY_MODE
+from async_db import (
     save_last_run,
-    is_new_run,
-    get_subscribed_users,
+    enqueue_run_event,
     log_run_availability,  # V1.1
-    cleanup_old_logs,       # V1.1
+    run_retention,
 )
-from checker import check_model_availability, get_expected_run
+# Miroir mémoire de last_runs : appels directs, sans accès disque
+from database import is_new_run, claim_run, release_run
+from checker import check_model_availability, get_expected_run, set_cached_run
+from delivery import delivery_loop, wake_delivery_worker
+from events import bus, RunDetected
+from reminders import reminder_service
 
 logger = logging.getLogger(__name__)
 
 # Intervalle entre les vérifications (en secondes)
 CHECK_INTERVAL = 15 * 60  # 15 minutes
 
+# Métriques de détection : {model: {"detections", "last_run", "last_delay_minutes"}}
+detection_metrics: dict[str, dict] = {}
 
-def should_cleanup():
-    """
-    Détermine si on doit faire le cleanup des logs.
-    Retourne True une fois par an (1er janvier à 3h du matin UTC).
-    """
-    now = datetime.now(timezone.utc)
-    return now.month == 1 and now.day == 1 and now.hour == 3 and now.minute < 15
+
+# Rétention des logs : une passe par jour, après RETENTION_HOUR UTC
+RETENTION_HOUR = 3
+_last_retention_day = None
 
 
-async def send_notification(bot, chat_id: int, model: str, run_datetime: datetime):
+def should_run_retention() -> bool:
     """
-    Envoie une notification à un utilisateur.
+    Détermine si la passe de rétention du jour reste à faire.
+    Le travail étant incrémental, la rejouer après un redémarrage est sans risque.
     """
-    emoji_map = {
-        "AROME": "⛵",
-        "ARPEGE": "🌍",
-        "GFS": "🌎",
-        "ECMWF": "🇪🇺",
-    }
-    
-    emoji = emoji_map.get(model, "🌐")
-    run_hour = run_datetime.hour
-    run_date = run_datetime.strftime("%d/%m/%Y")
-    now = datetime.now(timezone.utc)
-    
-    message = f"""
-{emoji} **Nouveau run disponible !**
-
-📊 **Modèle :** {model}
-⏰ **Run :** {run_hour:02d}h UTC
-📅 **Date :** {run_date}
-🕐 **Notifié à :** {now.strftime("%H:%M")} UTC
-
-🔗 **Liens :**
-• [Meteociel](https://www.meteociel.fr/modeles/)
-• [Windy](https://www.windy.com/)
-"""
-    
-    try:
-        await bot.send_message(
-            chat_id=chat_id,
-            text=message,
-            parse_mode="Markdown",
-            disable_web_page_preview=True
-        )
-        logger.info(f"Notification envoyée à {chat_id}: {model} {run_hour}h")
-        return True
-    except Exception as e:
-        logger.error(f"Erreur envoi notification à {chat_id}: {e}")
-        
-        # V1.2: Notifier admin en cas d'échec critique
-        from bot import send_admin_notification
-        try:
-            await send_admin_notification(
-                bot,
-                f"❌ **Échec notification utilisateur**\n\n"
-                f"User: `{chat_id}`\n"
-                f"Modèle: {model} {run_hour:02d}h\n"
-                f"Erreur: `{str(e)[:100]}`",
-                error_type="notification_failure"
-            )
-        except:
-            pass  # Éviter boucle infinie si admin notif échoue aussi
-        
-        return False
+    now = clock.now()
+    return now.hour >= RETENTION_HOUR and now.date() != _last_retention_day
 
 
 async def check_and_notify(bot, model: str):
     """
-    Vérifie un modèle et notifie les utilisateurs si nouveau run.
+    Vérifie un modèle et publie un événement RunDetected si nouveau run.
+    L'envoi aux utilisateurs est fait par le worker de livraison (delivery.py).
     """
-    current_time = datetime.now(timezone.utc)
+    current_time = clock.now()
     
     # Calculer le run attendu
     try:
@@ -162,55 +119,27 @@ async def check_and_notify(bot, model: str):
         logger.debug(f"{model}: run {expected_run} pas encore disponible")
         return
     
+    # Réserver le run (compare-and-set) : un cycle concurrent ne peut pas le notifier aussi
+    if not claim_run(model, expected_run):
+        logger.debug(f"{model}: run {expected_run} déjà réservé")
+        return
+    
     # Nouveau run disponible !
-    detected_at = datetime.now(timezone.utc)  # V1.1: timestamp de détection
+    detected_at = clock.now()  # V1.1: timestamp de détection
     
     logger.info(f"✅ {model}: nouveau run {expected_run} détecté !")
     
-    # Récupérer les utilisateurs abonnés
-    run_hour = expected_run.hour
+    # Publier l'événement : livraison, stats, cache, métriques en parallèle
+    results = await bus.publish(RunDetected(model, expected_run, detected_at))
     
-    try:
-        subscribed_users = get_subscribed_users(model, run_hour)
-    except Exception as e:
-        logger.error(f"{model}: Erreur DB get_subscribed_users: {e}")
-        
-        # V1.2: Notifier admin pour erreur DB
-        from bot import send_admin_notification
-        await send_admin_notification(
-            bot,
-            f"❌ **Erreur base de données**\n\n"
-            f"Fonction: `get_subscribed_users`\n"
-            f"Modèle: {model}\n"
-            f"Erreur: `{str(e)[:150]}`",
-            error_type="db_error"
-        )
+    # Sans mise en file réussie, ne pas marquer le run : il sera re-détecté
+    if not results.get("delivery_queue"):
+        release_run(model, expected_run)
         return
     
-    logger.info(f"{model}: {len(subscribed_users)} utilisateurs à notifier")
-    
-    # Envoyer les notifications
-    success_count = 0
-    for chat_id in subscribed_users:
-        success = await send_notification(bot, chat_id, model, expected_run)
-        if success:
-            success_count += 1
-        
-        # Rate limiting Telegram (30 msg/sec max)
-        await asyncio.sleep(0.05)
-    
-    logger.info(f"{model}: {success_count}/{len(subscribed_users)} notifications envoyées")
-    
-    # V1.1: Logger la disponibilité du run
-    try:
-        log_run_availability(model, expected_run, detected_at)
-    except Exception as e:
-        logger.error(f"{model}: Erreur log_run_availability: {e}")
-        # Pas critique, on ne notifie pas l'admin pour ça
-    
     # Marquer le run comme notifié
     try:
-        save_last_run(model, expected_run)
+        await save_last_run(model, expected_run)
     except Exception as e:
         logger.error(f"{model}: Erreur save_last_run: {e}")
         
@@ -227,13 +156,74 @@ async def check_and_notify(bot, model: str):
         )
 
 
-async def check_all_models(bot):
+# ============ ABONNÉS RunDetected ============
+
+async def on_run_detected_enqueue(event: RunDetected):
+    """Met l'événement en file pour le worker de livraison."""
+    if await enqueue_run_event(event.model, event.run_datetime, event.detected_at):
+        wake_delivery_worker()
+
+
+async def on_run_detected_log(event: RunDetected):
+    """V1.1: Logge la disponibilité du run (stats de délais)."""
+    await log_run_availability(event.model, event.run_datetime, event.detected_at)
+
+
+async def on_run_detected_cache(event: RunDetected):
+    """Rafraîchit le cache des runs pour /derniers."""
+    set_cached_run(event.model, event.run_datetime)
+
+
+async def on_run_detected_metrics(event: RunDetected):
+    """Met à jour les compteurs de détection."""
+    metrics = detection_metrics.setdefault(event.model, {"detections": 0})
+    metrics["detections"] += 1
+    metrics["last_run"] = event.run_datetime
+    metrics["last_delay_minutes"] = round((event.detected_at - event.run_datetime).total_seconds() / 60)
+
+
+def setup_event_bus(bot):
+    """Branche les abonnés RunDetected et les alertes admin sur le bus."""
+    bus.clear()
+    bus.subscribe(RunDetected, on_run_detected_enqueue, name="delivery_queue")
+    bus.subscribe(RunDetected, on_run_detected_log, name="availability_log")
+    bus.subscribe(RunDetected, on_run_detected_cache, name="runs_cache")
+    bus.subscribe(RunDetected, on_run_detected_metrics, name="metrics")
+    bus.subscribe(RunDetected, reminder_service.on_run_detected, name="reminders")
+    
+    async def on_error(name: str, event, error: Exception):
+        # Le log de disponibilité n'est pas critique (cf. V1.1)
+        if name == "availability_log":
+            return
+        
+        from bot import send_admin_notification
+        await send_admin_notification(
+            bot,
+            f"❌ **Erreur abonné `{name}`**\n\n"
+            f"Modèle: {event.model}\n"
+            f"Run: {event.run_datetime.strftime('%Y-%m-%d %H:00 UTC')}\n"
+            f"Erreur: `{str(error)[:150]}`",
+            error_type=f"subscriber_{name}"
+        )
+    
+    bus.on_error = on_error
+
+
+async def check_all_models(bot, models: list[str] | None = None, on_model_done=None):
     """
-    Vérifie tous les modèles.
+    Vérifie tous les modèles (ou seulement `models`).
+    
+    Ne pas appeler directement depuis un handler : passer par submit_check()
+    qui sérialise les cycles et déduplique les demandes.
+    
+    Args:
+        on_model_done: callback async (model, done, total) appelé après chaque modèle
     """
-    logger.info("🔍 Début vérification des modèles...")
+    models = models or list(MODELS.keys())
+    logger.info(f"🔍 Début vérification des modèles ({', '.join(models)})...")
+    calls_before, queries_before = db_metrics.totals()
     
-    for model in MODELS.keys():
+    for index, model in enumerate(models, start=1):
         try:
             await check_and_notify(bot, model)
         except Exception as e:
@@ -249,19 +239,108 @@ async def check_all_models(bot):
                 error_type=f"unexpected_{model.lower()}"
             )
         
+        if on_model_done is not None:
+            try:
+                await on_model_done(model, index, len(models))
+            except Exception as e:
+                logger.debug(f"Callback progression en échec: {e}")
+        
         # Petite pause entre les modèles
-        await asyncio.sleep(1)
+        await clock.sleep(1)
     
-    # V1.1: Cleanup annuel des logs
-    if should_cleanup():
+    # Rétention quotidienne des logs (agrégation + suppression par petits lots)
+    global _last_retention_day
+    if should_run_retention():
         try:
-            deleted = cleanup_old_logs(days=365)
-            logger.info(f"🧹 Cleanup annuel effectué : {deleted} logs supprimés")
+            await run_retention()
+            _last_retention_day = clock.now().date()
         except Exception as e:
-            logger.error(f"Erreur cleanup logs: {e}")
+            logger.error(f"Erreur rétention logs: {e}")
             # Pas critique, on ne notifie pas l'admin
     
-    logger.info("✅ Fin vérification des modèles")
+    calls, queries = db_metrics.totals()
+    logger.info(
+        f"✅ Fin vérification des modèles "
+        f"({calls - calls_before} appels base, {queries - queries_before} requêtes SQL)"
+    )
+
+
+# ============ JOBS DE VÉRIFICATION ============
+
+# Un seul cycle de vérification à la fois (évite les courses sur is_new_run/save_last_run)
+_cycle_lock = asyncio.Lock()
+
+# Cycle en cours d'exécution et cycles en attente du verrou
+# Job: {"models": frozenset, "listeners": [callbacks], "done": [modèles vérifiés], "task": asyncio.Task}
+_running_job: dict | None = None
+_pending_jobs: dict[frozenset, dict] = {}
+
+
+async def _run_job(bot, job: dict):
+    """Exécute un job de vérification sous le verrou global."""
+    global _running_job
+    
+    async with _cycle_lock:
+        # À partir d'ici, plus de coalescence possible dans la file d'attente
+        _pending_jobs.pop(job["models"], None)
+        _running_job = job
+        
+        async def on_model_done(model, done, total):
+            job["done"].append(model)
+            for listener in list(job["listeners"]):
+                try:
+                    await listener(model, done, total)
+                except Exception as e:
+                    logger.debug(f"Listener progression en échec: {e}")
+        
+        try:
+            # Garder l'ordre de config.MODELS
+            models = [m for m in MODELS if m in job["models"]]
+            await check_all_models(bot, models, on_model_done=on_model_done)
+        finally:
+            _running_job = None
+
+
+def submit_check(bot, models: list[str] | None = None,
+                 on_progress=None) -> tuple[asyncio.Task, bool, list[str]]:
+    """
+    Soumet un cycle de vérification, exécuté en arrière-plan.
+    
+    La demande est fusionnée avec un cycle déjà en cours qui couvre les
+    mêmes modèles, ou avec un cycle identique en attente du verrou.
+    
+    Args:
+        models: modèles à vérifier (défaut: tous)
+        on_progress: callback async (model, done, total) appelé après chaque modèle
+    
+    Returns:
+        (tâche du cycle, True si fusionnée avec un cycle existant,
+         modèles déjà vérifiés par ce cycle avant l'ajout de on_progress)
+    """
+    key = frozenset(models or MODELS.keys())
+    
+    if _running_job is not None and key <= _running_job["models"]:
+        job, coalesced = _running_job, True
+    elif key in _pending_jobs:
+        job, coalesced = _pending_jobs[key], True
+    else:
+        job = {"models": key, "listeners": [], "done": []}
+        job["task"] = asyncio.create_task(_run_job(bot, job))
+        _pending_jobs[key] = job
+        coalesced = False
+    
+    if on_progress is not None:
+        job["listeners"].append(on_progress)
+    
+    if coalesced:
+        logger.info(f"🔁 Vérification fusionnée avec un cycle existant ({', '.join(sorted(key))})")
+    
+    return job["task"], coalesced, list(job["done"])
+
+
+def is_cycle_running() -> bool:
+    """Indique si un cycle de vérification est en cours."""
+    return _running_job is not None
 
 
 async def scheduler_loop(bot):
@@ -272,7 +351,8 @@ async def scheduler_loop(bot):
     
     while True:
         try:
-            await check_all_models(bot)
+            task, _, _ = submit_check(bot)
+            await task
         except Exception as e:
             logger.error(f"Erreur critique scheduler: {e}")
             
@@ -290,7 +370,7 @@ async def scheduler_loop(bot):
                 pass  # Dernier recours
         
         # Attendre avant la prochaine vérification
-        await asyncio.sleep(CHECK_INTERVAL)
+        await clock.sleep(CHECK_INTERVAL)
 
 
 def start_scheduler(app):
@@ -299,8 +379,18 @@ def start_scheduler(app):
     """
     async def post_init(application):
         """Callback appelé après l'initialisation du bot."""
+        setup_event_bus(application.bot)
+        
         # Créer la tâche du scheduler
         asyncio.create_task(scheduler_loop(application.bot))
-        logger.info("Scheduler initialisé")
+        
+        # Worker de livraison dans le même process (sinon : python delivery.py)
+        if DELIVERY_MODE == "inline":
+            asyncio.create_task(delivery_loop(application.bot))
+        
+        # Rappels avant l'ETA des runs (/rappel) : toujours dans le process du bot
+        asyncio.create_task(reminder_service.run(application.bot))
+        
+        logger.info(f"Scheduler initialisé (livraison: {DELIVERY_MODE})")
     
     app.post_init = post_init
@@ -0,0 +1,336 @@
+"""
+Simulateur hors-ligne des stratégies de polling
+Rejoue des heures de publication de runs (synthétiques ou issues de
+run_availability_log) à travers de faux serveurs météo, avec une horloge
+virtuelle injectée dans scheduler/checker. 30 jours simulés tournent en
+quelques secondes.
+
+Usage :
+    python simulator.py --days 30
+    python simulator.py --days 30 --from-db /data/wind_bot.db
+    python simulator.py --strategy rapide,5,4 --strategy lent,30,5,1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import clock
+from config import AVAILABLE_RUNS, MODELS
+
+logger = logging.getLogger(__name__)
+
+# Stratégies comparées par défaut : intervalle de polling, TTL du cache, décalage ECMWF
+DEFAULT_STRATEGIES = [
+    {"name": "actuelle", "check_interval_min": 15, "cache_ttl_min": 5, "ecmwf_shift_h": 0},
+    {"name": "poll-5min", "check_interval_min": 5, "cache_ttl_min": 4, "ecmwf_shift_h": 0},
+    {"name": "poll-30min", "check_interval_min": 30, "cache_ttl_min": 5, "ecmwf_shift_h": 0},
+    {"name": "ecmwf-1h-tot", "check_interval_min": 15, "cache_ttl_min": 5, "ecmwf_shift_h": -1},
+]
+
+# Écart-type (minutes) des délais synthétiques autour des délais fallback
+SYNTHETIC_JITTER_MINUTES = 12
+
+
+class SimulationOver(BaseException):
+    """Fin de la simulation (BaseException : traverse les `except Exception` du scheduler)."""
+
+
+class VirtualClock:
+    """Horloge virtuelle : sleep() avance le temps instantanément."""
+
+    def __init__(self, start: datetime, end: datetime):
+        self._now = start
+        self.end = end
+
+    def now(self) -> datetime:
+        return self._now
+
+    async def sleep(self, seconds: float):
+        self._now += timedelta(seconds=seconds)
+        if self._now >= self.end:
+            raise SimulationOver()
+        await asyncio.sleep(0)
+
+
+# ============ PUBLICATIONS ============
+
+def load_logged_delays(db_path: str) -> dict[tuple[str, int], list[int]]:
+    """Charge les délais observés {(model, run_hour): [minutes, ...]} depuis une base."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    delays = {}
+    for model, run_hour, delay in conn.execute(
+        "SELECT model, run_hour, delay_minutes FROM run_availability_log"
+    ):
+        delays.setdefault((model, run_hour), []).append(delay)
+    conn.close()
+    return delays
+
+
+def build_publications(start: datetime, end: datetime, seed: int,
+                       logged_delays: dict | None = None) -> dict[tuple[str, datetime], datetime]:
+    """
+    Génère l'heure de publication de chaque run entre start-2j et end.
+
+    Returns:
+        {(model, run_datetime): publication_datetime}
+    """
+    from config import FALLBACK_DELAYS
+
+    rng = random.Random(seed)
+    publications = {}
+    day = (start - timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    while day < end:
+        for model in MODELS:
+            for run_hour in AVAILABLE_RUNS:
+                run_dt = day.replace(hour=run_hour)
+                observed = (logged_delays or {}).get((model, run_hour))
+                if observed:
+                    delay = rng.choice(observed)
+                else:
+                    base = FALLBACK_DELAYS.get(model, {}).get(run_hour, 300)
+                    delay = max(60, rng.gauss(base, SYNTHETIC_JITTER_MINUTES))
+                publications[(model, run_dt)] = run_dt + timedelta(minutes=delay)
+        day += timedelta(days=1)
+
+    return publications
+
+
+# ============ FAUX SERVEURS MÉTÉO ============
+
+class FakeResponse:
+    def __init__(self, status_code: int, text: str = ""):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeUpstreams:
+    """
+    Remplace le module `requests` dans checker : répond selon l'horloge
+    virtuelle et les heures de publication, et compte les requêtes par modèle.
+    """
+
+    class RequestException(Exception):
+        pass
+
+    def __init__(self, publications: dict):
+        self.publications = publications
+        self.request_counts = Counter()
+
+    def _is_published(self, model: str, run_dt: datetime) -> bool:
+        published_at = self.publications.get((model, run_dt))
+        return published_at is not None and published_at <= clock.now()
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        # GetCapabilities WMS Météo-France
+        model = "AROME" if "arome" in url else "ARPEGE"
+        self.request_counts[model] += 1
+
+        now = clock.now()
+        runs = sorted(
+            run_dt for (m, run_dt), published_at in self.publications.items()
+            if m == model and published_at <= now and now - run_dt < timedelta(days=1)
+        )
+        times = ",".join(run_dt.strftime("%Y-%m-%dT%H:%M:%SZ") for run_dt in runs)
+        xml = (
+            '<WMS_Capabilities xmlns="http://www.opengis.net/wms"><Capability><Layer>'
+            f'<Dimension name="reference_time">{times}</Dimension>'
+            '</Layer></Capability></WMS_Capabilities>'
+        )
+        return FakeResponse(200, xml)
+
+    def head(self, url, timeout=None, allow_redirects=False):
+        # GFS : .../gfs.YYYYMMDD/HH/atmos/...  |  ECMWF : .../forecasts/YYYYMMDD/HHz/...
+        if "nomads" in url:
+            model = "GFS"
+            date_str, hour_str = url.split("/gfs.")[1].split("/")[:2]
+        else:
+            model = "ECMWF"
+            date_str, hour_str = url.split("/forecasts/")[1].split("/")[:2]
+            hour_str = hour_str.rstrip("z")
+        self.request_counts[model] += 1
+
+        run_dt = datetime.strptime(date_str + hour_str, "%Y%m%d%H").replace(tzinfo=timezone.utc)
+        return FakeResponse(200 if self._is_published(model, run_dt) else 404)
+
+
+class FakeBot:
+    """Bot Telegram factice (alertes admin ignorées)."""
+
+    async def send_message(self, *args, **kwargs):
+        pass
+
+
+# ============ SIMULATION ============
+
+def _percentile(sorted_values: list, p: float):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def _run_strategy(strategy: dict, start: datetime, end: datetime, publications: dict,
+                        ecmwf_base_delays: dict) -> dict:
+    import checker
+    import database
+    import scheduler
+    from events import bus, RunDetected
+
+    vclock = VirtualClock(start, end)
+    upstreams = FakeUpstreams(publications)
+
+    # Injection : horloge, faux serveurs, paramètres de la stratégie
+    clock.set_clock(vclock)
+    checker.requests = upstreams
+    checker.AROME_API_KEY = checker.ARPEGE_API_KEY = "simulation"
+    checker.CACHE_TTL = timedelta(minutes=strategy["cache_ttl_min"])
+    checker.ECMWF_MIN_DELAY_HOURS = {
+        hour: delay + strategy.get("ecmwf_shift_h", 0)
+        for hour, delay in ecmwf_base_delays.items()
+    }
+    checker._runs_cache.clear()
+    scheduler.CHECK_INTERVAL = strategy["check_interval_min"] * 60
+
+    latencies = {model: [] for model in MODELS}
+    detected = set()
+
+    async def record(event: RunDetected):
+        published_at = publications.get((event.model, event.run_datetime))
+        if published_at is None or published_at < start:
+            return  # Run publié avant le début de la simulation
+        detected.add((event.model, event.run_datetime))
+        latency = (event.detected_at - published_at).total_seconds() / 60
+        latencies[event.model].append(latency)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_PATH = os.path.join(tmp, "simulation.db")
+        database.init_database()
+
+        bot = FakeBot()
+        scheduler.setup_event_bus(bot)
+        bus.subscribe(RunDetected, record, name="simulator")
+
+        try:
+            await scheduler.scheduler_loop(bot)
+        except SimulationOver:
+            pass
+        finally:
+            clock.reset_clock()
+            bus.clear()
+
+    # Runs publiés assez tôt pour avoir pu être détectés
+    expected = {
+        key for key, published_at in publications.items()
+        if start <= published_at <= end - timedelta(hours=6)
+    }
+
+    all_latencies = sorted(l for values in latencies.values() for l in values)
+    days = (end - start).total_seconds() / 86400
+
+    return {
+        "strategy": strategy,
+        "expected": len(expected),
+        "detected": len(expected & detected),
+        "missed": len(expected - detected),
+        "p50": _percentile(all_latencies, 50),
+        "p90": _percentile(all_latencies, 90),
+        "p99": _percentile(all_latencies, 99),
+        "max": all_latencies[-1] if all_latencies else None,
+        "requests": dict(upstreams.request_counts),
+        "requests_per_day": sum(upstreams.request_counts.values()) / days,
+        "latency_by_model": {
+            model: _percentile(sorted(values), 50) for model, values in latencies.items()
+        },
+    }
+
+
+def simulate(strategies: list[dict], days: int = 30, seed: int = 42,
+             from_db: str | None = None) -> list[dict]:
+    """Simule chaque stratégie sur les mêmes publications et retourne les résultats."""
+    import checker
+
+    ecmwf_base_delays = dict(checker.ECMWF_MIN_DELAY_HOURS)
+    original_requests = checker.requests
+
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    end = start + timedelta(days=days)
+    logged_delays = load_logged_delays(from_db) if from_db else None
+    publications = build_publications(start, end, seed, logged_delays)
+
+    results = []
+    try:
+        for strategy in strategies:
+            results.append(asyncio.run(
+                _run_strategy(strategy, start, end, publications, ecmwf_base_delays)
+            ))
+    finally:
+        checker.requests = original_requests
+        checker.ECMWF_MIN_DELAY_HOURS = ecmwf_base_delays
+
+    return results
+
+
+def format_report(results: list[dict], days: int) -> str:
+    """Formate les résultats en tableau texte."""
+    def fmt(value):
+        return "-" if value is None else f"{value:.0f}"
+
+    lines = [
+        f"Simulation sur {days} jours (latence de détection en minutes)",
+        "",
+        f"{'stratégie':<14} {'détectés':>9} {'ratés':>6} {'p50':>5} {'p90':>5} {'p99':>5} {'max':>5} {'req/jour':>9}",
+    ]
+    for r in results:
+        lines.append(
+            f"{r['strategy']['name']:<14} {r['detected']:>4}/{r['expected']:<4} {r['missed']:>6} "
+            f"{fmt(r['p50']):>5} {fmt(r['p90']):>5} {fmt(r['p99']):>5} {fmt(r['max']):>5} "
+            f"{r['requests_per_day']:>9.0f}"
+        )
+    lines.append("")
+    for r in results:
+        per_model = ", ".join(
+            f"{m} {r['requests'].get(m, 0)} req / p50 {fmt(r['latency_by_model'][m])} min"
+            for m in MODELS
+        )
+        lines.append(f"{r['strategy']['name']}: {per_model}")
+    return "\n".join(lines)
+
+
+def parse_strategy(value: str) -> dict:
+    """Parse 'nom,intervalle_min,ttl_min[,décalage_ecmwf_h]'."""
+    parts = value.split(",")
+    if len(parts) not in (3, 4):
+        raise argparse.ArgumentTypeError("format attendu : nom,intervalle_min,ttl_min[,décalage_ecmwf_h]")
+    return {
+        "name": parts[0],
+        "check_interval_min": float(parts[1]),
+        "cache_ttl_min": float(parts[2]),
+        "ecmwf_shift_h": float(parts[3]) if len(parts) == 4 else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulateur de stratégies de polling Wind Bot")
+    parser.add_argument("--days", type=int, default=30, help="Nombre de jours simulés")
+    parser.add_argument("--seed", type=int, default=42, help="Graine des délais synthétiques")
+    parser.add_argument("--from-db", help="Base SQLite dont rejouer run_availability_log")
+    parser.add_argument("--strategy", action="append", type=parse_strategy,
+                        help="nom,intervalle_min,ttl_min[,décalage_ecmwf_h] (répétable)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    strategies = args.strategy or DEFAULT_STRATEGIES
+    results = simulate(strategies, days=args.days, seed=args.seed, from_db=args.from_db)
+    print(format_report(results, args.days))
+
+
+if __name__ == "__main__":
+    main()
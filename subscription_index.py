@@ -0,0 +1,101 @@
+"""
+Index mémoire des abonnements
+(model, run_hour) → ensemble de chat_ids, miroir de la table subscriptions.
+Construit au démarrage du bot, tenu à jour par database.py après chaque
+écriture validée : le fan-out ne touche plus la base.
+"""
+import threading
+
+# Même convention que database.ALL_RUNS : abonné à tous les runs du modèle
+ALL_RUNS = -1
+
+
+class SubscriptionIndex:
+    """Index inversé thread-safe des abonnements."""
+
+    def __init__(self):
+        self._by_key: dict[tuple[str, int], set[int]] = {}
+        self._by_user: dict[int, frozenset[tuple[str, int]]] = {}
+        # Résultats de lookup figés, invalidés par modèle à chaque changement
+        self._lookup_cache: dict[tuple[str, int], tuple[int, ...]] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def load(self, rows):
+        """(Re)construit l'index depuis des lignes (chat_id, model, run_hour)."""
+        by_key: dict[tuple[str, int], set[int]] = {}
+        by_user: dict[int, set[tuple[str, int]]] = {}
+        for chat_id, model, run_hour in rows:
+            by_key.setdefault((model, run_hour), set()).add(chat_id)
+            by_user.setdefault(chat_id, set()).add((model, run_hour))
+
+        with self._lock:
+            self._by_key = by_key
+            self._lookup_cache = {}
+            self._by_user = {chat_id: frozenset(keys) for chat_id, keys in by_user.items()}
+            self.loaded = True
+
+    def clear(self):
+        """Vide l'index (changement de base) : requêtes SQL jusqu'au prochain load()."""
+        with self._lock:
+            self._by_key = {}
+            self._by_user = {}
+            self._lookup_cache = {}
+            self.loaded = False
+
+    def replace_user(self, chat_id: int, keys):
+        """Remplace les abonnements d'un utilisateur (keys vide = aucun / inactif)."""
+        keys = frozenset(keys)
+        with self._lock:
+            old = self._by_user.pop(chat_id, frozenset())
+            for key in old - keys:
+                chat_ids = self._by_key.get(key)
+                if chat_ids is not None:
+                    chat_ids.discard(chat_id)
+                    if not chat_ids:
+                        del self._by_key[key]
+            for key in keys - old:
+                self._by_key.setdefault(key, set()).add(chat_id)
+            if keys:
+                self._by_user[chat_id] = keys
+
+            changed_models = {model for model, _ in old ^ keys}
+            if changed_models:
+                self._lookup_cache = {
+                    key: chat_ids for key, chat_ids in self._lookup_cache.items()
+                    if key[0] not in changed_models
+                }
+
+    def lookup(self, model: str, run_hour: int) -> tuple[int, ...]:
+        """chat_ids abonnés à (model, run_hour), y compris les abonnés à tous les runs."""
+        with self._lock:
+            cached = self._lookup_cache.get((model, run_hour))
+            if cached is not None:
+                return cached
+
+            exact = self._by_key.get((model, run_hour), set())
+            wildcard = self._by_key.get((model, ALL_RUNS), set())
+            chat_ids = tuple(exact | wildcard)
+            self._lookup_cache[(model, run_hour)] = chat_ids
+            return chat_ids
+
+    def rows(self) -> set[tuple[int, str, int]]:
+        """Contenu de l'index sous forme de lignes (chat_id, model, run_hour)."""
+        with self._lock:
+            return {
+                (chat_id, model, run_hour)
+                for chat_id, keys in self._by_user.items()
+                for model, run_hour in keys
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._by_user),
+                "keys": len(self._by_key),
+                "entries": sum(len(chat_ids) for chat_ids in self._by_key.values()),
+            }
+
+
+# Index partagé du process du bot
+index = SubscriptionIndex()
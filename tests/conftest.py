@@ -0,0 +1,99 @@
+"""
+Fixtures des tests : base SQLite temporaire, horloge virtuelle (clock.py)
+et faux bot Telegram qui enregistre les messages envoyés.
+
+Lancement : python -m pytest
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import analytics  # noqa: E402
+import clock as clock_module  # noqa: E402
+import database  # noqa: E402
+import delivery  # noqa: E402
+import reminders  # noqa: E402
+from fanout import FanoutEngine  # noqa: E402
+
+
+class VirtualClock:
+    """
+    Horloge de test : le temps n'avance que par advance() ou sleep(), qui rend
+    seulement la main à la boucle (une boucle d'1 s tourne sans attente réelle).
+    """
+
+    def __init__(self, start: datetime):
+        self.current = start
+
+    def now(self) -> datetime:
+        return self.current
+
+    async def sleep(self, seconds: float):
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+    def advance(self, seconds: float):
+        self.current += timedelta(seconds=seconds)
+
+
+class FakeBot:
+    """
+    Bot Telegram factice : send_message enregistre (chat_id, texte, heure virtuelle)
+    ou lève l'exception programmée pour ce chat (une fois si `once`).
+    """
+
+    def __init__(self):
+        self.sent: list[tuple[int, str, datetime]] = []
+        self._errors: dict[int, tuple[BaseException, bool]] = {}
+
+    def fail(self, chat_id: int, error: BaseException, once: bool = True):
+        self._errors[chat_id] = (error, once)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if chat_id in self._errors:
+            error, once = self._errors[chat_id]
+            if once:
+                del self._errors[chat_id]
+            raise error
+        self.sent.append((chat_id, text, clock_module.now()))
+
+    def received(self, chat_id: int) -> list[str]:
+        return [text for sent_to, text, _ in self.sent if sent_to == chat_id]
+
+
+@pytest.fixture
+def clock():
+    """Horloge virtuelle installée dans clock.py, départ le 15/03/2025 à 08h00 UTC"""
+    virtual = VirtualClock(datetime(2025, 3, 15, 8, 0, tzinfo=timezone.utc))
+    clock_module.set_clock(virtual)
+    yield virtual
+    clock_module.reset_clock()
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch, clock):
+    """Base vierge dans un répertoire temporaire"""
+    monkeypatch.setattr(database, "DATABASE_PATH", str(tmp_path / "wind_bot.db"))
+    monkeypatch.setattr(analytics, "_cache", {})
+    database.init_database()
+    yield
+    database.get_manager().close()
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Moteur de fan-out propre au test (pause RetryAfter, limiteur par chat), partagé avec les rappels"""
+    fresh = FanoutEngine()
+    monkeypatch.setattr(delivery, "fanout_engine", fresh)
+    monkeypatch.setattr(reminders, "fanout_engine", fresh.sharing_limits())
+    return fresh
+
+
+@pytest.fixture
+def bot():
+    return FakeBot()
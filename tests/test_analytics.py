@@ -0,0 +1,24 @@
+"""
+Analyse NumPy des délais : fenêtre plafonnée à la rétention des logs bruts.
+"""
+from datetime import timedelta
+
+from analytics import ANALYSIS_DAYS, analyse
+from database import RAW_LOG_RETENTION_DAYS, log_run_availability, run_retention
+
+
+def log(clock, days_ago: int, delay_minutes: int):
+    run_dt = (clock.now() - timedelta(days=days_ago)).replace(hour=6, minute=0, second=0)
+    log_run_availability("AROME", run_dt, run_dt + timedelta(minutes=delay_minutes))
+
+
+def test_analysis_limited_to_raw_log_retention(db, clock):
+    assert ANALYSIS_DAYS == RAW_LOG_RETENTION_DAYS
+    for days_ago in (200, 120, 30, 20, 10):
+        log(clock, days_ago, 300)
+    run_retention()
+
+    result = analyse(365)
+    assert result["days"] == ANALYSIS_DAYS
+    assert result["samples"] == 3
+    assert result["stats"][("AROME", 6)]["count"] == 3
@@ -0,0 +1,105 @@
+"""
+Chats injoignables (deactivate_users) et groupes devenus supergroupes
+(migrate_chat) : utilisateur, abonnements, rappels et envois pending.
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from telegram.error import ChatMigrated
+
+import database
+import delivery
+from database import (
+    claim_next_run_event,
+    claim_outbox_batch,
+    deactivate_users,
+    enqueue_run_event,
+    get_user,
+    get_user_reminders,
+    migrate_chat,
+    toggle_model_for_user,
+    upsert_reminder,
+)
+
+RUN = datetime(2025, 3, 15, 6, 0, tzinfo=timezone.utc)
+
+
+def subscribe(*chat_ids: int):
+    for chat_id in chat_ids:
+        toggle_model_for_user(chat_id, "AROME")
+
+
+def outbox() -> dict[int, tuple]:
+    """{chat_id: (status, last_error)} des envois de l'outbox"""
+    with database.reader() as conn:
+        return {
+            row["chat_id"]: (row["status"], row["last_error"])
+            for row in conn.execute("SELECT chat_id, status, last_error FROM notification_outbox")
+        }
+
+
+def subscribers() -> set[int]:
+    with database.reader() as conn:
+        return {row[0] for row in conn.execute("SELECT DISTINCT chat_id FROM subscriptions")}
+
+
+def test_deactivate_users_fails_pending_rows(db, clock):
+    subscribe(701, 702, 703)
+    enqueue_run_event("AROME", RUN, clock.now())
+
+    assert deactivate_users([701, 702, 701]) == 2
+    assert deactivate_users([701]) == 0
+
+    assert outbox() == {
+        701: ("failed", "chat injoignable"),
+        702: ("failed", "chat injoignable"),
+        703: ("pending", None),
+    }
+    assert subscribers() == {703}
+    assert not get_user(701)["active"]
+
+
+def test_migrate_chat_moves_user_reminders_and_pending_rows(db, clock):
+    subscribe(711)
+    upsert_reminder(711, "AROME", 12, 10)
+    enqueue_run_event("AROME", RUN, clock.now())
+    event = claim_next_run_event()
+
+    assert migrate_chat(711, -100711) is True
+
+    assert get_user(711) is None
+    assert get_user(-100711)["models"] == ["AROME"]
+    assert subscribers() == {-100711}
+    assert [r["chat_id"] for r in get_user_reminders(-100711)] == [-100711]
+    assert outbox() == {-100711: ("pending", None)}
+    assert [chat_id for _, chat_id, _ in claim_outbox_batch(event["id"])] == [-100711]
+
+
+def test_migrate_chat_into_registered_supergroup_merges(db, clock):
+    subscribe(712, -100712)
+    upsert_reminder(712, "AROME", 12, 10)
+    upsert_reminder(712, "AROME", 6, 5)
+    upsert_reminder(-100712, "AROME", 12, 30)
+    enqueue_run_event("AROME", RUN, clock.now())
+
+    assert migrate_chat(712, -100712) is False
+
+    # Réglages du supergroupe conservés, ancien chat désactivé
+    assert not get_user(712)["active"]
+    assert subscribers() == {-100712}
+    assert sorted((r["run_hour"], r["lead_minutes"]) for r in get_user_reminders(-100712)) == [(6, 5), (12, 30)]
+    assert get_user_reminders(712) == []
+    # Un seul envoi par chat et par événement : celui de l'ancien chat est abandonné
+    assert outbox() == {712: ("failed", "chat migré"), -100712: ("pending", None)}
+
+
+def test_chat_migrated_during_fanout_delivered_to_new_id(db, clock, engine, bot):
+    subscribe(713, 714)
+    enqueue_run_event("AROME", RUN, clock.now())
+    event = claim_next_run_event()
+    bot.fail(713, ChatMigrated(-100713))
+
+    assert asyncio.run(delivery.deliver_event(bot, event)) == (2, 0)
+    assert bot.received(713) == [] and len(bot.received(-100713)) == 1
+    assert get_user(-100713)["active"]
+    assert outbox() == {-100713: ("sent", None), 714: ("sent", None)}
@@ -0,0 +1,77 @@
+"""
+delay_stats tenue à jour à chaque log (incrémental) face à une reconstruction
+complète, après agrégation des logs bruts et expiration des agrégats journaliers.
+"""
+from datetime import timedelta
+
+import database
+from database import (
+    DAILY_ROLLUP_RETENTION_DAYS,
+    RAW_LOG_RETENTION_DAYS,
+    get_delay_stats,
+    log_run_availability,
+    rebuild_delay_stats,
+    run_retention,
+)
+
+
+def log(clock, model: str, run_hour: int, days_ago: int, delay_minutes: int):
+    run_dt = (clock.now() - timedelta(days=days_ago)).replace(hour=run_hour, minute=0, second=0)
+    log_run_availability(model, run_dt, run_dt + timedelta(minutes=delay_minutes))
+
+
+def snapshot() -> list[tuple]:
+    """
+    Agrégats de delay_stats, hors last_delay/last_run_ts : la dernière observation
+    d'un couple sans log brut restant n'est pas dans les agrégats journaliers.
+    """
+    # Fenêtres glissantes recalculées comme à la première lecture de la journée
+    get_delay_stats("AROME", 12)
+    with database.reader() as conn:
+        return [tuple(row) for row in conn.execute("""
+            SELECT model, run_hour, samples, delay_sum, delay_sumsq, delay_min, delay_max,
+                   window_start_ts, win_samples, win_sum, win_sumsq, win_min, win_max
+            FROM delay_stats ORDER BY model, run_hour
+        """)]
+
+
+def populate(clock):
+    """Logs bruts récents, à agréger, et agrégats bientôt expirés, sur trois couples"""
+    for days_ago, delay in ((1200, 250), (1150, 320), (400, 280), (200, 265), (120, 300),
+                            (25, 290), (10, 270), (2, 285)):
+        log(clock, "AROME", 12, days_ago, delay)
+    for days_ago, delay in ((150, 310), (3, 295)):
+        log(clock, "ARPEGE", 0, days_ago, delay)
+    # Couple dont toutes les données vont expirer
+    log(clock, "GFS", 6, 1180, 215)
+
+
+def test_retention_keeps_delay_stats_equal_to_rebuild(db, clock):
+    populate(clock)
+
+    result = run_retention()
+    assert result["rolled_up"] == 7 and result["rollups_deleted"] == 3
+
+    incremental = snapshot()
+    assert [row[:3] for row in incremental] == [("AROME", 12, 6), ("ARPEGE", 0, 2)]
+    rebuild_delay_stats()
+    assert snapshot() == incremental
+
+
+def test_stats_follow_rollups_expiring_over_time(db, clock):
+    populate(clock)
+    run_retention()
+
+    # Un an plus tard : les agrégats d'il y a 400 jours expirent à leur tour
+    clock.advance(timedelta(days=DAILY_ROLLUP_RETENTION_DAYS - 400 + 1).total_seconds())
+    log(clock, "AROME", 12, 1, 260)
+    result = run_retention()
+    assert result["rollups_deleted"] == 1
+
+    incremental = snapshot()
+    rebuild_delay_stats()
+    assert snapshot() == incremental
+
+    with database.reader() as conn:
+        oldest = conn.execute("SELECT MIN(run_ts) FROM run_availability_log").fetchone()[0]
+    assert oldest >= database.days_ago_epoch(RAW_LOG_RETENTION_DAYS)
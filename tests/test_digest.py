@@ -0,0 +1,78 @@
+"""
+Regroupement des notifications en digest : envois retenus digest_minutes,
+joints (get_digest_companions) au message du premier run dû.
+"""
+import asyncio
+from datetime import datetime, timezone
+
+import delivery
+from database import (
+    claim_next_run_event,
+    claim_outbox_batch,
+    count_outbox,
+    enqueue_run_event,
+    get_digest_companions,
+    set_user_digest,
+    toggle_model_for_user,
+)
+
+AROME_RUN = datetime(2025, 3, 15, 6, 0, tzinfo=timezone.utc)
+ARPEGE_RUN = datetime(2025, 3, 15, 6, 0, tzinfo=timezone.utc)
+
+
+def subscribe(chat_id: int, digest_minutes: int = 0):
+    toggle_model_for_user(chat_id, "AROME")
+    toggle_model_for_user(chat_id, "ARPEGE")
+    set_user_digest(chat_id, digest_minutes)
+
+
+def test_companions_only_for_digest_users_and_leased(db, clock):
+    subscribe(601, digest_minutes=10)
+    subscribe(602)
+    enqueue_run_event("AROME", AROME_RUN, clock.now())
+    clock.advance(5 * 60)
+    enqueue_run_event("ARPEGE", ARPEGE_RUN, clock.now())
+    arome, arpege = claim_next_run_event(), claim_next_run_event()
+
+    # Envoi AROME pending de 601 (retenu) joint au message ARPEGE ; 602 n'est pas en digest
+    companions = get_digest_companions(arpege["id"], [601, 602])
+    assert list(companions) == [601]
+    [(_, model, run_datetime)] = companions[601]
+    assert (model, run_datetime) == ("AROME", AROME_RUN)
+
+    # Sous bail : un autre worker ne peut plus les joindre ni les envoyer
+    assert get_digest_companions(arpege["id"], [601, 602]) == {}
+    clock.advance(5 * 60)
+    assert [chat_id for _, chat_id, _ in claim_outbox_batch(arome["id"])] == [602]
+
+
+def test_runs_detected_within_window_sent_as_one_message(db, clock, engine, bot):
+    subscribe(601, digest_minutes=10)
+    subscribe(602)
+
+    # AROME : envoyé tout de suite à 602, retenu 10 min pour 601
+    enqueue_run_event("AROME", AROME_RUN, clock.now())
+    arome = claim_next_run_event()
+    assert asyncio.run(delivery.deliver_event(bot, arome)) is None
+
+    # ARPEGE 5 min plus tard, dans la fenêtre de 601
+    clock.advance(5 * 60)
+    enqueue_run_event("ARPEGE", ARPEGE_RUN, clock.now())
+    arpege = claim_next_run_event()
+    assert arpege["model"] == "ARPEGE"
+    assert asyncio.run(delivery.deliver_event(bot, arpege)) is None
+    assert len(bot.received(602)) == 2 and bot.received(601) == []
+
+    # Fin de la fenêtre du premier run : un seul message pour les deux
+    clock.advance(5 * 60)
+    resumed = claim_next_run_event()
+    assert resumed["id"] == arome["id"]
+    assert asyncio.run(delivery.deliver_event(bot, resumed)) == (2, 0)
+    assert bot.received(601) == [delivery.render_digest([("AROME", AROME_RUN), ("ARPEGE", ARPEGE_RUN)])]
+
+    # L'envoi ARPEGE de 601 est déjà livré avec le digest
+    assert count_outbox(arpege["id"]) == {"pending": 0, "sent": 2, "failed": 0}
+    clock.advance(5 * 60)
+    assert claim_next_run_event()["id"] == arpege["id"]
+    assert asyncio.run(delivery.deliver_event(bot, arpege)) == (2, 0)
+    assert len(bot.received(601)) == 1
@@ -0,0 +1,49 @@
+"""
+Import/export hors de la file de async_db : les autres appels à la base
+passent entre deux lots d'un import en cours.
+"""
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+import async_db
+import export
+from database import count_availability_logs, log_run_availability
+
+RUN = datetime(2025, 3, 1, 6, 0, tzinfo=timezone.utc)
+
+
+def record(day: int) -> dict:
+    run_dt = RUN + timedelta(days=day)
+    return {
+        "model": "AROME", "run_hour": 6, "run_ts": int(run_dt.timestamp()),
+        "detected_ts": int(run_dt.timestamp()) + 300 * 60, "delay_minutes": 300,
+    }
+
+
+def test_writes_interleave_with_running_import(db, clock, monkeypatch):
+    first_batch_done = threading.Event()
+    resume = threading.Event()
+
+    def records(source, fmt):
+        yield from (record(0), record(1))
+        first_batch_done.set()
+        assert resume.wait(5)
+        yield from (record(2), record(3))
+
+    monkeypatch.setattr(export, "IMPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(export, "_read_records", records)
+
+    async def scenario():
+        task = asyncio.create_task(async_db.run_in_thread(export.import_table, "logs", None))
+        await asyncio.to_thread(first_batch_done.wait, 5)
+
+        # Premier lot validé, import suspendu : la file de la base reste libre
+        await async_db.run(log_run_availability, "ARPEGE", RUN, RUN + timedelta(minutes=200))
+        assert await async_db.run(count_availability_logs) == 3
+
+        resume.set()
+        return await task
+
+    assert asyncio.run(scenario()) == 4
+    assert count_availability_logs() == 5
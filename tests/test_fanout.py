@@ -0,0 +1,29 @@
+"""
+Seau à jetons global du fan-out : débit de la première seconde et de toute
+fenêtre d'une seconde borné par GLOBAL_RATE + GLOBAL_BURST.
+"""
+import asyncio
+import bisect
+import time
+
+from fanout import GLOBAL_BURST, GLOBAL_RATE, FanoutEngine, iter_rows
+
+
+def test_first_second_respects_global_rate():
+    sent_at = []
+
+    async def send(chat_id):
+        sent_at.append(time.monotonic())
+        return True
+
+    engine = FanoutEngine()
+    start = time.monotonic()
+    report = asyncio.run(engine.run(iter_rows(list(range(2 * GLOBAL_RATE))), send))
+
+    # Réserve courte : la première seconde reste proche de la limite Telegram
+    assert GLOBAL_BURST <= 5
+    limit = GLOBAL_RATE + GLOBAL_BURST
+    assert report["sent"] == 2 * GLOBAL_RATE
+    assert sum(t - start < 1 for t in sent_at) <= limit
+    # Fenêtres glissantes d'une seconde ouvertes à chaque envoi
+    assert max(bisect.bisect_left(sent_at, t + 1) - i for i, t in enumerate(sent_at)) <= limit
@@ -0,0 +1,173 @@
+"""
+Migrations du schéma (database.MIGRATIONS) appliquées à une base peuplée
+au schéma d'origine : colonnes JSON models/runs, dates ISO en TEXT.
+"""
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+import analytics
+import database
+
+BASELINE_SCHEMA = """
+    CREATE TABLE users (
+        chat_id INTEGER PRIMARY KEY,
+        username TEXT,
+        models TEXT DEFAULT '[]',
+        runs TEXT DEFAULT '[6, 12]',
+        active INTEGER DEFAULT 1,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        last_notification TEXT
+    );
+    CREATE TABLE last_runs (
+        model TEXT PRIMARY KEY,
+        run_datetime TEXT NOT NULL,
+        notified_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE run_availability_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model TEXT NOT NULL,
+        run_hour INTEGER NOT NULL,
+        run_date TEXT NOT NULL,
+        detected_at TEXT NOT NULL,
+        delay_minutes INTEGER NOT NULL,
+        CONSTRAINT unique_detection UNIQUE(model, run_date, run_hour)
+    );
+    CREATE TABLE run_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model TEXT NOT NULL,
+        run_datetime TEXT NOT NULL,
+        detected_at TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        claimed_at TEXT,
+        done_at TEXT,
+        sent_count INTEGER,
+        failed_count INTEGER,
+        CONSTRAINT unique_event UNIQUE(model, run_datetime)
+    );
+"""
+
+BASELINE_USERS = [
+    (1, "alice", '["AROME", "GFS"]', "[6, 12]", 1),
+    # Liste runs vide : tous les runs
+    (2, "bob", '["ARPEGE"]', "[]", 1),
+    # Modèle et heure inconnus : ignorés
+    (3, "carol", '["AROME", "MOCAGE"]', "[0, 18, 99]", 1),
+    (4, "dave", '["GFS"]', "[6]", 0),
+]
+
+
+@pytest.fixture
+def baseline_db(tmp_path, monkeypatch, clock):
+    """Base au schéma d'origine (user_version 0), migrée par init_database()"""
+    path = tmp_path / "wind_bot.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO users (chat_id, username, models, runs, active) VALUES (?, ?, ?, ?, ?)",
+        BASELINE_USERS
+    )
+    conn.execute(
+        "INSERT INTO last_runs VALUES ('AROME', '2025-03-15T06:00:00+00:00', '2025-03-15T11:02:13.123456+00:00')"
+    )
+    conn.executemany(
+        "INSERT INTO run_availability_log (model, run_hour, run_date, detected_at, delay_minutes) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [
+            ("AROME", 6, "2025-03-14", "2025-03-14T11:05:00+00:00", 305),
+            ("AROME", 6, "2025-03-15", "2025-03-15T10:50:30.500000+00:00", 290),
+            ("GFS", 12, "2025-03-13", "2025-03-13T15:40:00+00:00", 220),
+        ]
+    )
+    conn.executemany(
+        "INSERT INTO run_events (model, run_datetime, detected_at, status, attempts, "
+        "claimed_at, done_at, sent_count, failed_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            ("AROME", "2025-03-15T06:00:00+00:00", "2025-03-15T11:02:13+00:00", "done", 1,
+             "2025-03-15T11:02:14+00:00", "2025-03-15T11:02:20+00:00", 3, 0),
+            ("ARPEGE", "2025-03-15T06:00:00+00:00", "2025-03-15T07:30:00+00:00", "pending", 0,
+             None, None, None, None),
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(database, "DATABASE_PATH", str(path))
+    monkeypatch.setattr(analytics, "_cache", {})
+    database.init_database()
+    yield
+    database.get_manager().close()
+
+
+def fetch(sql: str, params=()) -> list[tuple]:
+    with database.reader() as conn:
+        return [tuple(row) for row in conn.execute(sql, params)]
+
+
+def columns(table: str) -> set[str]:
+    with database.reader() as conn:
+        return database._columns(conn, table)
+
+
+def test_migrates_to_latest_version(baseline_db):
+    assert fetch("PRAGMA user_version") == [(max(database.MIGRATIONS),)]
+
+
+def test_subscriptions_rebuilt_from_json_columns(baseline_db):
+    assert set(fetch("SELECT chat_id, model, run_hour FROM subscriptions")) == {
+        (1, "AROME", 6), (1, "AROME", 12), (1, "GFS", 6), (1, "GFS", 12),
+        (2, "ARPEGE", database.ALL_RUNS),
+        (3, "AROME", 0), (3, "AROME", 18),
+    }
+
+
+def test_json_lists_converted_to_masks(baseline_db):
+    assert {"models", "runs"}.isdisjoint(columns("users"))
+    users = {chat_id: database.get_user(chat_id) for chat_id, *_ in BASELINE_USERS}
+
+    assert (users[1]["models"], users[1]["runs"]) == (["AROME", "GFS"], [6, 12])
+    assert (users[2]["models"], users[2]["runs"]) == (["ARPEGE"], [])
+    assert (users[3]["models"], users[3]["runs"]) == (["AROME"], [0, 18])
+    assert (users[4]["models"], users[4]["active"]) == (["GFS"], False)
+    assert fetch("SELECT runs_mask FROM users WHERE chat_id = 1") == [(database.runs_to_mask([6, 12]),)]
+
+
+def epoch(*args) -> int:
+    return database.to_epoch(datetime(*args, tzinfo=timezone.utc))
+
+
+def test_iso_dates_converted_to_epoch(baseline_db):
+    assert "run_datetime" not in columns("last_runs")
+    assert fetch("SELECT model, run_ts, notified_ts FROM last_runs") == [
+        ("AROME", epoch(2025, 3, 15, 6), epoch(2025, 3, 15, 11, 2, 13))
+    ]
+    assert database.get_last_run("AROME") == datetime(2025, 3, 15, 6, tzinfo=timezone.utc)
+
+    assert "run_date" not in columns("run_availability_log")
+    assert fetch("SELECT model, run_hour, run_ts, detected_ts, delay_minutes FROM run_availability_log ORDER BY id") == [
+        ("AROME", 6, epoch(2025, 3, 14, 6), epoch(2025, 3, 14, 11, 5), 305),
+        ("AROME", 6, epoch(2025, 3, 15, 6), epoch(2025, 3, 15, 10, 50, 30), 290),
+        ("GFS", 12, epoch(2025, 3, 13, 12), epoch(2025, 3, 13, 15, 40), 220),
+    ]
+    # delay_stats reconstruite sur les logs convertis
+    assert fetch("SELECT model, run_hour, samples, delay_sum, last_run_ts FROM delay_stats ORDER BY model") == [
+        ("AROME", 6, 2, 595, epoch(2025, 3, 15, 6)),
+        ("GFS", 12, 1, 220, epoch(2025, 3, 13, 12)),
+    ]
+
+
+def test_run_events_converted_to_epoch(baseline_db):
+    assert {"run_datetime", "claimed_at", "next_attempt_at"}.isdisjoint(columns("run_events"))
+    assert fetch("SELECT model, status, run_ts, detected_ts, claimed_ts, done_ts FROM run_events ORDER BY id") == [
+        ("AROME", "done", epoch(2025, 3, 15, 6), epoch(2025, 3, 15, 11, 2, 13),
+         epoch(2025, 3, 15, 11, 2, 14), epoch(2025, 3, 15, 11, 2, 20)),
+        ("ARPEGE", "pending", epoch(2025, 3, 15, 6), epoch(2025, 3, 15, 7, 30), None, None),
+    ]
+
+    # L'événement en attente reste livrable après la migration
+    event = database.claim_next_run_event()
+    assert (event["model"], event["run_datetime"], event["detected_at"]) == (
+        "ARPEGE", datetime(2025, 3, 15, 6, tzinfo=timezone.utc), datetime(2025, 3, 15, 7, 30, tzinfo=timezone.utc)
+    )
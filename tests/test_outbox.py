@@ -0,0 +1,188 @@
+"""
+Cycle de livraison de l'outbox (delivery.deliver_event) : réclamation sous bail,
+écriture par lots, report et reprise, sur l'horloge virtuelle.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+from telegram.error import Forbidden, RetryAfter, TimedOut
+
+import database
+import delivery
+from database import (
+    claim_next_run_event,
+    claim_outbox_batch,
+    complete_run_event,
+    count_outbox,
+    count_pending_run_events,
+    enqueue_run_event,
+    toggle_model_for_user,
+)
+from fanout import FanoutEngine
+
+RUN = datetime(2025, 3, 15, 6, 0, tzinfo=timezone.utc)
+
+
+class Crash(BaseException):
+    """Arrêt brutal du worker en plein fan-out (non rattrapé par le moteur)"""
+
+
+def subscribe(*chat_ids: int):
+    for chat_id in chat_ids:
+        toggle_model_for_user(chat_id, "AROME")
+
+
+def detect(clock) -> dict:
+    """Met en file le run AROME 06h et le réserve comme le ferait le worker"""
+    assert enqueue_run_event("AROME", RUN, clock.now())
+    return claim_next_run_event()
+
+
+def outbox_row(chat_id: int):
+    with database.reader() as conn:
+        return conn.execute(
+            "SELECT status, attempts, next_attempt_ts FROM notification_outbox WHERE chat_id = ?",
+            (chat_id,)
+        ).fetchone()
+
+
+def test_delivers_every_subscriber_once(db, clock, engine, bot):
+    subscribe(101, 102, 103)
+    event = detect(clock)
+    assert count_pending_run_events() == 1
+
+    assert asyncio.run(delivery.deliver_event(bot, event)) == (3, 0)
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) == [101, 102, 103]
+    assert count_outbox(event["id"]) == {"pending": 0, "sent": 3, "failed": 0}
+    complete_run_event(event["id"], 3, 0)
+    assert count_pending_run_events() == 0
+
+
+def test_restart_resumes_without_resending(db, clock, engine, bot, monkeypatch):
+    monkeypatch.setattr(delivery, "OUTBOX_FLUSH_SIZE", 2)
+    chat_ids = list(range(101, 107))
+    subscribe(*chat_ids)
+    event = detect(clock)
+    bot.fail(104, Crash())
+
+    with pytest.raises(Crash):
+        asyncio.run(delivery.deliver_event(bot, event))
+
+    delivered = {chat_id for chat_id, _, _ in bot.sent}
+    counts = count_outbox(event["id"])
+    assert counts["sent"] == len(delivered) and counts["pending"] == len(chat_ids) - len(delivered)
+
+    # Événement et envois restent sous bail tant que le worker peut être vivant
+    clock.advance(60)
+    assert claim_next_run_event() is None
+    assert claim_outbox_batch(event["id"]) == []
+
+    # Redémarrage : nouveau process, nouveau moteur de fan-out
+    monkeypatch.setattr(delivery, "fanout_engine", FanoutEngine())
+    clock.advance(15 * 60)
+    resumed = claim_next_run_event()
+    assert resumed["id"] == event["id"] and resumed["attempts"] == 2
+
+    assert asyncio.run(delivery.deliver_event(bot, resumed)) == (6, 0)
+    for chat_id in chat_ids:
+        assert len(bot.received(chat_id)) == 1
+    assert count_outbox(event["id"]) == {"pending": 0, "sent": 6, "failed": 0}
+
+
+def test_retry_after_pauses_fanout_and_defers_without_penalty(db, clock, engine, bot):
+    subscribe(201)
+    event = detect(clock)
+    bot.fail(201, RetryAfter(120))
+    detected = clock.now().timestamp()
+
+    # Envoi dû dans 120 s > DELIVERY_POLL_INTERVAL : l'événement est rendu à la file
+    assert asyncio.run(delivery.deliver_event(bot, event)) is None
+    assert bot.sent == []
+    assert engine.bucket._paused_until > time.monotonic() + 100
+
+    row = outbox_row(201)
+    assert (row["status"], row["attempts"]) == ("pending", 0)
+    assert row["next_attempt_ts"] == int(detected + 120)
+
+    clock.advance(60)
+    assert claim_next_run_event() is None
+
+    clock.advance(60)
+    resumed = claim_next_run_event()
+    assert resumed["id"] == event["id"]
+
+    # La pause du seau suit time.monotonic, pas l'horloge virtuelle
+    engine.bucket._paused_until = 0.0
+    assert asyncio.run(delivery.deliver_event(bot, resumed)) == (1, 0)
+    assert bot.received(201) == [delivery.render_notification("AROME", RUN)]
+    # Seul l'envoi réussi compte une tentative
+    assert outbox_row(201)["attempts"] == 1
+
+
+def test_transient_error_retried_with_backoff(db, clock, engine, bot):
+    subscribe(301, 302)
+    event = detect(clock)
+    bot.fail(301, TimedOut())
+    detected = clock.now().timestamp()
+
+    assert asyncio.run(delivery.deliver_event(bot, event)) is None
+    assert [chat_id for chat_id, _, _ in bot.sent] == [302]
+
+    row = outbox_row(301)
+    assert (row["status"], row["attempts"]) == ("pending", 1)
+    assert row["next_attempt_ts"] == int(detected + delivery.RETRY_BASE_SECONDS)
+
+    clock.advance(delivery.RETRY_BASE_SECONDS)
+    resumed = claim_next_run_event()
+    assert asyncio.run(delivery.deliver_event(bot, resumed)) == (2, 0)
+    assert len(bot.received(301)) == 1 and len(bot.received(302)) == 1
+
+
+def test_outbox_lease_excludes_other_workers(db, clock):
+    subscribe(401, 402)
+    event = detect(clock)
+
+    claimed = claim_outbox_batch(event["id"])
+    assert [chat_id for _, chat_id, _ in claimed] == [401, 402]
+    assert claim_outbox_batch(event["id"]) == []
+
+    clock.advance(database.OUTBOX_LEASE_SECONDS)
+    assert claim_outbox_batch(event["id"]) == claimed
+
+
+def test_outbox_filled_in_batches_from_streamed_subscribers(db, clock, monkeypatch):
+    monkeypatch.setattr(database, "OUTBOX_BATCH_SIZE", 2)
+    subscribe(501, 502, 503, 504, 505)
+    database.set_user_digest(503, 10)
+    assert list(database.iter_subscribed_chat_ids("AROME", 6, chunk_size=2)) == [501, 502, 503, 504, 505]
+
+    event = detect(clock)
+    with database.reader() as conn:
+        rows = conn.execute(
+            "SELECT chat_id, next_attempt_ts FROM notification_outbox WHERE event_id = ? ORDER BY chat_id",
+            (event["id"],)
+        ).fetchall()
+    now = int(clock.now().timestamp())
+    assert [tuple(row) for row in rows] == [(501, now), (502, now), (503, now + 600), (504, now), (505, now)]
+
+
+def test_send_notification_reports_errors_like_fanout(db, clock, bot, monkeypatch):
+    """/testnotif (send_notification) : même classement des erreurs et alertes admin que le fan-out"""
+    import admin
+
+    alerts = []
+
+    async def send_admin_notification(bot, message, error_type="general"):
+        alerts.append(error_type)
+
+    monkeypatch.setattr(admin, "send_admin_notification", send_admin_notification)
+    bot.fail(601, Forbidden("bot was blocked by the user"))
+    bot.fail(602, TimedOut())
+
+    assert asyncio.run(delivery.send_notification(bot, 601, "AROME", RUN)) is False
+    assert asyncio.run(delivery.send_notification(bot, 602, "AROME", RUN)) is False
+    assert asyncio.run(delivery.send_notification(bot, 603, "AROME", RUN)) is True
+    assert alerts == ["notification_transient"]
+    assert [chat_id for chat_id, _, _ in bot.sent] == [603]
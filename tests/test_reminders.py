@@ -0,0 +1,120 @@
+"""
+Rappels (reminders.ReminderService) : programmation dans la roue, avance par
+la boucle sur l'horloge virtuelle, reprogrammation après envoi ou détection.
+
+Sans historique, l'ETA d'AROME 12h vient de FALLBACK_DELAYS (4h45) :
+sortie attendue à 16h45, rappel 10 min avant, à 16h35.
+"""
+import asyncio
+import contextlib
+from datetime import datetime, timezone
+
+from telegram.error import Forbidden
+
+import database
+import reminders
+from database import claim_run, save_last_run, toggle_model_for_user, upsert_reminder, to_epoch
+from events import RunDetected
+from reminders import ReminderService
+
+RUN = datetime(2025, 3, 15, 12, 0, tzinfo=timezone.utc)
+NEXT_RUN = datetime(2025, 3, 16, 12, 0, tzinfo=timezone.utc)
+FIRE_AT = datetime(2025, 3, 15, 16, 35, tzinfo=timezone.utc)
+NEXT_FIRE_AT = datetime(2025, 3, 16, 16, 35, tzinfo=timezone.utc)
+
+
+def add_reminder(chat_id: int) -> dict:
+    toggle_model_for_user(chat_id, "AROME")
+    return upsert_reminder(chat_id, "AROME", 12, 10)
+
+
+async def run_until_fired(service: ReminderService, bot, clock, limit: datetime):
+    """Fait tourner la boucle des rappels jusqu'au premier envoi programmé (ou `limit`)"""
+    loop_task = asyncio.create_task(service.run(bot))
+    while not service._tasks and clock.now() < limit:
+        await asyncio.sleep(0)
+    loop_task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await loop_task
+    await asyncio.gather(*service._tasks)
+
+
+def test_loop_fires_before_eta_and_reschedules_next_run(db, clock, engine, bot):
+    reminder = add_reminder(501)
+    service = ReminderService()
+
+    asyncio.run(run_until_fired(service, bot, clock, limit=NEXT_FIRE_AT))
+
+    [(chat_id, text, sent_at)] = bot.sent
+    assert chat_id == 501 and "AROME 12h" in text
+    assert FIRE_AT <= sent_at <= FIRE_AT.replace(second=5)
+    assert service.stats == {"sent": 1, "skipped": 0, "failed": 0}
+
+    # Rappel du lendemain, et run envoyé enregistré en base
+    assert service.next_fire(reminder["id"]) == NEXT_FIRE_AT
+    assert database.get_user_reminders(501)[0]["last_run_ts"] == to_epoch(RUN)
+
+    # Rapport du lot de rappels distinct du dernier fan-out des notifications (/stats)
+    assert reminders.fanout_engine.last_report["sent"] == 1
+    assert engine.last_report is None
+    assert reminders.fanout_engine.bucket is engine.bucket
+
+
+def test_reload_after_restart_does_not_resend(db, clock, engine, bot):
+    reminder = add_reminder(502)
+    asyncio.run(run_until_fired(ReminderService(), bot, clock, limit=NEXT_FIRE_AT))
+    assert len(bot.sent) == 1
+
+    # Redémarrage avant l'ETA : le run du jour reste à venir mais a déjà eu son rappel
+    restarted = ReminderService()
+    asyncio.run(restarted.load())
+    assert clock.now() < FIRE_AT.replace(minute=45)
+    assert restarted.next_fire(reminder["id"]) == NEXT_FIRE_AT
+
+
+def test_run_detected_early_moves_reminder_to_next_run(db, clock, engine, bot):
+    reminder = add_reminder(503)
+    service = ReminderService()
+    asyncio.run(service.load())
+    assert service.next_fire(reminder["id"]) == FIRE_AT
+
+    # Run sorti à 15h, avant son rappel
+    clock.advance(7 * 3600)
+    assert claim_run("AROME", RUN)
+    save_last_run("AROME", RUN)
+    asyncio.run(service.on_run_detected(RunDetected("AROME", RUN, clock.now())))
+    assert service.next_fire(reminder["id"]) == NEXT_FIRE_AT
+
+    assert service.wheel.advance(FIRE_AT.timestamp() + 600) == []
+    assert bot.sent == []
+
+
+def test_run_detected_elsewhere_is_skipped_at_fire_time(db, clock, engine, bot):
+    reminder = add_reminder(504)
+    service = ReminderService()
+    asyncio.run(service.load())
+
+    # Détection par un autre process : pas de RunDetected dans celui-ci
+    save_last_run("AROME", RUN)
+    clock.advance((FIRE_AT - clock.now()).total_seconds())
+    due = service.wheel.advance(clock.now().timestamp())
+    asyncio.run(service._fire(bot, due))
+
+    assert bot.sent == []
+    assert service.stats["skipped"] == 1
+    assert service.next_fire(reminder["id"]) == NEXT_FIRE_AT
+
+
+def test_unreachable_chat_is_deactivated_and_unscheduled(db, clock, engine, bot):
+    reminder = add_reminder(505)
+    service = ReminderService()
+    asyncio.run(service.load())
+    bot.fail(505, Forbidden("bot was blocked by the user"))
+
+    clock.advance((FIRE_AT - clock.now()).total_seconds())
+    due = service.wheel.advance(clock.now().timestamp())
+    asyncio.run(service._fire(bot, due))
+
+    assert service.stats["failed"] == 1
+    assert service.next_fire(reminder["id"]) is None
+    assert not database.get_user(505)["active"]
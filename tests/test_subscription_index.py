@@ -0,0 +1,60 @@
+"""
+Index mémoire des abonnements : remplissage de l'outbox depuis l'index,
+tenu à jour par les écritures users (mêmes destinataires que la table).
+"""
+from datetime import datetime, timezone
+
+import database
+from database import (
+    check_subscription_index,
+    claim_next_run_event,
+    deactivate_users,
+    enqueue_run_event,
+    load_subscription_index,
+    migrate_chat,
+    toggle_model_for_user,
+    toggle_run_for_user,
+    update_user_runs,
+)
+from subscription_index import index
+
+RUN = datetime(2025, 3, 15, 6, 0, tzinfo=timezone.utc)
+
+
+def recipients(event_id: int) -> set[int]:
+    with database.reader() as conn:
+        return {
+            row[0] for row in
+            conn.execute("SELECT chat_id FROM notification_outbox WHERE event_id = ?", (event_id,))
+        }
+
+
+def test_outbox_filled_from_index_kept_in_sync(db, clock):
+    toggle_model_for_user(801, "AROME")
+    load_subscription_index()
+    assert index.loaded
+
+    # Écritures après chargement : reportées dans l'index par les hooks
+    toggle_model_for_user(802, "AROME")
+    toggle_model_for_user(803, "AROME")
+    toggle_run_for_user(803, 6)           # 803 n'a plus le run de 6h
+    toggle_model_for_user(804, "AROME")
+    update_user_runs(804, [])             # tous les runs
+    toggle_model_for_user(805, "AROME")
+    deactivate_users([805])
+    toggle_model_for_user(806, "AROME")
+    migrate_chat(806, -100806)
+
+    report = check_subscription_index()
+    assert (report["missing"], report["extra"]) == ([], [])
+
+    enqueue_run_event("AROME", RUN, clock.now())
+    event = claim_next_run_event()
+    assert recipients(event["id"]) == {801, 802, 804, -100806}
+
+
+def test_index_cleared_with_database(db, clock, monkeypatch):
+    load_subscription_index()
+    monkeypatch.setattr(database, "DATABASE_PATH", database.DATABASE_PATH + "-other")
+    database.get_manager()
+    assert not index.loaded
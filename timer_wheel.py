@@ -0,0 +1,122 @@
+"""
+Roue temporelle hiérarchique (hierarchical timer wheel)
+Stocke des minuteries par clé avec insertion et annulation en O(1) :
+chaque niveau compte SLOTS cases, une case du niveau N couvre SLOTS^N ticks.
+À chaque tour complet d'un niveau, la case suivante du niveau supérieur est
+redistribuée (cascade) vers les niveaux inférieurs. Avec des ticks d'1 s,
+4 niveaux de 64 cases couvrent ~194 jours.
+Utilisée par les rappels (reminders.py).
+"""
+from typing import Any, Hashable
+
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+LEVELS = 4
+
+
+class TimerWheel:
+    """
+    Minuteries {clé: (échéance, payload)} expirées par advance(now).
+
+    Les échéances sont en secondes (epoch ou monotone, au choix de l'appelant),
+    arrondies au tick de `resolution` secondes supérieur.
+    """
+
+    def __init__(self, now: float, resolution: float = 1.0, levels: int = LEVELS):
+        self.resolution = resolution
+        self.levels = levels
+        self._tick = int(now // resolution)
+        # _slots[niveau][case] = {clé: (tick d'échéance, échéance, payload)}
+        self._slots = [[{} for _ in range(SLOTS)] for _ in range(levels)]
+        # Échéances déjà passées à la programmation : rendues au prochain advance
+        self._overdue: dict = {}
+        # {clé: case qui la contient} : annulation sans parcours
+        self._index: dict[Hashable, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def _place(self, key: Hashable, tick: int, when: float, payload: Any):
+        delta = tick - self._tick
+        if delta <= 0:
+            slot = self._overdue
+        else:
+            level = 0
+            while level < self.levels - 1 and delta >= 1 << (SLOT_BITS * (level + 1)):
+                level += 1
+            slot = self._slots[level][(tick >> (SLOT_BITS * level)) & (SLOTS - 1)]
+        slot[key] = (tick, when, payload)
+        self._index[key] = slot
+
+    def schedule(self, key: Hashable, when: float, payload: Any = None):
+        """Programme (ou reprogramme) la minuterie `key` pour `when`."""
+        self.cancel(key)
+        self._place(key, -int(-when // self.resolution), when, payload)
+
+    def deadline(self, key: Hashable) -> float | None:
+        """Échéance d'une minuterie, None si elle n'existe pas"""
+        slot = self._index.get(key)
+        return slot[key][1] if slot is not None else None
+
+    def cancel(self, key: Hashable) -> bool:
+        """Annule une minuterie. Retourne False si elle n'existait pas (ou a expiré)."""
+        slot = self._index.pop(key, None)
+        if slot is None:
+            return False
+        del slot[key]
+        return True
+
+    def _cascade(self):
+        """Redistribue les cases des niveaux supérieurs dont le tour commence"""
+        for level in range(1, self.levels):
+            index = (self._tick >> (SLOT_BITS * level)) & (SLOTS - 1)
+            slot = self._slots[level][index]
+            if slot:
+                self._slots[level][index] = {}
+                for key, (tick, when, payload) in slot.items():
+                    self._place(key, tick, when, payload)
+            # Le niveau supérieur ne tourne que si celui-ci a fait un tour complet
+            if index != 0:
+                break
+
+    def advance(self, now: float) -> list[tuple[Hashable, float, Any]]:
+        """
+        Avance la roue jusqu'à `now`.
+
+        Returns:
+            Minuteries expirées [(clé, échéance, payload), ...] par échéance croissante
+        """
+        target = int(now // self.resolution)
+        if not self._index:
+            # Roue vide : rien à cascader ni à expirer
+            self._tick = max(self._tick, target)
+            return []
+
+        expired = []
+        while self._tick < target:
+            self._tick += 1
+            if self._tick & (SLOTS - 1) == 0:
+                self._cascade()
+            index = self._tick & (SLOTS - 1)
+            slot = self._slots[0][index]
+            if slot:
+                self._slots[0][index] = {}
+                for key, (tick, when, payload) in slot.items():
+                    if tick > self._tick:
+                        # Au-delà de la portée de la roue : replacée plus loin
+                        self._place(key, tick, when, payload)
+                        continue
+                    del self._index[key]
+                    expired.append((key, when, payload))
+
+        # Programmées dans le passé, ou échues pile au tick d'une cascade
+        for key, (_, when, payload) in self._overdue.items():
+            del self._index[key]
+            expired.append((key, when, payload))
+        self._overdue = {}
+
+        expired.sort(key=lambda timer: timer[1])
+        return expired
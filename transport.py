@@ -0,0 +1,63 @@
+"""
+Profils de transport HTTP vers l'API Telegram
+Les envois (fan-out des notifications, réponses aux commandes) et le
+long-polling getUpdates utilisent chacun leur propre client HTTPX, réglés
+par config.TELEGRAM_TRANSPORT : un getUpdates en attente n'occupe jamais
+une connexion d'envoi, et le pool des envois suit la concurrence du fan-out.
+"""
+import importlib.util
+import logging
+
+from telegram.request import HTTPXRequest
+
+from config import TELEGRAM_TRANSPORT
+from fanout import FANOUT_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# Connexions du profil bulk en plus des expéditeurs du fan-out
+# (réponses aux commandes, alertes admin pendant un fan-out)
+REPLY_CONNECTIONS = 8
+
+
+def http2_available() -> bool:
+    """HTTP/2 nécessite le paquet h2 (python-telegram-bot[http2])"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def build_request(profile: str) -> HTTPXRequest:
+    """
+    Client HTTPX d'un profil de TELEGRAM_TRANSPORT ('bulk' ou 'polling').
+    
+    Raises:
+        ValueError: profil inconnu
+    """
+    if profile not in TELEGRAM_TRANSPORT:
+        raise ValueError(f"Profil de transport inconnu : {profile} (disponibles : {', '.join(TELEGRAM_TRANSPORT)})")
+    
+    settings = TELEGRAM_TRANSPORT[profile]
+    pool_size = settings["pool_size"]
+    http_version = settings["http_version"]
+    
+    # Le pool des envois ne doit jamais brider le fan-out (pool_timeout → TimedOut)
+    if profile == "bulk":
+        pool_size = max(pool_size, FANOUT_CONCURRENCY + REPLY_CONNECTIONS)
+    
+    if http_version.startswith("2") and not http2_available():
+        logger.warning(f"⚠️ HTTP/2 demandé pour le profil {profile} mais h2 absent : HTTP/1.1")
+        http_version = "1.1"
+    
+    logger.info(f"🔌 Transport Telegram {profile} : {pool_size} connexions, HTTP/{http_version}")
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        http_version=http_version,
+        connect_timeout=settings["connect_timeout"],
+        read_timeout=settings["read_timeout"],
+        write_timeout=settings["write_timeout"],
+        pool_timeout=settings["pool_timeout"],
+    )
+
+
+def long_poll_timeout() -> int:
+    """Durée d'attente (s) de getUpdates côté Telegram, pour run_polling(timeout=...)"""
+    return TELEGRAM_TRANSPORT["polling"]["long_poll"]